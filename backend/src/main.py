@@ -11,6 +11,7 @@ from services.stripe_service import stripe_service
 from services.twilio_service import twilio_service
 from services.openai_service import openai_service
 from services.demo_service import demo_service
+from services.response_cache import response_cache, tenant_key
 
 # Import comprehensive models safely to avoid startup failures
 try:
@@ -66,6 +67,18 @@ if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
 # --- Initialize Extensions ---
 db.init_app(app)
 jwt = JWTManager(app)
+response_cache.init_app(app)
+
+def _cached_tenants(session, obj):
+    """Dashboard caches a main-app write invalidates"""
+    if isinstance(obj, Contact):
+        yield tenant_key(obj.sub_account_id)
+    elif isinstance(obj, User):
+        yield tenant_key(obj.id)
+    elif isinstance(obj, Subscription):
+        yield tenant_key(obj.user_id)
+
+response_cache.watch(db.session, _cached_tenants)
 
 # Register business platform blueprint if available
 if BUSINESS_ROUTES_AVAILABLE:
@@ -292,6 +305,7 @@ def reset_master_password():
 
 @app.route('/api/dashboard', methods=['GET'])
 @require_auth
+@response_cache.cached(tenant=lambda: tenant_key(request.current_user.id))
 def get_dashboard():
     """Comprehensive dashboard for the ultimate business platform"""
     try:
@@ -0,0 +1,70 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, JSON
+from src.models.user import db
+
+# analytics_events and orders are owned by models/comprehensive_models (the
+# main app's SQLAlchemy instance). The CRM side only reads them, so it maps the
+# columns it aggregates as plain tables on a separate MetaData that create_all()
+# never touches.
+external_metadata = MetaData()
+
+analytics_events = Table(
+    'analytics_events', external_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('event_type', String(100)),
+    Column('event_data', JSON),
+    Column('source', String(100)),
+    Column('contact_id', Integer),
+    Column('session_id', String(255)),
+    Column('ip_address', String(45)),
+    Column('created_at', DateTime),
+)
+
+orders = Table(
+    'orders', external_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('contact_id', Integer),
+    Column('status', String(50)),
+    Column('total_amount', Float),
+    Column('created_at', DateTime),
+)
+
+class HourlyEventRollup(db.Model):
+    """Analytics event counts per sub-account, UTC hour, type and source
+
+    Maintained by services.analytics_engine.rollup_events(); hours after the
+    latest rolled-up hour are read from analytics_events directly.
+    """
+    __tablename__ = 'hourly_event_rollups'
+    __table_args__ = (
+        db.Index('ix_hourly_event_rollups_hour', 'hour'),
+    )
+
+    sub_account_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    event_type = db.Column(db.String(100), primary_key=True)
+    source = db.Column(db.String(100), primary_key=True, default='')  # '' when the event had none
+    count = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<HourlyEventRollup {self.sub_account_id} {self.hour} {self.event_type}={self.count}>'
+
+class DailyEventSketch(db.Model):
+    """HyperLogLog sketch of one day's distinct visitors / sessions / contacts
+
+    One row per sub-account, UTC day, event source and dimension, written by
+    services.distinct_counts.sketch_days(); registers are zlib-compressed
+    (see utils.hyperloglog).
+    """
+    __tablename__ = 'daily_event_sketches'
+    __table_args__ = (
+        db.Index('ix_daily_event_sketches_day', 'day'),
+    )
+
+    sub_account_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    source = db.Column(db.String(100), primary_key=True, default='')  # '' when the event had none
+    dimension = db.Column(db.String(20), primary_key=True)  # visitors, sessions, contacts
+    registers = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<DailyEventSketch {self.sub_account_id} {self.day} {self.dimension}>'
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 from src.models.user import db
 import enum
@@ -30,6 +30,9 @@ class MessageStatus(enum.Enum):
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        Index('ix_conversations_contact_id', 'contact_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     sub_account_id = Column(Integer, ForeignKey('sub_accounts.id'), nullable=False)
@@ -96,6 +99,9 @@ class Conversation(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        Index('ix_messages_conversation_created', 'conversation_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
@@ -1,4 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, DDL
+from sqlalchemy.orm import validates
+from src.utils.normalize import normalize_email, normalize_phone
+from src.models.types import JSONDocument
 from datetime import datetime
 import json
 
@@ -6,18 +10,31 @@ db = SQLAlchemy()
 
 class Contact(db.Model):
     __tablename__ = 'contacts'
+    __table_args__ = (
+        # Serves keyset pagination: WHERE sub_account_id = ? AND (created_at, id) < (?, ?)
+        db.Index('ix_contacts_sub_account_created_id', 'sub_account_id', 'created_at', 'id'),
+        # Exact inbound matching: WHERE sub_account_id = ? AND email_norm = ? / phone_e164 = ?
+        db.Index('ix_contacts_sub_account_email_norm', 'sub_account_id', 'email_norm'),
+        db.Index('ix_contacts_sub_account_phone_e164', 'sub_account_id', 'phone_e164'),
+        # Serves cf.key=value filters through jsonb containment (@>); PostgreSQL only
+        db.Index('ix_contacts_custom_fields_gin', 'custom_fields', postgresql_using='gin',
+                 postgresql_ops={'custom_fields': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sub_account_id = db.Column(db.Integer, db.ForeignKey('sub_accounts.id'), nullable=False)
     email = db.Column(db.String(255))
     phone = db.Column(db.String(50))
+    email_norm = db.Column(db.String(255))  # normalize_email(email), kept in sync by the validators below
+    phone_e164 = db.Column(db.String(20))  # normalize_phone(phone)
     first_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100))
     company = db.Column(db.String(255))
     tags = db.Column(db.Text)  # JSON array of tags
-    custom_fields = db.Column(db.Text)  # JSON object for custom fields
+    custom_fields = db.Column(JSONDocument)  # JSON object for custom fields
     status = db.Column(db.String(50), default='active')  # active, inactive, archived
     source = db.Column(db.String(100))  # lead source
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # assigned user
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -27,15 +44,59 @@ class Contact(db.Model):
     tasks = db.relationship('ContactTask', backref='contact', lazy=True, cascade='all, delete-orphan')
     opportunities = db.relationship('Opportunity', backref='contact', lazy=True, cascade='all, delete-orphan')
     conversations = db.relationship('Conversation', backref='contact', lazy=True, cascade='all, delete-orphan')
+    tag_rows = db.relationship('ContactTag', backref='contact', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Contact {self.first_name} {self.last_name}>'
     
+    @validates('email')
+    def _sync_email_norm(self, key, value):
+        self.email_norm = normalize_email(value)
+        return value
+    
+    @validates('phone')
+    def _sync_phone_e164(self, key, value):
+        self.phone_e164 = normalize_phone(value)
+        return value
+    
     @property
     def full_name(self):
         return f"{self.first_name or ''} {self.last_name or ''}".strip()
     
-    def to_dict(self):
+    @staticmethod
+    def related_counts(contact_ids):
+        """Activity, note and task counts for many contacts in one grouped query
+
+        Returns {contact_id: {'activities_count': n, 'notes_count': n, 'tasks_count': n}}.
+        Contacts without related rows are filled with zeroes.
+        """
+        contact_ids = [contact_id for contact_id in contact_ids if contact_id is not None]
+        counts = {
+            contact_id: {'activities_count': 0, 'notes_count': 0, 'tasks_count': 0}
+            for contact_id in contact_ids
+        }
+        if not contact_ids:
+            return counts
+        
+        grouped = [
+            db.select(model.contact_id, db.literal(key).label('key'), db.func.count().label('total'))
+            .where(model.contact_id.in_(contact_ids))
+            .group_by(model.contact_id)
+            for model, key in (
+                (ContactActivity, 'activities_count'),
+                (ContactNote, 'notes_count'),
+                (ContactTask, 'tasks_count')
+            )
+        ]
+        for contact_id, key, total in db.session.execute(db.union_all(*grouped)):
+            counts[contact_id][key] = total
+        return counts
+    
+    def to_dict(self, counts=None):
+        """Serialize the contact; pass `counts` from related_counts() when serializing a page"""
+        if counts is None:
+            counts = Contact.related_counts([self.id]).get(self.id) or {}
+        
         return {
             'id': self.id,
             'sub_account_id': self.sub_account_id,
@@ -46,18 +107,24 @@ class Contact(db.Model):
             'full_name': self.full_name,
             'company': self.company,
             'tags': json.loads(self.tags) if self.tags else [],
-            'custom_fields': json.loads(self.custom_fields) if self.custom_fields else {},
+            'custom_fields': self.custom_fields or {},
             'status': self.status,
             'source': self.source,
+            'owner_id': self.owner_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'activities_count': len(self.activities),
-            'notes_count': len(self.notes),
-            'tasks_count': len(self.tasks)
+            'activities_count': counts.get('activities_count', 0),
+            'notes_count': counts.get('notes_count', 0),
+            'tasks_count': counts.get('tasks_count', 0)
         }
 
 class ContactActivity(db.Model):
     __tablename__ = 'contact_activities'
+    __table_args__ = (
+        db.Index('ix_contact_activities_contact_created', 'contact_id', 'created_at'),
+        # Date-range scans across contacts (daily rollups)
+        db.Index('ix_contact_activities_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=False)
@@ -83,6 +150,9 @@ class ContactActivity(db.Model):
 
 class ContactNote(db.Model):
     __tablename__ = 'contact_notes'
+    __table_args__ = (
+        db.Index('ix_contact_notes_contact_created', 'contact_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=False)
@@ -108,6 +178,9 @@ class ContactNote(db.Model):
 
 class ContactTask(db.Model):
     __tablename__ = 'contact_tasks'
+    __table_args__ = (
+        db.Index('ix_contact_tasks_contact_created', 'contact_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=False)
@@ -139,3 +212,60 @@ class ContactTask(db.Model):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+class ContactTag(db.Model):
+    """Normalized copy of Contact.tags, one row per (contact, tag), for indexed tag filters"""
+    __tablename__ = 'contact_tags'
+    __table_args__ = (
+        db.Index('ix_contact_tags_sub_account_tag_contact', 'sub_account_id', 'tag', 'contact_id'),
+    )
+    
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    sub_account_id = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<ContactTag {self.tag} for contact {self.contact_id}>'
+
+# Contact search index
+#
+# SQLite keeps a contentless FTS5 table in sync through triggers. The `tenant`
+# column holds an "s<sub_account_id>" token so a search is intersected with the
+# tenant inside the index rather than filtered afterwards.
+# PostgreSQL uses a pg_trgm GIN index over the concatenated searchable columns,
+# which is maintained by the database on every write.
+CONTACT_SEARCH_COLUMNS = ('first_name', 'last_name', 'email', 'company')
+
+CONTACT_SEARCH_DOCUMENT_SQL = (
+    "lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+    "coalesce(email, '') || ' ' || coalesce(company, ''))"
+)
+
+_FTS_INSERT = (
+    "INSERT INTO contacts_fts(rowid, tenant, first_name, last_name, email, company) "
+    "VALUES (new.id, 's' || new.sub_account_id, new.first_name, new.last_name, new.email, new.company);"
+)
+_FTS_DELETE = (
+    "INSERT INTO contacts_fts(contacts_fts, rowid, tenant, first_name, last_name, email, company) "
+    "VALUES ('delete', old.id, 's' || old.sub_account_id, old.first_name, old.last_name, old.email, old.company);"
+)
+
+CONTACT_SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+        "tenant, first_name, last_name, email, company, "
+        "content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN {_FTS_INSERT} END",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN {_FTS_DELETE} END",
+        "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF "
+        f"sub_account_id, first_name, last_name, email, company ON contacts BEGIN {_FTS_DELETE} {_FTS_INSERT} END",
+    ],
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts "
+        f"USING gin (({CONTACT_SEARCH_DOCUMENT_SQL}) gin_trgm_ops)",
+    ],
+}
+
+for _dialect, _statements in CONTACT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Contact.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
@@ -0,0 +1,39 @@
+from datetime import datetime
+from src.models.user import db
+import json
+
+class DuplicateCluster(db.Model):
+    __tablename__ = 'duplicate_clusters'
+    __table_args__ = (
+        db.Index('ix_duplicate_clusters_sub_account_status', 'sub_account_id', 'status', 'score'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sub_account_id = db.Column(db.Integer, nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('background_jobs.id'))
+    contact_ids = db.Column(db.Text, nullable=False)  # JSON array of contact ids
+    score = db.Column(db.Float, default=0.0)  # strongest pairwise match score, 0.0-1.0
+    reasons = db.Column(db.Text)  # JSON array: email, phone, name_company
+    status = db.Column(db.String(20), default='pending')  # pending, merged, dismissed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<DuplicateCluster {self.contact_ids} score={self.score}>'
+
+    @property
+    def contact_id_list(self):
+        return json.loads(self.contact_ids) if self.contact_ids else []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sub_account_id': self.sub_account_id,
+            'job_id': self.job_id,
+            'contact_ids': self.contact_id_list,
+            'score': self.score,
+            'reasons': json.loads(self.reasons) if self.reasons else [],
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+        }
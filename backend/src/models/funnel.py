@@ -0,0 +1,45 @@
+from datetime import datetime
+from src.models.user import db
+
+# Incremental pipeline funnel state, maintained by services.pipeline_funnel
+
+class PipelineFunnelState(db.Model):
+    __tablename__ = 'pipeline_funnel_state'
+
+    pipeline_id = db.Column(db.Integer, primary_key=True)
+    stages_hash = db.Column(db.String(40))  # stage order the counts were built with
+    last_activity_id = db.Column(db.Integer, default=0)  # stage_change rows processed so far
+    last_opportunity_id = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OpportunityFunnel(db.Model):
+    """Where one opportunity stands in its pipeline's funnel"""
+    __tablename__ = 'opportunity_funnel'
+    __table_args__ = (
+        db.Index('ix_opportunity_funnel_pipeline', 'pipeline_id'),
+    )
+
+    opportunity_id = db.Column(db.Integer, primary_key=True)
+    pipeline_id = db.Column(db.Integer, nullable=False)
+    cohort_week = db.Column(db.Date, nullable=False)  # Monday of the week it was created
+    reached_index = db.Column(db.Integer, nullable=False, default=-1)  # furthest configured stage, -1 for none
+    current_stage = db.Column(db.String(255))
+    entered_current_at = db.Column(db.DateTime)
+
+class FunnelCount(db.Model):
+    """Opportunities per (cohort week, furthest stage reached)"""
+    __tablename__ = 'funnel_counts'
+
+    pipeline_id = db.Column(db.Integer, primary_key=True)
+    cohort_week = db.Column(db.Date, primary_key=True)
+    reached_index = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, default=0)
+
+class StageDuration(db.Model):
+    """Log-scale histogram of completed stays in a stage"""
+    __tablename__ = 'stage_durations'
+
+    pipeline_id = db.Column(db.Integer, primary_key=True)
+    stage = db.Column(db.String(255), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, default=0)
@@ -0,0 +1,60 @@
+from datetime import datetime
+from src.models.user import db
+import json
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_sub_account_kind', 'sub_account_id', 'kind', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sub_account_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # contact_import, ...
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    params = db.Column(db.Text)  # JSON for the job's input parameters
+    total = db.Column(db.Integer)  # null when the size is not known up front
+    processed = db.Column(db.Integer, default=0)
+    succeeded = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text)  # JSON array of per-item errors (capped)
+    result = db.Column(db.Text)  # JSON for the job's output
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    MAX_ERRORS = 1000
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.kind} {self.status}>'
+
+    @property
+    def errors_list(self):
+        return json.loads(self.errors) if self.errors else []
+
+    def add_errors(self, errors):
+        """Append per-item errors, keeping at most MAX_ERRORS of them"""
+        current = self.errors_list
+        room = self.MAX_ERRORS - len(current)
+        if room > 0 and errors:
+            current.extend(errors[:room])
+            self.errors = json.dumps(current)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sub_account_id': self.sub_account_id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'total': self.total,
+            'processed': self.processed or 0,
+            'succeeded': self.succeeded or 0,
+            'failed': self.failed_count or 0,
+            'progress': round((self.processed or 0) / self.total * 100, 1) if self.total else None,
+            'errors': self.errors_list,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
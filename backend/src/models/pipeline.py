@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Numeric
+from src.models.types import JSONDocument
 from datetime import datetime
 import json
 
@@ -38,6 +39,12 @@ class Pipeline(db.Model):
 
 class Opportunity(db.Model):
     __tablename__ = 'opportunities'
+    __table_args__ = (
+        db.Index('ix_opportunities_contact_id', 'contact_id'),
+        db.Index('ix_opportunities_pipeline_closed', 'pipeline_id', 'closed_at'),
+        db.Index('ix_opportunities_custom_fields_gin', 'custom_fields', postgresql_using='gin',
+                 postgresql_ops={'custom_fields': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     pipeline_id = db.Column(db.Integer, db.ForeignKey('pipelines.id'), nullable=False)
@@ -51,7 +58,7 @@ class Opportunity(db.Model):
     expected_close_date = db.Column(db.Date)
     status = db.Column(db.String(50), default='open')  # open, won, lost
     source = db.Column(db.String(100))
-    custom_fields = db.Column(db.Text)  # JSON object for custom fields
+    custom_fields = db.Column(JSONDocument)  # JSON object for custom fields
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     closed_at = db.Column(db.DateTime)
@@ -76,7 +83,7 @@ class Opportunity(db.Model):
             'expected_close_date': self.expected_close_date.isoformat() if self.expected_close_date else None,
             'status': self.status,
             'source': self.source,
-            'custom_fields': json.loads(self.custom_fields) if self.custom_fields else {},
+            'custom_fields': self.custom_fields or {},
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'closed_at': self.closed_at.isoformat() if self.closed_at else None,
@@ -85,6 +92,9 @@ class Opportunity(db.Model):
 
 class OpportunityActivity(db.Model):
     __tablename__ = 'opportunity_activities'
+    __table_args__ = (
+        db.Index('ix_opportunity_activities_opportunity_created', 'opportunity_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     opportunity_id = db.Column(db.Integer, db.ForeignKey('opportunities.id'), nullable=False)
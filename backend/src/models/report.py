@@ -0,0 +1,65 @@
+from datetime import datetime
+from src.models.user import db
+import json
+
+class SavedReport(db.Model):
+    __tablename__ = 'saved_reports'
+    __table_args__ = (
+        db.Index('ix_saved_reports_sub_account', 'sub_account_id'),
+        db.Index('ix_saved_reports_next_run', 'next_run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sub_account_id = db.Column(db.Integer, db.ForeignKey('sub_accounts.id'), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    metrics = db.Column(db.Text)  # JSON array of metric names
+    filters = db.Column(db.Text)  # JSON object: source, contact_status, pipeline_id
+    date_range = db.Column(db.String(10), default='30d')
+    granularity = db.Column(db.String(10), default='day')
+    timezone = db.Column(db.String(64), default='UTC')
+    visualization_type = db.Column(db.String(50), default='chart')
+    schedule = db.Column(db.String(20))  # hourly, daily, weekly; null for on-demand only
+    plan = db.Column(db.Text)  # JSON compiled plan, see services.report_service
+    plan_hash = db.Column(db.String(40))
+    last_run_at = db.Column(db.DateTime)
+    next_run_at = db.Column(db.DateTime)  # next scheduled precompute
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SavedReport {self.name}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sub_account_id': self.sub_account_id,
+            'name': self.name,
+            'config': {
+                'metrics': json.loads(self.metrics) if self.metrics else [],
+                'filters': json.loads(self.filters) if self.filters else {},
+                'date_range': self.date_range,
+                'granularity': self.granularity,
+                'timezone': self.timezone,
+                'visualization_type': self.visualization_type,
+                'schedule': self.schedule
+            },
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'url': f'/analytics/reports/{self.id}'
+        }
+
+class ReportResult(db.Model):
+    """Cached output of one report run, keyed by (report, parameters, data version)"""
+    __tablename__ = 'report_results'
+
+    report_id = db.Column(db.Integer, db.ForeignKey('saved_reports.id', ondelete='CASCADE'), primary_key=True)
+    cache_key = db.Column(db.String(40), primary_key=True)
+    data_version = db.Column(db.String(40), nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON
+    duration_ms = db.Column(db.Integer)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReportResult {self.report_id} {self.cache_key[:8]}>'
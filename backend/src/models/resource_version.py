@@ -0,0 +1,13 @@
+from datetime import datetime
+from src.models.user import db
+
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+
+    scope = db.Column(db.String(64), primary_key=True)  # e.g. sub_account:12, pipeline:3
+    resource = db.Column(db.String(50), primary_key=True)  # contacts, conversations, opportunities, campaigns
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ResourceVersion {self.scope}/{self.resource} v{self.version}>'
@@ -0,0 +1,48 @@
+from datetime import datetime
+from src.models.user import db
+
+class DailyRollup(db.Model):
+    """Per sub-account, per UTC day dashboard counters maintained by services.metric_rollups"""
+    __tablename__ = 'daily_rollups'
+
+    sub_account_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    new_contacts = db.Column(db.Integer, default=0)
+    opportunities_opened = db.Column(db.Integer, default=0)  # by created_at day
+    opportunities_won = db.Column(db.Integer, default=0)  # by closed_at day
+    opportunities_lost = db.Column(db.Integer, default=0)  # by closed_at day
+    won_revenue = db.Column(db.Numeric(14, 2), default=0)  # by closed_at day
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyRollup {self.sub_account_id} {self.day}>'
+
+    def to_dict(self):
+        return {
+            'sub_account_id': self.sub_account_id,
+            'day': self.day.isoformat() if self.day else None,
+            'new_contacts': self.new_contacts or 0,
+            'opportunities_opened': self.opportunities_opened or 0,
+            'opportunities_won': self.opportunities_won or 0,
+            'opportunities_lost': self.opportunities_lost or 0,
+            'won_revenue': float(self.won_revenue or 0)
+        }
+
+class DailyActivityRollup(db.Model):
+    __tablename__ = 'daily_activity_rollups'
+
+    sub_account_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<DailyActivityRollup {self.sub_account_id} {self.day} {self.type}={self.count}>'
+
+class RollupDirtyDay(db.Model):
+    """(sub-account, day) pairs waiting for the catch-up job in deferred mode"""
+    __tablename__ = 'rollup_dirty_days'
+
+    sub_account_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
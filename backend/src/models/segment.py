@@ -0,0 +1,52 @@
+from datetime import datetime
+from src.models.user import db
+import json
+
+class Segment(db.Model):
+    __tablename__ = 'segments'
+    __table_args__ = (
+        db.Index('ix_segments_sub_account', 'sub_account_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sub_account_id = db.Column(db.Integer, db.ForeignKey('sub_accounts.id'), nullable=False)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'))  # set when materializing a campaign audience
+    name = db.Column(db.String(255), nullable=False)
+    criteria = db.Column(db.Text)  # JSON audience criteria, same format as Campaign.target_audience
+    member_count = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Segment {self.name}>'
+
+    @property
+    def criteria_dict(self):
+        return json.loads(self.criteria) if self.criteria else {}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sub_account_id': self.sub_account_id,
+            'campaign_id': self.campaign_id,
+            'name': self.name,
+            'criteria': self.criteria_dict,
+            'member_count': self.member_count or 0,
+            'refreshed_at': self.refreshed_at.isoformat() if self.refreshed_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class SegmentMember(db.Model):
+    __tablename__ = 'segment_members'
+    __table_args__ = (
+        db.Index('ix_segment_members_contact', 'contact_id'),
+    )
+
+    segment_id = db.Column(db.Integer, db.ForeignKey('segments.id', ondelete='CASCADE'), primary_key=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SegmentMember segment={self.segment_id} contact={self.contact_id}>'
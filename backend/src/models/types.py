@@ -0,0 +1,5 @@
+from sqlalchemy import JSON
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Native JSONB on PostgreSQL (GIN-indexable), JSON1 text on SQLite
+JSONDocument = JSON().with_variant(JSONB(), 'postgresql')
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.ai_features import AILeadScore, AIInsight, AutomationWorkflow, WorkflowExecution, AIConversation, PredictiveAnalytics
 from src.models.contact import Contact
+from src.services.segment_service import segment_service
 from datetime import datetime, timedelta
 import json
 import random
@@ -90,6 +91,8 @@ def calculate_lead_score():
             )
             db.session.add(lead_score)
         
+        # Segments with lead_score criteria read the score just written
+        segment_service.refresh_contacts(contact.sub_account_id, [contact.id])
         db.session.commit()
         
         return jsonify({
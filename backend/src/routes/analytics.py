@@ -1,125 +1,215 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, send_file, url_for
+from datetime import datetime, date, time, timedelta
+import numpy as np
 from src.models.user import db
 from src.models.contact import Contact
 from src.models.pipeline import Pipeline, Opportunity
 from src.models.campaign import Campaign
+from src.services.analytics_engine import (
+    analytics_engine, BucketGrid, COUNT_METRICS, resolve_timezone, timeframe_window, growth, plain
+)
+from src.models.job import BackgroundJob
+from src.models.report import SavedReport, ReportResult
+from src.services.job_runner import job_runner
+from src.services.report_export import report_exports
+from src.services.report_service import report_service
+from src.services.pipeline_funnel import pipeline_funnel
+from src.services.distinct_counts import distinct_counts
+from src.services.resource_versions import resource_versions
+from src.services.response_cache import response_cache, tenant_key
+from src.utils.metrics_query import MetricsQuery
+from src.utils.downsample import lttb, span_extremes
 import json
-import random
+import os
 
 analytics_bp = Blueprint('analytics', __name__)
+analytics_bp.record_once(lambda state: resource_versions.init_app(state.app))
+analytics_bp.record_once(lambda state: response_cache.init_app(state.app))
+analytics_bp.record_once(lambda state: resource_versions.on_commit(response_cache.bump))
+
+SOURCE_COLORS = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#06b6d4', '#ec4899', '#84cc16']
+TREND_THRESHOLD = 5.0  # percent change that counts as up/down
+TIME_SERIES_METRICS = {
+    'all': ('visitors', 'leads', 'conversions', 'revenue', 'conversion_rate', 'avg_deal_size'),
+    'revenue': ('revenue', 'avg_deal_size'),
+    'leads': ('visitors', 'leads', 'visitor_conversion_rate'),
+    'conversions': ('leads', 'conversions', 'conversion_rate'),
+}
+
+def _cache_tenant():
+    # These endpoints fall back to sub-account 1 when none is given
+    return tenant_key(request.args.get('sub_account_id', 1, type=int))
+
+def _analysis_window():
+    """(start, end, tz) of a request
+
+    ?timeframe=7d|30d|90d|1y counts whole local days back from today;
+    ?start=/?end= (YYYY-MM-DD, inclusive) override it. Days are those of ?tz=.
+    """
+    tz = resolve_timezone(request.args.get('tz', 'UTC'))
+    start_arg = request.args.get('start')
+    end_arg = request.args.get('end')
+    
+    if start_arg:
+        start = datetime.combine(date.fromisoformat(start_arg), time.min, tzinfo=tz)
+        if end_arg:
+            end = datetime.combine(date.fromisoformat(end_arg), time.min, tzinfo=tz) + timedelta(days=1)
+        else:
+            end = datetime.now(tz)
+    else:
+        start, end = timeframe_window(request.args.get('timeframe', '30d'), tz)
+    
+    if start >= end:
+        raise ValueError('start must be before end')
+    return start, end, tz
+
+def _request_grid(start, end, tz):
+    return BucketGrid.covering(start, end, request.args.get('granularity', 'day'), tz)
+
+def _downsample(records, columns, shape_of, counts=COUNT_METRICS):
+    """Thin records to ?max_points= points with LTTB on the `shape_of` column
+
+    Every kept record gets a 'range' of each column's min and max over the
+    buckets it stands for, so a spike thinned out of the line still shows.
+    """
+    max_points = request.args.get('max_points', type=int)
+    if max_points is None or max_points >= len(records):
+        return records
+    if max_points < 3:
+        raise ValueError('max_points must be at least 3')
+    
+    kept, starts = lttb(columns[shape_of], max_points)
+    extremes = {name: span_extremes(values, starts) for name, values in columns.items()}
+    thinned = []
+    for position, index in enumerate(kept):
+        record = dict(records[index])
+        record['range'] = {
+            name: [plain(low[position], name in counts), plain(high[position], name in counts)]
+            for name, (low, high) in extremes.items()
+        }
+        thinned.append(record)
+    return thinned
 
 @analytics_bp.route('/overview', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_analytics_overview():
     """Get analytics overview with key metrics"""
     try:
         sub_account_id = request.args.get('sub_account_id', 1, type=int)
         timeframe = request.args.get('timeframe', '30d')
-        
-        # Calculate date range
-        if timeframe == '7d':
-            start_date = datetime.utcnow() - timedelta(days=7)
-        elif timeframe == '30d':
-            start_date = datetime.utcnow() - timedelta(days=30)
-        elif timeframe == '90d':
-            start_date = datetime.utcnow() - timedelta(days=90)
-        elif timeframe == '1y':
-            start_date = datetime.utcnow() - timedelta(days=365)
-        else:
-            start_date = datetime.utcnow() - timedelta(days=30)
-        
-        # Get basic counts
-        total_contacts = Contact.query.filter_by(sub_account_id=sub_account_id).count()
-        new_contacts = Contact.query.filter(
-            Contact.sub_account_id == sub_account_id,
-            Contact.created_at >= start_date
-        ).count()
-        
-        # Mock revenue data - in production, this would come from actual deals/orders
-        total_revenue = 125000 + (random.randint(-10000, 20000))
-        revenue_growth = random.uniform(5.0, 25.0)
-        conversion_rate = random.uniform(2.0, 8.0)
-        conversion_change = random.uniform(-1.0, 3.0)
-        avg_deal_size = random.randint(3000, 6000)
-        deal_size_change = random.uniform(-5.0, 5.0)
+        start, end, tz = _analysis_window()
+        
+        # Current and previous period totals from one pass over each table
+        current, previous = analytics_engine.compare(
+            sub_account_id, start, end, tz, metrics=('leads', 'revenue', 'conversion_rate', 'avg_deal_size')
+        )
+        contacts = MetricsQuery(Contact).where(Contact.sub_account_id == sub_account_id).count('total').run()
+        # Approximate (HyperLogLog) beyond a week unless ?exact=1; ?exact=0 forces the sketches
+        exact = request.args.get('exact')
+        uniques, uniques_exact = distinct_counts.unique_counts(
+            sub_account_id, start, end, exact=None if exact is None else exact in ('1', 'true'),
+            dimensions=('visitors', 'sessions')
+        )
         
         overview = {
-            'total_contacts': total_contacts,
-            'new_contacts': new_contacts,
-            'total_revenue': total_revenue,
-            'revenue_growth': revenue_growth,
-            'conversion_rate': conversion_rate,
-            'conversion_change': conversion_change,
-            'avg_deal_size': avg_deal_size,
-            'deal_size_change': deal_size_change,
+            'total_contacts': contacts['total'],
+            'new_contacts': plain(current['leads'], count=True),
+            'total_revenue': plain(current['revenue']),
+            'revenue_growth': plain(growth(current['revenue'], previous['revenue'])),
+            'conversion_rate': plain(current['conversion_rate']),
+            'conversion_change': plain(current['conversion_rate'] - previous['conversion_rate']),
+            'avg_deal_size': plain(current['avg_deal_size']),
+            'deal_size_change': plain(growth(current['avg_deal_size'], previous['avg_deal_size'])),
+            'unique_visitors': uniques['visitors'],
+            'unique_sessions': uniques['sessions'],
+            'unique_counts_exact': uniques_exact,
             'timeframe': timeframe
         }
         
         return jsonify(overview)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/revenue-trend', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_revenue_trend():
     """Get revenue trend data over time"""
     try:
         sub_account_id = request.args.get('sub_account_id', 1, type=int)
         timeframe = request.args.get('timeframe', '30d')
+        start, end, tz = _analysis_window()
+        grid = _request_grid(start, end, tz)
         
-        # Generate mock revenue trend data
-        if timeframe == '7d':
-            days = 7
-        elif timeframe == '30d':
-            days = 30
-        elif timeframe == '90d':
-            days = 90
-        else:
-            days = 30
+        series = analytics_engine.series(sub_account_id, grid, metrics=('revenue', 'sales'))
+        revenue = series['revenue']
+        # Bucket-over-bucket change; the first bucket has nothing to compare with
+        revenue_growth = np.concatenate(([np.nan], growth(revenue[1:], revenue[:-1])))[:len(revenue)]
         
         trend_data = []
-        base_revenue = 3000
-        
-        for i in range(days):
-            date = (datetime.utcnow() - timedelta(days=days-i-1)).strftime('%Y-%m-%d')
-            # Add some randomness and trend
-            daily_revenue = base_revenue + random.randint(-1000, 2000) + (i * 50)
-            deals = random.randint(1, 8)
-            
+        for label, amount, deals, change in zip(grid.labels(), revenue, series['sales'], revenue_growth):
             trend_data.append({
-                'date': date,
-                'revenue': max(0, daily_revenue),
-                'deals': deals
+                'date': label,
+                'revenue': plain(amount),
+                'deals': plain(deals, count=True),
+                'growth': plain(change)
             })
         
+        total_points = len(trend_data)
+        trend_data = _downsample(
+            trend_data, {'revenue': revenue, 'deals': series['sales']}, 'revenue', counts=('deals',)
+        )
+        if len(trend_data) < total_points:
+            # Thinned: growth from the previous kept point, as the line is drawn, not from the adjacent bucket
+            kept_revenue = np.array([record['revenue'] for record in trend_data], dtype=np.float64)
+            kept_growth = np.concatenate(([np.nan], growth(kept_revenue[1:], kept_revenue[:-1])))
+            for record, change in zip(trend_data, kept_growth):
+                record['growth'] = plain(change)
+        
         return jsonify({
             'trend_data': trend_data,
-            'timeframe': timeframe
+            'timeframe': timeframe,
+            'granularity': grid.granularity,
+            'total_points': total_points
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/lead-sources', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_lead_sources():
     """Get lead source distribution"""
     try:
         sub_account_id = request.args.get('sub_account_id', 1, type=int)
         
-        # Mock lead source data - in production, analyze actual contact sources
-        lead_sources = [
-            {'name': 'Website', 'value': 35, 'count': 998, 'color': '#3b82f6'},
-            {'name': 'Referrals', 'value': 25, 'count': 712, 'color': '#10b981'},
-            {'name': 'Social Media', 'value': 20, 'count': 569, 'color': '#f59e0b'},
-            {'name': 'Google Ads', 'value': 15, 'count': 427, 'color': '#ef4444'},
-            {'name': 'Other', 'value': 5, 'count': 141, 'color': '#8b5cf6'}
-        ]
+        start, end, tz = _analysis_window()
+        
+        names, totals = analytics_engine.breakdown(sub_account_id, start, end)
+        order = np.argsort(-totals['leads'], kind='stable')
+        
+        lead_sources = []
+        for position, index in enumerate(order):
+            if not totals['leads'][index]:
+                continue
+            lead_sources.append({
+                'name': names[index] or 'Unknown',
+                'value': round(float(totals['share'][index]), 1),
+                'count': plain(totals['leads'][index], count=True),
+                'color': SOURCE_COLORS[position % len(SOURCE_COLORS)]
+            })
         
         return jsonify({
             'lead_sources': lead_sources,
             'total_leads': sum(source['count'] for source in lead_sources)
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -193,92 +283,59 @@ def get_campaign_performance():
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/pipeline-conversion', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_pipeline_conversion():
     """Get pipeline conversion funnel data"""
     try:
         sub_account_id = request.args.get('sub_account_id', 1, type=int)
+        pipeline_id = request.args.get('pipeline_id', type=int)
+        weeks = min(max(request.args.get('weeks', 12, type=int), 1), 52)
         
-        # Mock pipeline conversion data
-        pipeline_stages = [
-            {'stage': 'Lead', 'count': 1000, 'converted': 600, 'conversion_rate': 60.0},
-            {'stage': 'Qualified', 'count': 600, 'converted': 300, 'conversion_rate': 50.0},
-            {'stage': 'Proposal', 'count': 300, 'converted': 150, 'conversion_rate': 50.0},
-            {'stage': 'Negotiation', 'count': 150, 'converted': 90, 'conversion_rate': 60.0},
-            {'stage': 'Closed Won', 'count': 90, 'converted': 90, 'conversion_rate': 100.0}
-        ]
+        query = Pipeline.query.filter_by(sub_account_id=sub_account_id)
+        if pipeline_id is not None:
+            pipeline = query.filter_by(id=pipeline_id).first()
+        else:
+            pipeline = query.order_by(Pipeline.is_default.desc(), Pipeline.id).first()
+        if not pipeline:
+            return jsonify({'error': 'Pipeline not found'}), 404
         
-        return jsonify({
-            'pipeline_stages': pipeline_stages,
-            'overall_conversion': (90 / 1000) * 100  # 9% overall conversion
-        })
+        return jsonify(pipeline_funnel.funnel(pipeline, cohort_weeks=weeks))
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/channel-performance', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_channel_performance():
     """Get performance metrics by channel"""
     try:
         sub_account_id = request.args.get('sub_account_id', 1, type=int)
         
-        # Mock channel performance data
-        channels = [
-            {
-                'channel': 'Email',
-                'leads': 456,
-                'conversions': 107,
-                'revenue': 45000,
-                'cost': 2500,
-                'avg_deal_size': 420,
-                'conversion_rate': 23.5,
-                'roi': 1700,
-                'trend': 'up'
-            },
-            {
-                'channel': 'Social Media',
-                'leads': 324,
-                'conversions': 68,
-                'revenue': 28500,
-                'cost': 3200,
-                'avg_deal_size': 419,
-                'conversion_rate': 21.0,
-                'roi': 791,
-                'trend': 'up'
-            },
-            {
-                'channel': 'Paid Ads',
-                'leads': 289,
-                'conversions': 72,
-                'revenue': 32000,
-                'cost': 8500,
-                'avg_deal_size': 444,
-                'conversion_rate': 24.9,
-                'roi': 276,
-                'trend': 'stable'
-            },
-            {
-                'channel': 'Organic Search',
-                'leads': 178,
-                'conversions': 46,
-                'revenue': 19500,
-                'cost': 0,
-                'avg_deal_size': 424,
-                'conversion_rate': 25.8,
-                'roi': float('inf'),
-                'trend': 'up'
-            },
-            {
-                'channel': 'Referrals',
-                'leads': 145,
-                'conversions': 42,
-                'revenue': 18900,
-                'cost': 500,
-                'avg_deal_size': 450,
-                'conversion_rate': 29.0,
-                'roi': 3680,
-                'trend': 'up'
-            }
-        ]
+        start, end, tz = _analysis_window()
+        
+        names, totals = analytics_engine.breakdown(sub_account_id, start, end)
+        # Revenue trend where there was revenue to compare, lead trend otherwise
+        change = np.where(np.isnan(totals['revenue_growth']), totals['lead_growth'], totals['revenue_growth'])
+        trends = np.where(change > TREND_THRESHOLD, 'up', np.where(change < -TREND_THRESHOLD, 'down', 'stable'))
+        
+        channels = []
+        for index in np.argsort(-totals['revenue'], kind='stable'):
+            if not (totals['leads'][index] or totals['sales'][index]):
+                continue
+            channels.append({
+                'channel': names[index] or 'Unknown',
+                'leads': plain(totals['leads'][index], count=True),
+                'conversions': plain(totals['conversions'][index], count=True),
+                'orders': plain(totals['orders'][index], count=True),
+                'revenue': plain(totals['revenue'][index]),
+                'cost': None,  # no ad spend is tracked per source yet
+                'avg_deal_size': plain(totals['avg_deal_size'][index]),
+                'conversion_rate': plain(totals['conversion_rate'][index]),
+                'roi': None,
+                'revenue_growth': plain(totals['revenue_growth'][index]),
+                'trend': str(trends[index])
+            })
         
         return jsonify({
             'channels': channels,
@@ -287,10 +344,13 @@ def get_channel_performance():
             'total_revenue': sum(ch['revenue'] for ch in channels)
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/time-series', methods=['GET'])
+@response_cache.cached(tenant=_cache_tenant)
 def get_time_series_data():
     """Get time series data for detailed analysis"""
     try:
@@ -298,44 +358,27 @@ def get_time_series_data():
         timeframe = request.args.get('timeframe', '30d')
         metric = request.args.get('metric', 'all')  # all, revenue, leads, conversions
         
-        # Generate time series data
-        if timeframe == '7d':
-            days = 7
-        elif timeframe == '30d':
-            days = 30
-        elif timeframe == '90d':
-            days = 90
-        else:
-            days = 30
-        
-        time_series = []
-        for i in range(days):
-            date = (datetime.utcnow() - timedelta(days=days-i-1)).strftime('%Y-%m-%d')
-            
-            # Generate realistic data with trends and seasonality
-            base_visitors = 400 + random.randint(-100, 200)
-            visitors = max(100, base_visitors + (i * 2))  # Slight upward trend
-            
-            leads = max(10, int(visitors * random.uniform(0.08, 0.15)))
-            conversions = max(1, int(leads * random.uniform(0.15, 0.35)))
-            revenue = conversions * random.randint(300, 800)
-            
-            time_series.append({
-                'date': date,
-                'visitors': visitors,
-                'leads': leads,
-                'conversions': conversions,
-                'revenue': revenue,
-                'conversion_rate': (conversions / leads) * 100 if leads > 0 else 0,
-                'avg_deal_size': revenue / conversions if conversions > 0 else 0
-            })
+        fields = TIME_SERIES_METRICS.get(metric)
+        if fields is None:
+            return jsonify({'error': f"metric must be one of {', '.join(TIME_SERIES_METRICS)}"}), 400
+        
+        start, end, tz = _analysis_window()
+        grid = _request_grid(start, end, tz)
+        series = analytics_engine.series(sub_account_id, grid, metrics=fields)
+        time_series = series.records(fields)
+        total_points = len(time_series)
+        time_series = _downsample(time_series, {name: series[name] for name in fields}, fields[0])
         
         return jsonify({
             'time_series': time_series,
             'timeframe': timeframe,
-            'metric': metric
+            'metric': metric,
+            'granularity': grid.granularity,
+            'total_points': total_points
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -416,63 +459,158 @@ def get_ai_insights():
 
 @analytics_bp.route('/export', methods=['POST'])
 def export_analytics():
-    """Export analytics data in various formats"""
+    """Start a background export of a report as CSV, XLSX or PDF"""
     try:
-        data = request.get_json()
-        
-        export_format = data.get('format', 'csv')  # csv, pdf, excel
-        report_type = data.get('report_type', 'overview')  # overview, detailed, custom
-        date_range = data.get('date_range', '30d')
+        data = request.get_json() or {}
         sub_account_id = data.get('sub_account_id', 1)
         
-        # Mock export functionality - in production, generate actual files
-        export_data = {
-            'export_id': f"export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
-            'format': export_format,
-            'report_type': report_type,
-            'date_range': date_range,
-            'status': 'processing',
-            'estimated_completion': (datetime.utcnow() + timedelta(minutes=2)).isoformat(),
-            'download_url': None  # Will be populated when ready
-        }
+        try:
+            params = report_exports.validate(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Always off the request path: list reports can run to millions of rows
+        job = job_runner.create('analytics_export', sub_account_id, params=params)
+        job_runner.submit(job, report_exports.run, sub_account_id, params)
         
         return jsonify({
             'message': 'Export initiated successfully',
-            'export_data': export_data
-        })
+            'export_data': _export_status(job)
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/export/<int:job_id>', methods=['GET'])
+def get_export(job_id):
+    try:
+        job = BackgroundJob.query.filter_by(id=job_id, kind='analytics_export').first_or_404()
+        return jsonify({'export_data': _export_status(job)})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/export/<int:job_id>/download', methods=['GET'])
+def download_export(job_id):
+    """Serve a finished export; Range / If-Range requests get partial (206) responses"""
+    job = BackgroundJob.query.filter_by(id=job_id, kind='analytics_export').first_or_404()
+    if job.status != 'completed':
+        return jsonify({'error': f'Export is {job.status}'}), 409
+    
+    path = report_exports.path_for(job)
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Export file has expired'}), 410
+    
+    result = json.loads(job.result)
+    return send_file(
+        path,
+        mimetype=result['content_type'],
+        as_attachment=True,
+        download_name=result['filename'],
+        conditional=True,
+        etag=True,
+        max_age=0
+    )
+
+def _export_status(job):
+    data = job.to_dict()
+    data['export_id'] = job.id
+    data['download_url'] = url_for('analytics.download_export', job_id=job.id) if job.status == 'completed' else None
+    return data
+
 @analytics_bp.route('/custom-report', methods=['POST'])
 def create_custom_report():
-    """Create a custom analytics report"""
+    """Save a custom analytics report; its config is validated and compiled once, here"""
     try:
-        data = request.get_json()
-        
-        report_config = {
-            'name': data.get('name', 'Custom Report'),
-            'metrics': data.get('metrics', []),
-            'filters': data.get('filters', {}),
-            'date_range': data.get('date_range', '30d'),
-            'visualization_type': data.get('visualization_type', 'chart'),
-            'schedule': data.get('schedule', None)  # For automated reports
-        }
+        data = request.get_json() or {}
+        sub_account_id = data.get('sub_account_id', 1)
         
-        # Mock report creation
-        report = {
-            'id': f"report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
-            'config': report_config,
-            'created_at': datetime.utcnow().isoformat(),
-            'status': 'created',
-            'url': f"/analytics/reports/{report_config['name'].lower().replace(' ', '_')}"
-        }
+        try:
+            config = report_service.validate(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report = report_service.apply(SavedReport(sub_account_id=sub_account_id), config)
+        db.session.add(report)
+        db.session.commit()
         
         return jsonify({
             'message': 'Custom report created successfully',
-            'report': report
+            'report': report.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/reports', methods=['GET'])
+def get_reports():
+    try:
+        sub_account_id = request.args.get('sub_account_id', 1, type=int)
+        reports = SavedReport.query.filter_by(sub_account_id=sub_account_id)\
+            .order_by(SavedReport.name).all()
+        
+        return jsonify({'reports': [report.to_dict() for report in reports]})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/reports/<int:report_id>', methods=['GET'])
+def run_report(report_id):
+    """Open a saved report: served from the result cache unless its data changed (or ?refresh=1)"""
+    try:
+        report = SavedReport.query.get_or_404(report_id)
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        
+        result, cached, computed_at = report_service.run(report, refresh=refresh)
+        
+        return jsonify({
+            'report': report.to_dict(),
+            'result': result,
+            'cached': cached,
+            'computed_at': computed_at.isoformat() if computed_at else None
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/reports/<int:report_id>', methods=['PUT'])
+def update_report(report_id):
+    try:
+        report = SavedReport.query.get_or_404(report_id)
+        data = request.get_json() or {}
+        
+        try:
+            config = report_service.validate(data, current={'name': report.name, **report.to_dict()['config']})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        report_service.apply(report, config)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Report updated successfully',
+            'report': report.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/reports/<int:report_id>', methods=['DELETE'])
+def delete_report(report_id):
+    try:
+        report = SavedReport.query.get_or_404(report_id)
+        ReportResult.query.filter_by(report_id=report.id).delete()
+        db.session.delete(report)
+        db.session.commit()
+        
+        return jsonify({'message': 'Report deleted successfully'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -8,10 +8,18 @@ from src.models.communications import (
 )
 from src.models.contact import Contact
 from src.models.user import User
+from src.utils.serializers import conversation_serializer, InvalidFields
+from src.utils.metrics_query import MetricsQuery
+from src.services.resource_versions import resource_versions, tenant_scope
 
 communications_bp = Blueprint('communications', __name__)
+communications_bp.record_once(lambda state: resource_versions.init_app(state.app))
 
 @communications_bp.route('/conversations', methods=['GET'])
+@resource_versions.conditional(
+    'conversations', 'contacts',
+    scope=lambda kwargs: tenant_scope(request.args.get('sub_account_id', 1, type=int))
+)
 def get_conversations():
     """Get all conversations for a sub-account"""
     try:
@@ -24,8 +32,13 @@ def get_conversations():
         search = request.args.get('search')
         assigned_to = request.args.get('assigned_to', type=int)
         
+        try:
+            serializer = conversation_serializer.for_request(request.args.get('fields'))
+        except InvalidFields as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Build query
-        query = Conversation.query.filter_by(sub_account_id=sub_account_id)
+        query = serializer.apply(Conversation.query.filter_by(sub_account_id=sub_account_id))
         
         # Apply filters
         if status:
@@ -56,7 +69,7 @@ def get_conversations():
         )
         
         return jsonify({
-            'conversations': [conv.to_dict() for conv in conversations.items],
+            'conversations': serializer.many(conversations.items),
             'total': conversations.total,
             'pages': conversations.pages,
             'current_page': page,
@@ -402,59 +415,38 @@ def get_communication_stats():
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Get conversation stats
-        total_conversations = Conversation.query.filter_by(sub_account_id=sub_account_id).count()
-        
-        active_conversations = Conversation.query.filter_by(
-            sub_account_id=sub_account_id,
-            status=ConversationStatus.OPEN
-        ).count()
-        
-        # Get message stats
-        total_messages = Message.query.join(Conversation)\
-            .filter(Conversation.sub_account_id == sub_account_id)\
-            .filter(Message.created_at >= start_date).count()
-        
-        inbound_messages = Message.query.join(Conversation)\
-            .filter(Conversation.sub_account_id == sub_account_id)\
-            .filter(Message.direction == MessageDirection.INBOUND)\
-            .filter(Message.created_at >= start_date).count()
-        
-        outbound_messages = Message.query.join(Conversation)\
-            .filter(Conversation.sub_account_id == sub_account_id)\
-            .filter(Message.direction == MessageDirection.OUTBOUND)\
-            .filter(Message.created_at >= start_date).count()
+        # One scan per table: every counter is a conditional aggregate
+        conversations = MetricsQuery(Conversation)\
+            .where(Conversation.sub_account_id == sub_account_id)\
+            .count('total')\
+            .count('active', Conversation.status == ConversationStatus.OPEN)\
+            .count('email', Conversation.type == MessageType.EMAIL)\
+            .count('sms', Conversation.type == MessageType.SMS)\
+            .count('call', Conversation.type == MessageType.CALL)\
+            .run()
+        
+        messages = MetricsQuery(Message)\
+            .join(Conversation, Conversation.id == Message.conversation_id)\
+            .where(Conversation.sub_account_id == sub_account_id, Message.created_at >= start_date)\
+            .count('total')\
+            .count('inbound', Message.direction == MessageDirection.INBOUND)\
+            .count('outbound', Message.direction == MessageDirection.OUTBOUND)\
+            .run()
         
         # Response time stats (mock for demo)
         avg_response_time = "2h 15m"
         
-        # Channel breakdown
-        email_conversations = Conversation.query.filter_by(
-            sub_account_id=sub_account_id,
-            type=MessageType.EMAIL
-        ).count()
-        
-        sms_conversations = Conversation.query.filter_by(
-            sub_account_id=sub_account_id,
-            type=MessageType.SMS
-        ).count()
-        
-        call_conversations = Conversation.query.filter_by(
-            sub_account_id=sub_account_id,
-            type=MessageType.CALL
-        ).count()
-        
         return jsonify({
-            'total_conversations': total_conversations,
-            'active_conversations': active_conversations,
-            'total_messages': total_messages,
-            'inbound_messages': inbound_messages,
-            'outbound_messages': outbound_messages,
+            'total_conversations': conversations['total'],
+            'active_conversations': conversations['active'],
+            'total_messages': messages['total'],
+            'inbound_messages': messages['inbound'],
+            'outbound_messages': messages['outbound'],
             'avg_response_time': avg_response_time,
             'channel_breakdown': {
-                'email': email_conversations,
-                'sms': sms_conversations,
-                'call': call_conversations
+                'email': conversations['email'],
+                'sms': conversations['sms'],
+                'call': conversations['call']
             },
             'period_days': days
         })
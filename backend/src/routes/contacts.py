@@ -1,64 +1,114 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from src.models.user import db
 from src.models.contact import Contact, ContactActivity, ContactNote, ContactTask
 from src.models.agency import SubAccount
+from src.services.contact_filters import apply_contact_filters
+from src.services.contact_tags import contact_tag_service, normalize_tags, parse_tags
+from src.services.contact_import import contact_import_service, detect_format
+from src.services.contact_bulk import contact_bulk_service
+from src.services.job_runner import job_runner
+from src.services.activity_log import activity_log
+from src.services.resource_versions import resource_versions
+from src.services.metric_rollups import metric_rollups
+from src.services.contact_timeline import contact_timeline
+from src.services.contact_lookup import contact_lookup
+from src.services.contact_dedupe import contact_dedupe
+from src.services.segment_service import segment_service
+from src.models.dedupe import DuplicateCluster
+from src.models.job import BackgroundJob
+from src.utils.pagination import encode_cursor, decode_cursor, parse_bool_arg, InvalidCursor
+from src.utils.serializers import contact_serializer, InvalidFields
 from datetime import datetime
+import tempfile
 import json
+import csv
+import io
 
 contacts_bp = Blueprint('contacts', __name__)
+contacts_bp.record_once(lambda state: activity_log.init_app(state.app))
+contacts_bp.record_once(lambda state: resource_versions.init_app(state.app))
+contacts_bp.record_once(lambda state: metric_rollups.init_app(state.app))
 
 @contacts_bp.route('', methods=['GET'])
+@resource_versions.conditional('contacts')
 def get_contacts():
     try:
         # Get query parameters
-        sub_account_id = request.args.get('sub_account_id', type=int)
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '')
-        tags = request.args.get('tags', '')
-        status = request.args.get('status', '')
-        
-        # Build query
-        query = Contact.query
-        
-        if sub_account_id:
-            query = query.filter_by(sub_account_id=sub_account_id)
-        
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Contact.first_name.ilike(search_term),
-                    Contact.last_name.ilike(search_term),
-                    Contact.email.ilike(search_term),
-                    Contact.company.ilike(search_term)
-                )
-            )
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        if tags:
-            tag_list = tags.split(',')
-            for tag in tag_list:
-                query = query.filter(Contact.tags.contains(tag.strip()))
+        after = request.args.get('after')
+        with_total = parse_bool_arg(request.args.get('with_total'))
+        
+        # ?fields=id,full_name,email narrows both the SELECT list and the payload
+        try:
+            serializer = contact_serializer.for_request(request.args.get('fields'))
+        except InvalidFields as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Build query; search results are ranked in page mode, cursor mode keeps the keyset order
+        try:
+            query = apply_contact_filters(Contact.query, request.args, ranked=after is None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        query = serializer.apply(query, Contact.created_at)
+        
+        # Cursor mode: seek past the last (created_at, id) seen instead of OFFSET
+        if after is not None:
+            try:
+                position = decode_cursor(after, datetime, int) if after else None
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify(_get_contacts_page_after(query, position, per_page, with_total, serializer))
         
         # Paginate results
-        contacts = query.order_by(Contact.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        contacts = query.order_by(Contact.created_at.desc(), Contact.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False, count=with_total
         )
         
+        items = contacts.items
         return jsonify({
-            'contacts': [contact.to_dict() for contact in contacts.items],
+            'contacts': _serialize_contacts(items, serializer),
             'total': contacts.total,
-            'pages': contacts.pages,
+            'pages': contacts.pages if with_total else None,
             'current_page': page,
-            'per_page': per_page
+            'per_page': per_page,
+            'next_cursor': _contact_cursor(items[-1]) if len(items) == per_page else None
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _serialize_contacts(contacts, serializer=None):
+    """Serialize a page of contacts; related counts come from one aggregate query"""
+    return (serializer or contact_serializer.compile()).many(contacts)
+
+def _contact_cursor(contact):
+    return encode_cursor(contact.created_at, contact.id)
+
+def _get_contacts_page_after(query, position, per_page, with_total, serializer=None):
+    """Keyset page of contacts ordered newest first, starting after `position`"""
+    total = query.order_by(None).count() if with_total else None
+    
+    if position:
+        created_at, contact_id = position
+        query = query.filter(
+            db.tuple_(Contact.created_at, Contact.id) < db.tuple_(created_at, contact_id)
+        )
+    
+    # Fetch one extra row to know whether another page exists without counting
+    rows = query.order_by(Contact.created_at.desc(), Contact.id.desc())\
+        .limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    contacts = rows[:per_page]
+    
+    return {
+        'contacts': _serialize_contacts(contacts, serializer),
+        'total': total,
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': _contact_cursor(contacts[-1]) if has_more else None
+    }
+
 @contacts_bp.route('', methods=['POST'])
 def create_contact():
     try:
@@ -76,22 +126,18 @@ def create_contact():
             first_name=data.get('first_name'),
             last_name=data.get('last_name'),
             company=data.get('company'),
-            tags=json.dumps(data.get('tags', [])),
-            custom_fields=json.dumps(data.get('custom_fields', {})),
+            tags=json.dumps(normalize_tags(data.get('tags', []))),
+            custom_fields=data.get('custom_fields', {}),
             source=data.get('source'),
-            status=data.get('status', 'active')
+            status=data.get('status', 'active'),
+            owner_id=data.get('owner_id')
         )
         
         db.session.add(contact)
-        db.session.commit()
-        
-        # Create activity record
-        activity = ContactActivity(
-            contact_id=contact.id,
-            type='created',
-            description='Contact created'
-        )
-        db.session.add(activity)
+        db.session.flush()
+        contact_tag_service.sync_contact(contact, data.get('tags', []))
+        activity_log.contact(contact.id, 'created', 'Contact created')
+        segment_service.refresh_contacts(contact.sub_account_id, [contact.id])
         db.session.commit()
         
         return jsonify({
@@ -103,6 +149,333 @@ def create_contact():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+EXPORT_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'phone', 'company',
+    'status', 'source', 'tags', 'custom_fields', 'created_at', 'updated_at'
+)
+EXPORT_BATCH_SIZE = 1000
+
+@contacts_bp.route('/export', methods=['GET'])
+def export_contacts():
+    """Stream every contact matching the list filters as CSV or NDJSON"""
+    try:
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        statement = db.select(*[getattr(Contact, column) for column in EXPORT_COLUMNS])
+        try:
+            statement = apply_contact_filters(statement, request.args).order_by(Contact.id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def generate():
+            # yield_per turns on a server-side cursor, so only one batch is ever in memory
+            result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            try:
+                if export_format == 'csv':
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerow(EXPORT_COLUMNS)
+                    for batch in result.partitions():
+                        for row in batch:
+                            writer.writerow(_export_csv_row(row))
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate(0)
+                    yield buffer.getvalue()
+                else:
+                    for batch in result.partitions():
+                        yield ''.join(json.dumps(_export_record(row)) + '\n' for row in batch)
+            finally:
+                result.close()
+        
+        filename = f"contacts_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _export_record(row):
+    record = dict(row._mapping)
+    record['tags'] = parse_tags(record['tags'])
+    record['custom_fields'] = record['custom_fields'] or {}
+    for column in ('created_at', 'updated_at'):
+        record[column] = record[column].isoformat() if record[column] else None
+    return record
+
+def _export_csv_row(row):
+    # Tags are ;-joined so the file round-trips through POST /contacts/import
+    record = row._mapping
+    values = []
+    for column in EXPORT_COLUMNS:
+        value = record[column]
+        if column == 'tags':
+            value = ';'.join(parse_tags(value))
+        elif column == 'custom_fields':
+            value = json.dumps(value) if value else ''
+        elif column in ('created_at', 'updated_at'):
+            value = value.isoformat() if value else ''
+        values.append('' if value is None else value)
+    return values
+
+@contacts_bp.route('/import', methods=['POST'])
+def import_contacts():
+    """Start a bulk import from an uploaded CSV or NDJSON file"""
+    try:
+        sub_account_id = request.form.get('sub_account_id', type=int)
+        upload = request.files.get('file')
+        
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+        if not upload:
+            return jsonify({'error': 'file is required'}), 400
+        
+        file_format = detect_format(upload.filename, request.form.get('format'))
+        if not file_format:
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        # Spool the upload to disk so the import outlives the request without holding it in memory
+        spool = tempfile.NamedTemporaryFile(prefix='contact_import_', suffix=f'.{file_format}', delete=False)
+        with spool:
+            upload.save(spool)
+        
+        job = job_runner.create('contact_import', sub_account_id, params={
+            'filename': upload.filename,
+            'format': file_format
+        })
+        job_runner.submit(job, contact_import_service.import_file, spool.name, file_format,
+                          sub_account_id, remove_file=True)
+        
+        return jsonify({
+            'message': 'Import started',
+            'job': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/import/<int:job_id>', methods=['GET'])
+def get_import_job(job_id):
+    try:
+        job = BackgroundJob.query.filter_by(id=job_id, kind='contact_import').first_or_404()
+        return jsonify({'job': job.to_dict()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/bulk', methods=['PATCH'])
+def bulk_update_contacts():
+    """Apply one change set to many contacts, selected by id list or by the GET /contacts filters
+
+    Body: {"sub_account_id", "ids"?: [...], "changes": {"status", "owner_id",
+    "add_tags", "remove_tags", "custom_fields"}}. Without "ids" the selection
+    comes from the query string, exactly as in GET /contacts.
+    """
+    try:
+        data = request.get_json() or {}
+        sub_account_id = data.get('sub_account_id') or request.args.get('sub_account_id', type=int)
+        ids = data.get('ids')
+        
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+        
+        try:
+            changes = contact_bulk_service.validate_changes(data.get('changes'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        filters = None if ids is not None else request.args.copy()
+        try:
+            total = contact_bulk_service.count(sub_account_id, ids=ids, filters=filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        job = job_runner.create('contact_bulk_update', sub_account_id, params={
+            'changes': changes,
+            'ids': len(ids) if ids is not None else None,
+            'filters': filters.to_dict() if filters is not None else None
+        }, total=total)
+        
+        if total > contact_bulk_service.INLINE_LIMIT:
+            job_runner.submit(job, contact_bulk_service.run, sub_account_id, changes,
+                              ids=ids, filters=filters, user_id=data.get('user_id'))
+            return jsonify({
+                'message': 'Bulk update started',
+                'job': job.to_dict()
+            }), 202
+        
+        job_runner.run_inline(job, contact_bulk_service.run, sub_account_id, changes,
+                              ids=ids, filters=filters, user_id=data.get('user_id'))
+        db.session.refresh(job)
+        
+        if job.status != 'completed':
+            # ValueError is how the bulk service rejects changes or filters it cannot apply
+            invalid = any(error.get('type') == 'ValueError' for error in job.errors_list)
+            return jsonify({
+                'error': 'Bulk update failed',
+                'errors': job.errors_list,
+                'job': job.to_dict()
+            }), 400 if invalid else 500
+        
+        return jsonify({
+            'message': 'Contacts updated successfully',
+            'job': job.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/bulk/<int:job_id>', methods=['GET'])
+def get_bulk_update_job(job_id):
+    try:
+        job = BackgroundJob.query.filter_by(id=job_id, kind='contact_bulk_update').first_or_404()
+        return jsonify({'job': job.to_dict()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/duplicates/scan', methods=['POST'])
+def scan_duplicates():
+    """Start a background duplicate scan for one sub-account"""
+    try:
+        data = request.get_json() or {}
+        sub_account_id = data.get('sub_account_id')
+        
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+        
+        job = job_runner.create('duplicate_scan', sub_account_id)
+        job_runner.submit(job, contact_dedupe.scan, sub_account_id)
+        
+        return jsonify({
+            'message': 'Duplicate scan started',
+            'job': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/duplicates', methods=['GET'])
+def get_duplicate_clusters():
+    """Duplicate clusters found by the last scan, strongest matches first"""
+    try:
+        sub_account_id = request.args.get('sub_account_id', type=int)
+        status = request.args.get('status', 'pending')
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+        
+        clusters = DuplicateCluster.query.filter_by(sub_account_id=sub_account_id, status=status)\
+            .order_by(DuplicateCluster.score.desc(), DuplicateCluster.id)\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        
+        # One query for the contacts of every cluster on the page
+        contact_ids = {contact_id for cluster in clusters.items for contact_id in cluster.contact_id_list}
+        contacts = {
+            contact.id: contact
+            for contact in Contact.query.filter(Contact.id.in_(contact_ids)).all()
+        } if contact_ids else {}
+        counts = Contact.related_counts(list(contacts))
+        
+        results = []
+        for cluster in clusters.items:
+            cluster_data = cluster.to_dict()
+            cluster_data['contacts'] = [
+                contacts[contact_id].to_dict(counts=counts.get(contact_id))
+                for contact_id in cluster.contact_id_list if contact_id in contacts
+            ]
+            results.append(cluster_data)
+        
+        return jsonify({
+            'clusters': results,
+            'total': clusters.total,
+            'pages': clusters.pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/merge', methods=['POST'])
+def merge_contacts():
+    """Merge duplicate contacts into a primary contact"""
+    try:
+        data = request.get_json() or {}
+        primary_id = data.get('primary_id')
+        duplicate_ids = data.get('duplicate_ids') or []
+        cluster = None
+        
+        if data.get('cluster_id'):
+            cluster = DuplicateCluster.query.get_or_404(data['cluster_id'])
+            if not duplicate_ids:
+                duplicate_ids = [contact_id for contact_id in cluster.contact_id_list if contact_id != primary_id]
+        
+        if not primary_id or not duplicate_ids:
+            return jsonify({'error': 'primary_id and duplicate_ids (or cluster_id) are required'}), 400
+        
+        try:
+            primary = contact_dedupe.merge(int(primary_id), duplicate_ids, cluster=cluster)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Contacts merged successfully',
+            'contact': primary.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/duplicates/<int:cluster_id>/dismiss', methods=['POST'])
+def dismiss_duplicate_cluster(cluster_id):
+    try:
+        cluster = DuplicateCluster.query.get_or_404(cluster_id)
+        cluster.status = 'dismissed'
+        cluster.resolved_at = datetime.utcnow()
+        db.session.commit()
+        
+        return jsonify({'cluster': cluster.to_dict()})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@contacts_bp.route('/lookup', methods=['GET'])
+def lookup_contacts():
+    """Resolve contacts by exact email or phone (any format) within a sub-account"""
+    try:
+        sub_account_id = request.args.get('sub_account_id', type=int)
+        email = request.args.get('email')
+        phone = request.args.get('phone')
+        
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+        if not email and not phone:
+            return jsonify({'error': 'email or phone is required'}), 400
+        
+        contacts = contact_lookup.lookup(sub_account_id, email=email, phone=phone)
+        
+        return jsonify({'contacts': _serialize_contacts(contacts)})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @contacts_bp.route('/<int:contact_id>', methods=['GET'])
 def get_contact(contact_id):
     try:
@@ -130,6 +503,30 @@ def get_contact(contact_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@contacts_bp.route('/<int:contact_id>/timeline', methods=['GET'])
+def get_contact_timeline(contact_id):
+    """Activities, notes, tasks, messages and opportunity events in one time-ordered stream"""
+    try:
+        limit = min(request.args.get('limit', 25, type=int), 100)
+        after = request.args.get('after')
+        
+        try:
+            position = decode_cursor(after, datetime, str, int) if after else None
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        items, next_position = contact_timeline.page(contact_id, position, limit)
+        
+        return jsonify({
+            'contact_id': contact_id,
+            'timeline': items,
+            'has_more': next_position is not None,
+            'next_cursor': encode_cursor(*next_position) if next_position else None
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @contacts_bp.route('/<int:contact_id>', methods=['PUT'])
 def update_contact(contact_id):
     try:
@@ -148,24 +545,20 @@ def update_contact(contact_id):
         if 'company' in data:
             contact.company = data['company']
         if 'tags' in data:
-            contact.tags = json.dumps(data['tags'])
+            contact.tags = json.dumps(normalize_tags(data['tags']))
+            contact_tag_service.sync_contact(contact, data['tags'])
         if 'custom_fields' in data:
-            contact.custom_fields = json.dumps(data['custom_fields'])
+            contact.custom_fields = data['custom_fields']
         if 'status' in data:
             contact.status = data['status']
         if 'source' in data:
             contact.source = data['source']
+        if 'owner_id' in data:
+            contact.owner_id = data['owner_id']
         
         contact.updated_at = datetime.utcnow()
-        db.session.commit()
-        
-        # Create activity record
-        activity = ContactActivity(
-            contact_id=contact.id,
-            type='updated',
-            description='Contact updated'
-        )
-        db.session.add(activity)
+        activity_log.contact(contact.id, 'updated', 'Contact updated')
+        segment_service.refresh_contacts(contact.sub_account_id, [contact.id])
         db.session.commit()
         
         return jsonify({
@@ -194,15 +587,7 @@ def add_contact_note(contact_id):
         )
         
         db.session.add(note)
-        db.session.commit()
-        
-        # Create activity record
-        activity = ContactActivity(
-            contact_id=contact_id,
-            type='note_added',
-            description='Note added to contact'
-        )
-        db.session.add(activity)
+        activity_log.contact(contact_id, 'note_added', 'Note added to contact')
         db.session.commit()
         
         return jsonify({
@@ -233,15 +618,7 @@ def add_contact_task(contact_id):
         )
         
         db.session.add(task)
-        db.session.commit()
-        
-        # Create activity record
-        activity = ContactActivity(
-            contact_id=contact_id,
-            type='task_created',
-            description=f'Task created: {task.title}'
-        )
-        db.session.add(activity)
+        activity_log.contact(contact_id, 'task_created', f'Task created: {task.title}')
         db.session.commit()
         
         return jsonify({
@@ -1,15 +1,25 @@
 from flask import Blueprint, request, jsonify
-from src.models.user import db
 from src.models.contact import Contact, ContactActivity
 from src.models.pipeline import Opportunity
 from src.models.campaign import Campaign
 from src.models.agency import SubAccount
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from sqlalchemy import and_
+from src.services.resource_versions import resource_versions
+from src.services.response_cache import response_cache
+from src.services.metric_rollups import metric_rollups
+from src.models.rollup import DailyRollup
+from src.utils.metrics_query import MetricsQuery
 
 dashboard_bp = Blueprint('dashboard', __name__)
+dashboard_bp.record_once(lambda state: resource_versions.init_app(state.app))
+dashboard_bp.record_once(lambda state: metric_rollups.init_app(state.app))
+dashboard_bp.record_once(lambda state: response_cache.init_app(state.app))
+dashboard_bp.record_once(lambda state: resource_versions.on_commit(response_cache.bump))
 
 @dashboard_bp.route('/metrics', methods=['GET'])
+@resource_versions.conditional('contacts', 'opportunities', 'campaigns', bucket_seconds=3600)
+@response_cache.cached()
 def get_dashboard_metrics():
     try:
         sub_account_id = request.args.get('sub_account_id', type=int)
@@ -19,44 +29,43 @@ def get_dashboard_metrics():
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Base queries
-        contact_query = Contact.query
-        opportunity_query = Opportunity.query.join(Contact)
-        campaign_query = Campaign.query
-        
-        if sub_account_id:
-            contact_query = contact_query.filter_by(sub_account_id=sub_account_id)
-            opportunity_query = opportunity_query.filter(Contact.sub_account_id == sub_account_id)
-            campaign_query = campaign_query.filter_by(sub_account_id=sub_account_id)
+        # Contact and opportunity figures come from the daily rollups: O(days) rows, not O(rows).
+        # All-time and period totals share one scan, the period ones as conditional sums.
+        in_period = DailyRollup.day >= start_date.date()
+        rollups = MetricsQuery(DailyRollup)\
+            .where(DailyRollup.sub_account_id == sub_account_id if sub_account_id else None)\
+            .sum('total_contacts', DailyRollup.new_contacts)\
+            .sum('new_contacts', DailyRollup.new_contacts, in_period)\
+            .sum('total_revenue', DailyRollup.won_revenue, in_period)\
+            .sum('total_opportunities', DailyRollup.opportunities_opened)\
+            .sum('won_opportunities', DailyRollup.opportunities_won)\
+            .sum('won_revenue', DailyRollup.won_revenue)\
+            .run()
+        
+        campaigns = MetricsQuery(Campaign)\
+            .where(Campaign.sub_account_id == sub_account_id if sub_account_id else None)\
+            .count('active', Campaign.status == 'active')\
+            .run()
         
         # Total contacts
-        total_contacts = contact_query.count()
+        total_contacts = rollups['total_contacts']
         
         # New contacts this period
-        new_contacts = contact_query.filter(
-            Contact.created_at >= start_date
-        ).count()
+        new_contacts = rollups['new_contacts']
         
         # Active campaigns
-        active_campaigns = campaign_query.filter_by(status='active').count()
+        active_campaigns = campaigns['active']
         
         # Total revenue (closed won opportunities)
-        total_revenue = db.session.query(func.sum(Opportunity.value)).filter(
-            and_(
-                Opportunity.status == 'won',
-                Opportunity.closed_at >= start_date
-            )
-        ).scalar() or 0
+        total_revenue = rollups['total_revenue'] or 0
         
         # Conversion rate (opportunities won vs total)
-        total_opportunities = opportunity_query.count()
-        won_opportunities = opportunity_query.filter_by(status='won').count()
+        total_opportunities = rollups['total_opportunities']
+        won_opportunities = rollups['won_opportunities']
         conversion_rate = (won_opportunities / total_opportunities * 100) if total_opportunities > 0 else 0
         
         # Average deal size
-        avg_deal_size = db.session.query(func.avg(Opportunity.value)).filter(
-            Opportunity.status == 'won'
-        ).scalar() or 0
+        avg_deal_size = (rollups['won_revenue'] / won_opportunities) if won_opportunities else 0
         
         # Recent activities
         recent_activities = ContactActivity.query.join(Contact)
@@ -83,30 +92,27 @@ def get_dashboard_metrics():
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/pipeline-overview', methods=['GET'])
+@response_cache.cached()
 def get_pipeline_overview():
     try:
         sub_account_id = request.args.get('sub_account_id', type=int)
         
         # Get opportunities by stage
-        query = db.session.query(
-            Opportunity.stage,
-            func.count(Opportunity.id).label('count'),
-            func.sum(Opportunity.value).label('total_value')
-        ).join(Contact)
-        
-        if sub_account_id:
-            query = query.filter(Contact.sub_account_id == sub_account_id)
-        
-        pipeline_data = query.filter(
-            Opportunity.status == 'open'
-        ).group_by(Opportunity.stage).all()
+        pipeline_data = MetricsQuery(Opportunity)\
+            .join(Contact)\
+            .where(Opportunity.status == 'open')\
+            .where(Contact.sub_account_id == sub_account_id if sub_account_id else None)\
+            .group_by(Opportunity.stage)\
+            .count('count')\
+            .sum('total_value', Opportunity.value)\
+            .run()
         
         stages = []
-        for stage, count, total_value in pipeline_data:
+        for row in pipeline_data:
             stages.append({
-                'stage': stage,
-                'count': count,
-                'total_value': float(total_value or 0)
+                'stage': row['stage'],
+                'count': row['count'],
+                'total_value': float(row['total_value'] or 0)
             })
         
         return jsonify({'pipeline_overview': stages})
@@ -115,6 +121,7 @@ def get_pipeline_overview():
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/leads-over-time', methods=['GET'])
+@response_cache.cached()
 def get_leads_over_time():
     try:
         sub_account_id = request.args.get('sub_account_id', type=int)
@@ -123,26 +130,17 @@ def get_leads_over_time():
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Get daily lead counts
-        query = db.session.query(
-            func.date(Contact.created_at).label('date'),
-            func.count(Contact.id).label('count')
-        )
-        
-        if sub_account_id:
-            query = query.filter_by(sub_account_id=sub_account_id)
-        
-        daily_leads = query.filter(
-            Contact.created_at >= start_date
-        ).group_by(func.date(Contact.created_at)).all()
+        # Daily lead counts straight from the rollups
+        daily_leads = metric_rollups.series('new_contacts', sub_account_id, start=start_date.date())
         
         # Format data for chart
         leads_data = []
         for date, count in daily_leads:
-            leads_data.append({
-                'date': date.isoformat(),
-                'count': count
-            })
+            if count:
+                leads_data.append({
+                    'date': date.isoformat(),
+                    'count': count
+                })
         
         return jsonify({'leads_over_time': leads_data})
         
@@ -150,6 +148,7 @@ def get_leads_over_time():
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/campaign-performance', methods=['GET'])
+@response_cache.cached()
 def get_campaign_performance():
     try:
         sub_account_id = request.args.get('sub_account_id', type=int)
@@ -182,6 +181,7 @@ def get_campaign_performance():
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/upcoming-tasks', methods=['GET'])
+@response_cache.cached(ttl=60)  # tasks drop off as they fall due
 def get_upcoming_tasks():
     try:
         sub_account_id = request.args.get('sub_account_id', type=int)
@@ -1,11 +1,19 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db
-from src.models.pipeline import Pipeline, Opportunity, OpportunityActivity
+from src.models.pipeline import Pipeline, Opportunity
 from src.models.contact import Contact
+from src.services.activity_log import activity_log
+from src.services.resource_versions import resource_versions, pipeline_scope
+from src.services.metric_rollups import metric_rollups
+from src.services.custom_fields import apply_custom_field_filters
+from src.utils.serializers import opportunity_serializer, InvalidFields
 from datetime import datetime
 import json
 
 pipelines_bp = Blueprint('pipelines', __name__)
+pipelines_bp.record_once(lambda state: activity_log.init_app(state.app))
+pipelines_bp.record_once(lambda state: resource_versions.init_app(state.app))
+pipelines_bp.record_once(lambda state: metric_rollups.init_app(state.app))
 
 @pipelines_bp.route('', methods=['GET'])
 def get_pipelines():
@@ -63,12 +71,28 @@ def create_pipeline():
         return jsonify({'error': str(e)}), 500
 
 @pipelines_bp.route('/<int:pipeline_id>/opportunities', methods=['GET'])
+@resource_versions.conditional('opportunities', scope=lambda kwargs: pipeline_scope(kwargs['pipeline_id']))
 def get_pipeline_opportunities(pipeline_id):
     try:
         pipeline = Pipeline.query.get_or_404(pipeline_id)
         
-        opportunities = Opportunity.query.filter_by(pipeline_id=pipeline_id)\
+        try:
+            serializer = opportunity_serializer.for_request(request.args.get('fields'))
+        except InvalidFields as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # cf.key=value / cf.key>=n filters on the opportunities' custom fields
+        try:
+            query = apply_custom_field_filters(
+                Opportunity.query.filter_by(pipeline_id=pipeline_id), Opportunity, request.args
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # stage and value are always loaded: grouping and totals below read them
+        opportunities = serializer.apply(query, Opportunity.stage, Opportunity.value)\
             .order_by(Opportunity.created_at.desc()).all()
+        serialized = dict(zip((opp.id for opp in opportunities), serializer.many(opportunities)))
         
         # Group opportunities by stage
         stages_data = {}
@@ -77,7 +101,7 @@ def get_pipeline_opportunities(pipeline_id):
         for stage in stages:
             stage_name = stage['name']
             stage_opportunities = [
-                opp.to_dict() for opp in opportunities 
+                serialized[opp.id] for opp in opportunities 
                 if opp.stage == stage_name
             ]
             stages_data[stage_name] = {
@@ -121,20 +145,13 @@ def create_opportunity():
             probability=data.get('probability', 0),
             expected_close_date=datetime.fromisoformat(data['expected_close_date']) if data.get('expected_close_date') else None,
             source=data.get('source'),
-            custom_fields=json.dumps(data.get('custom_fields', {}))
+            custom_fields=data.get('custom_fields', {})
         )
         
         db.session.add(opportunity)
-        db.session.commit()
-        
-        # Create activity record
-        activity = OpportunityActivity(
-            opportunity_id=opportunity.id,
-            type='created',
-            description='Opportunity created',
-            new_value=opportunity.stage
-        )
-        db.session.add(activity)
+        db.session.flush()
+        activity_log.opportunity(opportunity.id, 'created', 'Opportunity created',
+                                 new_value=opportunity.stage)
         db.session.commit()
         
         return jsonify({
@@ -165,17 +182,9 @@ def update_opportunity_stage(opportunity_id):
         if 'probability' in data:
             opportunity.probability = data['probability']
         
-        db.session.commit()
-        
-        # Create activity record
-        activity = OpportunityActivity(
-            opportunity_id=opportunity_id,
-            type='stage_change',
-            description=f'Stage changed from {old_stage} to {new_stage}',
-            old_value=old_stage,
-            new_value=new_stage
-        )
-        db.session.add(activity)
+        activity_log.opportunity(opportunity_id, 'stage_change',
+                                 f'Stage changed from {old_stage} to {new_stage}',
+                                 old_value=old_stage, new_value=new_stage)
         db.session.commit()
         
         return jsonify({
@@ -218,20 +227,14 @@ def update_opportunity(opportunity_id):
                 opportunity.expected_close_date = new_date
         
         if 'custom_fields' in data:
-            opportunity.custom_fields = json.dumps(data['custom_fields'])
+            opportunity.custom_fields = data['custom_fields']
         
         opportunity.updated_at = datetime.utcnow()
-        db.session.commit()
         
-        # Create activity record if there were changes
+        # Log an activity record if there were changes
         if changes:
-            activity = OpportunityActivity(
-                opportunity_id=opportunity_id,
-                type='updated',
-                description='; '.join(changes)
-            )
-            db.session.add(activity)
-            db.session.commit()
+            activity_log.opportunity(opportunity_id, 'updated', '; '.join(changes))
+        db.session.commit()
         
         return jsonify({
             'message': 'Opportunity updated successfully',
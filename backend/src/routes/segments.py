@@ -0,0 +1,168 @@
+from flask import Blueprint, request, jsonify
+from src.models.user import db
+from src.models.contact import Contact
+from src.models.campaign import Campaign
+from src.models.segment import Segment, SegmentMember
+from src.services.segment_service import segment_service
+import json
+
+segments_bp = Blueprint('segments', __name__)
+
+@segments_bp.route('', methods=['GET'])
+def get_segments():
+    try:
+        sub_account_id = request.args.get('sub_account_id', type=int)
+        if not sub_account_id:
+            return jsonify({'error': 'sub_account_id is required'}), 400
+
+        segments = Segment.query.filter_by(sub_account_id=sub_account_id)\
+            .order_by(Segment.name).all()
+
+        return jsonify({'segments': [segment.to_dict() for segment in segments]})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('', methods=['POST'])
+def create_segment():
+    try:
+        data = request.get_json() or {}
+
+        if not data.get('sub_account_id') or not data.get('name'):
+            return jsonify({'error': 'sub_account_id and name are required'}), 400
+
+        criteria = data.get('criteria', {})
+        try:
+            segment_service.compile(criteria)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        segment = Segment(
+            sub_account_id=data['sub_account_id'],
+            name=data['name'],
+            criteria=json.dumps(criteria)
+        )
+        db.session.add(segment)
+        db.session.flush()
+        segment_service.rebuild(segment)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Segment created successfully',
+            'segment': segment.to_dict()
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/<int:segment_id>', methods=['GET'])
+def get_segment(segment_id):
+    try:
+        segment = Segment.query.get_or_404(segment_id)
+        return jsonify({'segment': segment.to_dict()})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/<int:segment_id>', methods=['PUT'])
+def update_segment(segment_id):
+    try:
+        segment = Segment.query.get_or_404(segment_id)
+        data = request.get_json() or {}
+
+        if 'name' in data:
+            segment.name = data['name']
+        if 'criteria' in data:
+            try:
+                segment_service.compile(data['criteria'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            segment.criteria = json.dumps(data['criteria'])
+            segment_service.rebuild(segment)
+
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Segment updated successfully',
+            'segment': segment.to_dict()
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/<int:segment_id>', methods=['DELETE'])
+def delete_segment(segment_id):
+    try:
+        segment = Segment.query.get_or_404(segment_id)
+        SegmentMember.query.filter_by(segment_id=segment.id).delete(synchronize_session=False)
+        db.session.delete(segment)
+        db.session.commit()
+
+        return jsonify({'message': 'Segment deleted successfully'})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/<int:segment_id>/rebuild', methods=['POST'])
+def rebuild_segment(segment_id):
+    """Full recompute; only needed after bulk changes that bypass the contact write paths"""
+    try:
+        segment = Segment.query.get_or_404(segment_id)
+        segment_service.rebuild(segment)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Segment rebuilt successfully',
+            'segment': segment.to_dict()
+        })
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/<int:segment_id>/members', methods=['GET'])
+def get_segment_members(segment_id):
+    try:
+        segment = Segment.query.get_or_404(segment_id)
+        after = request.args.get('after', type=int)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+
+        contacts = segment_service.members(segment, after_contact_id=after, limit=limit)
+        counts = Contact.related_counts([contact.id for contact in contacts])
+
+        return jsonify({
+            'contacts': [contact.to_dict(counts=counts.get(contact.id)) for contact in contacts],
+            'total': segment.member_count or 0,
+            'next_cursor': contacts[-1].id if len(contacts) == limit else None
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@segments_bp.route('/campaigns/<int:campaign_id>', methods=['POST'])
+def materialize_campaign_audience(campaign_id):
+    """Materialize a campaign's target_audience criteria into a segment"""
+    try:
+        campaign = Campaign.query.get_or_404(campaign_id)
+
+        try:
+            segment = segment_service.for_campaign(campaign)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Campaign audience materialized',
+            'segment': segment.to_dict()
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -12,6 +12,20 @@ python scheduled_tasks.py [task_name]
 Available tasks:
 - trial_notifications: Check and send trial expiration notifications
 - cleanup: Clean up expired data
+- search_index: Create (and repopulate) the contact search index
+- backfill_tags: Rebuild the contact_tags index from Contact.tags
+- upgrade_contacts: Add the contacts columns introduced after the table was created (run once after deploying)
+- backfill_lookup_keys: Add and populate the normalized email/phone lookup columns
+- migrate_custom_fields: Convert contact/opportunity custom_fields to native JSON(B) and index them
+- promote_custom_field <contacts|opportunities> <key> [numeric]: Add a generated, indexed column for a custom field
+- rollup_catch_up: Recompute the dashboard rollup days queued in deferred mode
+- rollup_rebuild [start YYYY-MM-DD] [end YYYY-MM-DD]: Recompute the dashboard rollups from the base tables
+- rollup_analytics_events: Roll complete hours of analytics events into hourly_event_rollups
+- sketch_analytics_events: Build the daily distinct-count sketches of complete days of analytics events
+- precompute_reports: Refresh the cached results of scheduled custom reports that are due (run hourly)
+- forecast_metrics: Write the nightly revenue and won-deal forecasts of every sub-account
+- refresh_funnels: Fold new stage changes into the cached pipeline funnels read by /analytics/pipeline-conversion (run every few minutes)
+- import_contacts <sub_account_id> <file> [csv|ndjson]: Bulk import contacts from a file
 - all: Run all tasks
 
 Example cron job (run daily at 9 AM):
@@ -25,6 +39,8 @@ from datetime import datetime
 
 # Add src directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+# ...and its parent so the src.* modules used by the CRM routes resolve
+sys.path.insert(1, os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
 from main import app
 from services.notification_service import notification_service
@@ -57,7 +73,9 @@ def run_cleanup_tasks():
     with app.app_context():
         try:
             # Clean up any orphaned data, expired sessions, etc.
-            # Add your cleanup logic here
+            from src.services.report_export import report_exports
+            removed = report_exports.purge()
+            logger.info(f"Removed {removed} expired export files")
             
             logger.info("Cleanup tasks completed successfully")
             return True
@@ -78,6 +96,227 @@ def seed_demo_data():
             logger.error(f"Error seeding demo data: {str(e)}")
             return False
 
+def rebuild_search_index():
+    """Create the contact search index on an existing database and repopulate it"""
+    logger.info("Rebuilding contact search index...")
+    
+    with app.app_context():
+        try:
+            from src.services.contact_search import contact_search
+            result = contact_search.ensure_index(rebuild=True)
+            logger.info("Contact search index rebuild completed")
+            return result
+        except Exception as e:
+            logger.error(f"Error rebuilding contact search index: {str(e)}")
+            return False
+
+def backfill_contact_tags():
+    """Populate contact_tags for contacts created before the tag index existed"""
+    logger.info("Backfilling contact tags...")
+    
+    with app.app_context():
+        try:
+            from src.services.contact_tags import contact_tag_service
+            processed = contact_tag_service.backfill()
+            logger.info(f"Contact tag backfill completed ({processed} contacts)")
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling contact tags: {str(e)}")
+            return False
+
+def upgrade_contacts():
+    """ALTER an existing contacts table to add the columns the Contact model gained since"""
+    logger.info("Upgrading contacts table...")
+    
+    with app.app_context():
+        try:
+            from src.services.contact_lookup import contact_lookup
+            added = contact_lookup.ensure_columns()
+            logger.info(f"Contacts table upgrade completed (added: {', '.join(added) or 'nothing'})")
+            return True
+        except Exception as e:
+            logger.error(f"Error upgrading contacts table: {str(e)}")
+            return False
+
+def backfill_contact_lookup_keys():
+    """Populate email_norm/phone_e164 for contacts written before the columns existed"""
+    logger.info("Backfilling contact lookup keys...")
+    
+    with app.app_context():
+        try:
+            from src.services.contact_lookup import contact_lookup
+            processed = contact_lookup.backfill()
+            logger.info(f"Contact lookup key backfill completed ({processed} contacts)")
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling contact lookup keys: {str(e)}")
+            return False
+
+def migrate_custom_fields():
+    """Move contact and opportunity custom_fields to native JSON storage with their indexes"""
+    logger.info("Migrating custom fields to native JSON...")
+    
+    with app.app_context():
+        try:
+            from src.models.contact import Contact
+            from src.models.pipeline import Opportunity
+            from src.services.custom_fields import migrate_custom_fields as migrate
+            for model in (Contact, Opportunity):
+                migrate(model)
+            logger.info("Custom field migration completed")
+            return True
+        except Exception as e:
+            logger.error(f"Error migrating custom fields: {str(e)}")
+            return False
+
+def promote_custom_field(table, key, numeric=None):
+    """Back a frequently filtered custom field with a generated, indexed column"""
+    logger.info(f"Promoting custom field {key} of {table}...")
+    
+    with app.app_context():
+        try:
+            from src.models.contact import Contact
+            from src.models.pipeline import Opportunity
+            from src.services.custom_fields import promote_custom_field as promote
+            models = {'contacts': Contact, 'opportunities': Opportunity}
+            if table not in models:
+                logger.error("Table must be contacts or opportunities")
+                return False
+            column = promote(models[table], key, numeric=numeric == 'numeric')
+            logger.info(f"Custom field {key} promoted to {table}.{column}")
+            return True
+        except Exception as e:
+            logger.error(f"Error promoting custom field: {str(e)}")
+            return False
+
+def catch_up_rollups():
+    """Recompute the daily rollup days queued by writes in deferred mode"""
+    logger.info("Catching up daily rollups...")
+    
+    with app.app_context():
+        try:
+            from src.services.metric_rollups import metric_rollups
+            processed = metric_rollups.catch_up()
+            logger.info(f"Daily rollup catch-up completed ({processed} days)")
+            return True
+        except Exception as e:
+            logger.error(f"Error catching up daily rollups: {str(e)}")
+            return False
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute the daily rollups for a date range (all history by default)"""
+    logger.info("Rebuilding daily rollups...")
+    
+    with app.app_context():
+        try:
+            from datetime import date
+            from src.services.metric_rollups import metric_rollups
+            result = metric_rollups.rebuild(
+                date.fromisoformat(start) if start else None,
+                date.fromisoformat(end) if end else None
+            )
+            logger.info(f"Daily rollup rebuild completed: {result}")
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding daily rollups: {str(e)}")
+            return False
+
+def rollup_analytics_events():
+    """Aggregate new analytics events into the hourly rollups read by /analytics"""
+    logger.info("Rolling up analytics events...")
+    
+    with app.app_context():
+        try:
+            from src.services.analytics_engine import analytics_engine
+            hours = analytics_engine.rollup_events()
+            logger.info(f"Analytics event rollup completed ({hours} hours)")
+            return True
+        except Exception as e:
+            logger.error(f"Error rolling up analytics events: {str(e)}")
+            return False
+
+def sketch_analytics_events():
+    """Add HyperLogLog sketches of the analytics events of newly completed days"""
+    logger.info("Sketching analytics events...")
+    
+    with app.app_context():
+        try:
+            from src.services.distinct_counts import distinct_counts
+            days = distinct_counts.sketch_days()
+            logger.info(f"Analytics event sketches completed ({days} days)")
+            return True
+        except Exception as e:
+            logger.error(f"Error sketching analytics events: {str(e)}")
+            return False
+
+def precompute_reports():
+    """Recompute scheduled custom reports that are due, so opening them is a cache hit"""
+    logger.info("Precomputing scheduled reports...")
+    
+    with app.app_context():
+        try:
+            from src.services.report_service import report_service
+            ran = report_service.precompute_due()
+            logger.info(f"Report precompute completed ({ran} reports)")
+            return True
+        except Exception as e:
+            logger.error(f"Error precomputing reports: {str(e)}")
+            return False
+
+def forecast_metrics():
+    """Forecast revenue and won deals for every sub-account into predictive_analytics"""
+    logger.info("Forecasting metrics...")
+    
+    with app.app_context():
+        try:
+            from src.services.forecasting import forecasting
+            written = forecasting.run()
+            logger.info(f"Metric forecasts completed ({written} forecasts)")
+            return True
+        except Exception as e:
+            logger.error(f"Error forecasting metrics: {str(e)}")
+            return False
+
+def refresh_funnels():
+    """Process stage changes recorded since the last refresh into every pipeline's funnel"""
+    logger.info("Refreshing pipeline funnels...")
+    
+    with app.app_context():
+        try:
+            from src.services.pipeline_funnel import pipeline_funnel
+            processed = pipeline_funnel.refresh_all()
+            logger.info(f"Pipeline funnel refresh completed ({processed} stage changes)")
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing pipeline funnels: {str(e)}")
+            return False
+
+def import_contacts(sub_account_id, path, file_format=None):
+    """Bulk import a CSV/NDJSON file of contacts into a sub-account"""
+    logger.info(f"Importing contacts from {path} into sub-account {sub_account_id}...")
+    
+    with app.app_context():
+        try:
+            from src.services.contact_import import contact_import_service, detect_format
+            from src.services.job_runner import job_runner
+            
+            file_format = detect_format(path, file_format)
+            if not file_format:
+                logger.error("Import format must be csv or ndjson")
+                return False
+            
+            job = job_runner.create('contact_import', int(sub_account_id), params={
+                'filename': os.path.basename(path),
+                'format': file_format
+            })
+            totals = job_runner.run_inline(job, contact_import_service.import_file, path,
+                                           file_format, int(sub_account_id))
+            logger.info(f"Contact import job {job.id} completed: {totals}")
+            return totals is not None
+        except Exception as e:
+            logger.error(f"Error importing contacts: {str(e)}")
+            return False
+
 def run_all_tasks():
     """Run all scheduled tasks"""
     logger.info("Running all scheduled tasks...")
@@ -85,7 +324,8 @@ def run_all_tasks():
     tasks = [
         ("Trial Notifications", run_trial_notifications),
         ("Demo Data Check", seed_demo_data),
-        ("Cleanup Tasks", run_cleanup_tasks)
+        ("Cleanup Tasks", run_cleanup_tasks),
+        ("Dashboard Rollup Catch-up", catch_up_rollups)
     ]
     
     results = []
@@ -110,7 +350,7 @@ def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
         print("Usage: python scheduled_tasks.py [task_name]")
-        print("Available tasks: trial_notifications, cleanup, demo_data, all")
+        print("Available tasks: trial_notifications, cleanup, demo_data, search_index, backfill_tags, upgrade_contacts, backfill_lookup_keys, migrate_custom_fields, promote_custom_field, rollup_catch_up, rollup_rebuild, rollup_analytics_events, sketch_analytics_events, precompute_reports, forecast_metrics, refresh_funnels, import_contacts, all")
         sys.exit(1)
     
     task = sys.argv[1].lower()
@@ -131,6 +371,40 @@ def main():
         success = run_cleanup_tasks()
     elif task == 'demo_data':
         success = seed_demo_data()
+    elif task == 'search_index':
+        success = rebuild_search_index()
+    elif task == 'backfill_tags':
+        success = backfill_contact_tags()
+    elif task == 'upgrade_contacts':
+        success = upgrade_contacts()
+    elif task == 'backfill_lookup_keys':
+        success = backfill_contact_lookup_keys()
+    elif task == 'migrate_custom_fields':
+        success = migrate_custom_fields()
+    elif task == 'promote_custom_field':
+        if len(sys.argv) < 4:
+            print("Usage: python scheduled_tasks.py promote_custom_field <contacts|opportunities> <key> [numeric]")
+            sys.exit(1)
+        success = promote_custom_field(*sys.argv[2:5])
+    elif task == 'rollup_catch_up':
+        success = catch_up_rollups()
+    elif task == 'rollup_rebuild':
+        success = rebuild_rollups(*sys.argv[2:4])
+    elif task == 'rollup_analytics_events':
+        success = rollup_analytics_events()
+    elif task == 'sketch_analytics_events':
+        success = sketch_analytics_events()
+    elif task == 'precompute_reports':
+        success = precompute_reports()
+    elif task == 'forecast_metrics':
+        success = forecast_metrics()
+    elif task == 'refresh_funnels':
+        success = refresh_funnels()
+    elif task == 'import_contacts':
+        if len(sys.argv) < 4:
+            print("Usage: python scheduled_tasks.py import_contacts <sub_account_id> <file> [csv|ndjson]")
+            sys.exit(1)
+        success = import_contacts(*sys.argv[2:5])
     elif task == 'all':
         success = run_all_tasks()
     else:
@@ -0,0 +1,174 @@
+import os
+import json
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, insert, select
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity
+from src.models.pipeline import Opportunity, OpportunityActivity
+from src.services.metric_rollups import metric_rollups
+from src.services.resource_versions import resource_versions, tenant_scope, pipeline_scope
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'pending_activity_rows'
+
+
+class ActivityLogWriter:
+    """Single entry point for ContactActivity / OpportunityActivity audit rows
+
+    Two modes, chosen with ACTIVITY_LOG_MODE (app config or environment):
+
+    - 'transaction' (default): the row is added to the caller's session and is
+      committed atomically with the change it describes. One commit per request.
+    - 'buffered': the row waits in session.info until the caller's transaction
+      commits (a rollback discards it), then joins an in-process buffer that is
+      bulk-inserted once it holds `max_batch` rows or its oldest row is
+      `max_delay` seconds old. Rows still buffered when the process dies are lost.
+
+    Buffered rows are bulk-inserted, so the flush hooks of metric_rollups and
+    resource_versions never see them as objects; flush() marks their rollup
+    days and touches their versions itself, in the same transaction. Until a
+    flush, dashboards (activities_by_type) and ETags do not reflect them.
+    """
+
+    def __init__(self, max_batch=500, max_delay=2.0):
+        self.mode = os.environ.get('ACTIVITY_LOG_MODE', 'transaction')
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.app = None
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def init_app(self, app):
+        if 'activity_log' in app.extensions:
+            return
+        app.extensions['activity_log'] = self
+        self.app = app
+        self.mode = app.config.get('ACTIVITY_LOG_MODE', self.mode)
+
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.teardown_request(self._teardown)
+        atexit.register(self.flush)
+
+        if self.mode == 'buffered':
+            self._timer = threading.Thread(target=self._flush_periodically, name='activity-log-flush', daemon=True)
+            self._timer.start()
+
+    def contact(self, contact_id, type, description=None, user_id=None, metadata=None, durable=False):
+        return self.record(ContactActivity, {
+            'contact_id': contact_id,
+            'user_id': user_id,
+            'type': type,
+            'description': description,
+            'meta_data': json.dumps(metadata) if metadata else None
+        }, durable=durable)
+
+    def opportunity(self, opportunity_id, type, description=None, old_value=None, new_value=None,
+                    user_id=None, metadata=None, durable=False):
+        return self.record(OpportunityActivity, {
+            'opportunity_id': opportunity_id,
+            'user_id': user_id,
+            'type': type,
+            'description': description,
+            'old_value': old_value,
+            'new_value': new_value,
+            'meta_data': json.dumps(metadata) if metadata else None
+        }, durable=durable)
+
+    def record(self, model, fields, durable=False):
+        """Log one activity row; the caller still owns (and performs) the commit"""
+        fields = dict(fields, created_at=fields.get('created_at') or datetime.utcnow())
+        if durable or self.mode != 'buffered':
+            db.session.add(model(**fields))
+        else:
+            db.session.info.setdefault(PENDING_KEY, []).append((model, fields))
+
+    def _after_commit(self, session):
+        rows = session.info.pop(PENDING_KEY, None)
+        if not rows:
+            return
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_batch
+        if full:
+            self.flush()
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+    def _teardown(self, exc):
+        if self._due():
+            self.flush()
+
+    def _due(self):
+        with self._lock:
+            return bool(self._buffer) and time.monotonic() - self._oldest >= self.max_delay
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.max_delay)
+            if self._due():
+                self.flush()
+
+    def flush(self):
+        """Bulk-insert everything buffered, one INSERT per activity table"""
+        with self._lock:
+            rows, self._buffer, self._oldest = self._buffer, [], None
+        if not rows or self.app is None:
+            return 0
+
+        by_model = {}
+        for model, fields in rows:
+            by_model.setdefault(model, []).append(fields)
+
+        try:
+            # A new app context has a session of its own, so a flush never commits someone's open session
+            with self.app.app_context():
+                session = db.session
+                try:
+                    self._mark_changes(session, by_model)
+                    for model, model_rows in by_model.items():
+                        session.execute(insert(model.__table__), model_rows)
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Failed to flush {len(rows)} activity rows: {str(e)}")
+            return 0
+        return len(rows)
+
+    def _mark_changes(self, session, by_model):
+        """What the rollup and version flush hooks would record for these rows as ORM objects"""
+        contact_rows = by_model.get(ContactActivity, [])
+        if contact_rows:
+            tenants = dict(session.execute(
+                select(Contact.id, Contact.sub_account_id)
+                .where(Contact.id.in_({row['contact_id'] for row in contact_rows}))
+            ).tuples().all())
+            for row in contact_rows:
+                sub_account_id = tenants.get(row['contact_id'])
+                metric_rollups.mark(sub_account_id, row['created_at'], session=session)
+                resource_versions.touch(tenant_scope(sub_account_id), 'contacts', session=session)
+
+        opportunity_rows = by_model.get(OpportunityActivity, [])
+        if opportunity_rows:
+            pipelines = session.scalars(
+                select(Opportunity.pipeline_id)
+                .where(Opportunity.id.in_({row['opportunity_id'] for row in opportunity_rows}))
+                .distinct()
+            ).all()
+            for pipeline_id in pipelines:
+                resource_versions.touch(pipeline_scope(pipeline_id), 'opportunities', session=session)
+
+# Global instance
+activity_log = ActivityLogWriter()
@@ -6,6 +6,7 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import re
 import statistics
+from src.services.forecasting import forecasting
 
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -162,18 +163,22 @@ class AIService:
             # Fallback to rule-based analysis
             return self._fallback_conversation_analysis(conversation_data)
     
-    async def generate_predictive_insights(self, historical_data: Dict) -> List[PredictiveInsight]:
-        """Generate predictive insights based on historical data"""
+    async def generate_predictive_insights(self, historical_data: Dict, sub_account_id: Optional[int] = None) -> List[PredictiveInsight]:
+        """Generate predictive insights based on historical data
+        
+        With a sub_account_id, revenue and conversions come from the nightly
+        forecasts (services.forecasting) when the account has one.
+        """
         try:
             insights = []
             
             # Revenue prediction
-            revenue_insight = await self._predict_revenue(historical_data.get('revenue', []))
+            revenue_insight = await self._predict_revenue(historical_data.get('revenue', []), sub_account_id)
             if revenue_insight:
                 insights.append(revenue_insight)
             
             # Conversion prediction
-            conversion_insight = await self._predict_conversions(historical_data.get('conversions', []))
+            conversion_insight = await self._predict_conversions(historical_data.get('conversions', []), sub_account_id)
             if conversion_insight:
                 insights.append(conversion_insight)
             
@@ -394,8 +399,32 @@ class AIService:
             next_best_action="Start conversation"
         )
     
-    async def _predict_revenue(self, revenue_data: List[Dict]) -> Optional[PredictiveInsight]:
+    def _stored_forecast(self, sub_account_id: Optional[int], model_type: str, metric: str, factors: List[str]) -> Optional[PredictiveInsight]:
+        """Insight from the latest nightly forecast of a sub-account, if there is one"""
+        if sub_account_id is None:
+            return None
+        forecast = forecasting.latest(sub_account_id, model_type)
+        if not forecast:
+            return None
+        
+        prediction = forecast['prediction_data']
+        return PredictiveInsight(
+            metric=metric,
+            current_value=prediction.get('current_value', 0),
+            predicted_value=prediction.get('predicted_value', 0),
+            confidence=round((forecast['model_accuracy'] or 0) * 100, 1),
+            timeframe=f"Next {prediction.get('horizon_days', 30)} days",
+            factors=factors
+        )
+    
+    async def _predict_revenue(self, revenue_data: List[Dict], sub_account_id: Optional[int] = None) -> Optional[PredictiveInsight]:
         """Predict future revenue based on historical data"""
+        stored = self._stored_forecast(
+            sub_account_id, 'revenue_forecast', "Revenue", ["Daily won revenue", "Weekly seasonality", "Damped trend"]
+        )
+        if stored:
+            return stored
+        
         if len(revenue_data) < 3:
             return None
         
@@ -417,8 +446,14 @@ class AIService:
         
         return None
     
-    async def _predict_conversions(self, conversion_data: List[Dict]) -> Optional[PredictiveInsight]:
+    async def _predict_conversions(self, conversion_data: List[Dict], sub_account_id: Optional[int] = None) -> Optional[PredictiveInsight]:
         """Predict future conversions"""
+        stored = self._stored_forecast(
+            sub_account_id, 'lead_conversion', "Conversions", ["Daily won deals", "Weekly seasonality", "Damped trend"]
+        )
+        if stored:
+            return stored
+        
         if len(conversion_data) < 3:
             return None
         
@@ -0,0 +1,517 @@
+import logging
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from src.models.user import db
+from src.models.contact import Contact
+from src.models.pipeline import Pipeline, Opportunity
+from src.models.analytics import analytics_events, orders, HourlyEventRollup
+from src.utils.metrics_query import MetricsQuery
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+TIMEFRAME_DAYS = {'7d': 7, '30d': 30, '90d': 90, '1y': 365}
+PAID_ORDER_STATUSES = ('paid', 'shipped', 'delivered')
+VISIT_EVENT = 'page_view'
+CONVERSION_EVENT = 'conversion'
+
+# Base metrics and the loader (one grouped query) that produces them
+METRIC_LOADERS = {
+    'events': 'events',
+    'visitors': 'events',
+    'event_conversions': 'events',
+    'leads': 'contacts',
+    'conversions': 'deals',
+    'deal_revenue': 'deals',
+    'orders': 'orders',
+    'order_revenue': 'orders',
+}
+COUNT_METRICS = {'events', 'visitors', 'event_conversions', 'leads', 'conversions', 'orders', 'sales'}
+DERIVED_METRICS = ('revenue', 'sales', 'avg_deal_size', 'conversion_rate', 'visitor_conversion_rate')
+RATIO_METRICS = ('avg_deal_size', 'conversion_rate', 'visitor_conversion_rate')
+# source narrows every metric; contact_status those tied to a contact; pipeline_id the deal metrics
+FILTERS = ('source', 'contact_status', 'pipeline_id')
+
+
+def resolve_timezone(name):
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'Unknown timezone: {name}')
+
+
+def timeframe_window(timeframe, tz):
+    """(start, end) of a 7d/30d/90d/1y timeframe: whole local days back from today, up to now"""
+    now = datetime.now(tz)
+    days = TIMEFRAME_DAYS.get(timeframe, 30)
+    return datetime.combine(now.date() - timedelta(days=days - 1), time.min, tzinfo=tz), now
+
+
+def rate(numerator, denominator, scale=100.0):
+    """Element-wise numerator / denominator * scale, 0 where the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out * scale
+
+
+def growth(current, previous):
+    """Percentage change from previous to current; NaN where previous is 0"""
+    current = np.asarray(current, dtype=np.float64)
+    previous = np.asarray(previous, dtype=np.float64)
+    out = np.full(np.broadcast(current, previous).shape, np.nan)
+    np.divide(current - previous, np.abs(previous), out=out, where=previous != 0)
+    return out * 100.0
+
+
+def plain(value, count=False):
+    """numpy scalar -> JSON-friendly int/float (None for NaN)"""
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return int(round(value)) if count else round(value, 2)
+
+
+def _hour_bucket(column):
+    """Truncate a timestamp column to its UTC hour"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', column)
+    if dialect == 'mysql':
+        return func.date_format(column, '%Y-%m-%d %H:00:00')
+    # Same text layout SQLAlchemy stores SQLite DateTime values in, so rollup rows compare correctly
+    return func.strftime('%Y-%m-%d %H:00:00.000000', column)
+
+
+def _as_utc_naive(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _floor_hour(value):
+    return _as_utc_naive(value).replace(minute=0, second=0, microsecond=0)
+
+
+def event_tenant():
+    """Events belong to their contact's sub-account, or to event_data.sub_account_id when anonymous
+
+    Needs analytics_events outer-joined to contacts.
+    """
+    return func.coalesce(Contact.sub_account_id, analytics_events.c.event_data['sub_account_id'].as_integer())
+
+
+def derive_metrics(values):
+    """Add the derived metrics whose inputs are present (arrays or scalars)"""
+    if 'deal_revenue' in values and 'order_revenue' in values:
+        values['revenue'] = values['deal_revenue'] + values['order_revenue']
+        values['sales'] = values['conversions'] + values['orders']
+        values['avg_deal_size'] = rate(values['revenue'], values['sales'], scale=1.0)
+    if 'conversions' in values and 'leads' in values:
+        values['conversion_rate'] = rate(values['conversions'], values['leads'])
+    if 'leads' in values and 'visitors' in values:
+        values['visitor_conversion_rate'] = rate(values['leads'], values['visitors'])
+
+
+def metric_families(metrics=None):
+    """Loaders needed for a metric list (every loader when None); raises ValueError"""
+    if metrics is None:
+        return set(METRIC_LOADERS.values())
+    unknown = [name for name in metrics if name not in METRIC_LOADERS and name not in DERIVED_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}")
+    families = {METRIC_LOADERS[name] for name in metrics if name in METRIC_LOADERS}
+    if {'revenue', 'avg_deal_size', 'sales'} & set(metrics):
+        families.update(('deals', 'orders'))
+    if 'conversion_rate' in metrics:
+        families.update(('deals', 'contacts'))
+    if 'visitor_conversion_rate' in metrics:
+        families.update(('events', 'contacts'))
+    return families
+
+
+class BucketGrid:
+    """Gap-free local-time buckets covering [start, end)
+
+    Boundaries are computed in `tz` with wall-clock arithmetic, so a day is
+    23 or 25 hours long across DST changes and months follow the calendar.
+    Data is aggregated per UTC hour in SQL and binned here, which places
+    boundaries of half-hour-offset zones at the nearest hour.
+    """
+
+    def __init__(self, starts, end, granularity, tz):
+        self.granularity = granularity
+        self.tz = tz
+        self.starts = starts
+        self.edges = np.array([int(edge.timestamp()) for edge in [*starts, end]], dtype=np.int64)
+
+    @classmethod
+    def covering(cls, start, end, granularity='day', tz=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        tz = tz or ZoneInfo('UTC')
+        local_end = cls._local(end, tz)
+        current = cls._floor(cls._local(start, tz), granularity)
+        starts = []
+        while current < local_end:
+            starts.append(current)
+            current = cls._step(current, granularity, tz)
+        return cls(starts, current, granularity, tz)
+
+    @classmethod
+    def spans(cls, edges, tz=None):
+        """Arbitrary consecutive [edges[i], edges[i + 1]) buckets, e.g. previous vs current period"""
+        tz = tz or ZoneInfo('UTC')
+        edges = [cls._local(edge, tz) for edge in edges]
+        return cls(edges[:-1], edges[-1], 'span', tz)
+
+    @staticmethod
+    def _local(value, tz):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(tz)
+
+    @staticmethod
+    def _floor(value, granularity):
+        value = value.replace(minute=0, second=0, microsecond=0)
+        if granularity == 'hour':
+            return value
+        value = value.replace(hour=0)
+        if granularity == 'week':
+            return value - timedelta(days=value.weekday())
+        if granularity == 'month':
+            return value.replace(day=1)
+        return value
+
+    @staticmethod
+    def _step(value, granularity, tz):
+        if granularity == 'hour':
+            # Absolute hours: wall-clock hours repeat or vanish at DST changes
+            return (value.astimezone(timezone.utc) + timedelta(hours=1)).astimezone(tz)
+        if granularity == 'day':
+            return value + timedelta(days=1)
+        if granularity == 'week':
+            return value + timedelta(days=7)
+        if value.month == 12:
+            return value.replace(year=value.year + 1, month=1)
+        return value.replace(month=value.month + 1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def start_at(self):
+        return datetime.fromtimestamp(int(self.edges[0]), timezone.utc).replace(tzinfo=None)
+
+    @property
+    def end_at(self):
+        return datetime.fromtimestamp(int(self.edges[-1]), timezone.utc).replace(tzinfo=None)
+
+    def labels(self):
+        if self.granularity in ('day', 'week', 'month'):
+            return [start.date().isoformat() for start in self.starts]
+        return [start.isoformat() for start in self.starts]
+
+    def bin(self, epochs, values):
+        """Sum values into their buckets; buckets without data stay 0"""
+        size = len(self.starts)
+        if len(epochs) == 0 or size == 0:
+            return np.zeros(size)
+        index = np.searchsorted(self.edges, epochs, side='right') - 1
+        valid = (index >= 0) & (index < size)
+        return np.bincount(index[valid], weights=values[valid], minlength=size)
+
+
+class TimeSeries:
+    """Metric arrays aligned to a BucketGrid"""
+
+    def __init__(self, grid, values):
+        self.grid = grid
+        self.values = values
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def total(self, name):
+        return float(self.values[name].sum())
+
+    def totals(self, names):
+        """Whole-range figures; ratios are recomputed from the summed counts"""
+        totals = {name: values.sum() for name, values in self.values.items() if name not in RATIO_METRICS}
+        derive_metrics(totals)
+        return {name: plain(totals[name], name in COUNT_METRICS) for name in names}
+
+    def records(self, names):
+        labels = self.grid.labels()
+        columns = [(name, self.values[name], name in COUNT_METRICS) for name in names]
+        return [
+            {'date': label, **{name: plain(values[i], count) for name, values, count in columns}}
+            for i, label in enumerate(labels)
+        ]
+
+
+class AnalyticsEngine:
+    """Time-bucketed metrics over events, contacts, opportunities and orders
+
+    Every base metric comes from one grouped-per-UTC-hour query (at most 8,760
+    rows per series-year), which is binned into local-time buckets and turned
+    into derived rates and growth figures with NumPy. Analytics events are read
+    from hourly_event_rollups (kept current by rollup_events()) plus a raw scan
+    of the hours after the latest rollup, so a year of daily buckets does not
+    touch the raw event table.
+    """
+
+    def series(self, sub_account_id, grid, metrics=None, filters=None):
+        """Bucketed metrics; `filters` takes the FILTERS keys"""
+        filters = filters or {}
+        families = metric_families(metrics)
+        if 'events' in families and 'contact_status' in filters:
+            raise ValueError('contact_status cannot filter event metrics')
+
+        values = {}
+        for family in sorted(families):
+            epochs, columns = getattr(self, f'_load_{family}')(sub_account_id, grid.start_at, grid.end_at, filters)
+            for name, column in columns.items():
+                values[name] = grid.bin(epochs, column)
+        derive_metrics(values)
+        return TimeSeries(grid, values)
+
+    def compare(self, sub_account_id, start, end, tz=None, metrics=None, filters=None):
+        """Totals of [start, end) and of the equally long period before it, in one pass"""
+        grid = BucketGrid.spans([start - (end - start), start, end], tz)
+        result = self.series(sub_account_id, grid, metrics, filters)
+        previous = {name: values[0] for name, values in result.values.items()}
+        current = {name: values[1] for name, values in result.values.items()}
+        # Period-level ratios come from period totals, not from summed bucket ratios
+        self._derive_totals(previous)
+        self._derive_totals(current)
+        return current, previous
+
+    def _derive_totals(self, totals):
+        for name in RATIO_METRICS:
+            totals.pop(name, None)
+        derive_metrics(totals)
+        for name, value in totals.items():
+            totals[name] = float(value)
+
+    def _hourly(self, query):
+        rows = query.run()
+        epochs = np.array([int(_as_utc_naive(row['hour']).replace(tzinfo=timezone.utc).timestamp()) for row in rows],
+                          dtype=np.int64)
+        columns = {name: np.array([float(row[name] or 0) for row in rows], dtype=np.float64) for name in query.metrics}
+        return epochs, columns
+
+    def _contact_filters(self, filters):
+        clauses = []
+        if 'source' in filters:
+            clauses.append(Contact.source == filters['source'])
+        if 'contact_status' in filters:
+            clauses.append(Contact.status == filters['contact_status'])
+        return clauses
+
+    def _load_contacts(self, sub_account_id, start_at, end_at, filters):
+        return self._hourly(
+            MetricsQuery(Contact)
+            .where(Contact.sub_account_id == sub_account_id,
+                   Contact.created_at >= start_at, Contact.created_at < end_at)
+            .where(*self._contact_filters(filters))
+            .group_by(_hour_bucket(Contact.created_at).label('hour'))
+            .count('leads')
+        )
+
+    def _load_deals(self, sub_account_id, start_at, end_at, filters):
+        query = MetricsQuery(Opportunity)\
+            .join(Pipeline, Pipeline.id == Opportunity.pipeline_id)\
+            .where(Pipeline.sub_account_id == sub_account_id, Opportunity.status == 'won',
+                   Opportunity.closed_at >= start_at, Opportunity.closed_at < end_at)
+        contact_filters = self._contact_filters(filters)
+        if contact_filters:
+            query.join(Contact, Contact.id == Opportunity.contact_id).where(*contact_filters)
+        if 'pipeline_id' in filters:
+            query.where(Opportunity.pipeline_id == filters['pipeline_id'])
+        return self._hourly(
+            query
+            .group_by(_hour_bucket(Opportunity.closed_at).label('hour'))
+            .count('conversions')
+            .sum('deal_revenue', Opportunity.value)
+        )
+
+    def _load_orders(self, sub_account_id, start_at, end_at, filters):
+        return self._hourly(
+            MetricsQuery(orders)
+            .join(Contact, Contact.id == orders.c.contact_id)
+            .where(Contact.sub_account_id == sub_account_id, orders.c.status.in_(PAID_ORDER_STATUSES),
+                   orders.c.created_at >= start_at, orders.c.created_at < end_at)
+            .where(*self._contact_filters(filters))
+            .group_by(_hour_bucket(orders.c.created_at).label('hour'))
+            .count('orders')
+            .sum('order_revenue', orders.c.total_amount)
+        )
+
+    def _load_events(self, sub_account_id, start_at, end_at, filters):
+        rolled_until = self.rolled_until()
+        epochs, columns = [], []
+        if rolled_until and start_at < rolled_until:
+            rollup = HourlyEventRollup
+            part = self._hourly(
+                MetricsQuery(rollup)
+                .where(rollup.sub_account_id == sub_account_id,
+                       rollup.hour >= _floor_hour(start_at), rollup.hour < min(end_at, rolled_until))
+                .where(rollup.source == filters['source'] if 'source' in filters else None)
+                .group_by(rollup.hour.label('hour'))
+                .sum('events', rollup.count)
+                .sum('visitors', rollup.count, rollup.event_type == VISIT_EVENT)
+                .sum('event_conversions', rollup.count, rollup.event_type == CONVERSION_EVENT)
+            )
+            epochs.append(part[0])
+            columns.append(part[1])
+        raw_start = max(start_at, rolled_until) if rolled_until else start_at
+        if raw_start < end_at:
+            event_type = analytics_events.c.event_type
+            part = self._hourly(
+                self._event_query()
+                .where(self._event_tenant() == sub_account_id,
+                       analytics_events.c.created_at >= raw_start, analytics_events.c.created_at < end_at)
+                .where(func.coalesce(analytics_events.c.source, '') == filters['source']
+                       if 'source' in filters else None)
+                .group_by(_hour_bucket(analytics_events.c.created_at).label('hour'))
+                .count('events')
+                .count('visitors', event_type == VISIT_EVENT)
+                .count('event_conversions', event_type == CONVERSION_EVENT)
+            )
+            epochs.append(part[0])
+            columns.append(part[1])
+        if not epochs:
+            empty = np.zeros(0)
+            return np.zeros(0, dtype=np.int64), {'events': empty, 'visitors': empty, 'event_conversions': empty}
+        return np.concatenate(epochs), {
+            name: np.concatenate([part[name] for part in columns])
+            for name in ('events', 'visitors', 'event_conversions')
+        }
+
+    def _event_query(self):
+        return MetricsQuery(analytics_events).join(Contact, Contact.id == analytics_events.c.contact_id, isouter=True)
+
+    def _event_tenant(self):
+        return event_tenant()
+
+    def rolled_until(self):
+        """End of the rolled-up hours: later events are read from analytics_events"""
+        latest = db.session.scalar(select(func.max(HourlyEventRollup.hour)))
+        return _as_utc_naive(latest) + timedelta(hours=1) if latest else None
+
+    def rollup_events(self, since=None):
+        """Roll complete UTC hours of analytics_events into hourly_event_rollups
+
+        Resumes one hour before the latest rolled-up hour, which also picks up
+        events committed late into that hour. Works through day-sized slices,
+        one transaction each. Returns the number of hours processed.
+        """
+        now_hour = _floor_hour(datetime.utcnow())
+        if since is None:
+            latest = db.session.scalar(select(func.max(HourlyEventRollup.hour)))
+            if latest is not None:
+                since = _as_utc_naive(latest) - timedelta(hours=1)
+            else:
+                first = db.session.scalar(select(func.min(analytics_events.c.created_at)))
+                if first is None:
+                    return 0
+                since = first
+        since = _floor_hour(since)
+
+        hours = 0
+        while since < now_hour:
+            until = min(since + timedelta(days=1), now_hour)
+            self._rollup_range(since, until)
+            db.session.commit()
+            hours += int((until - since).total_seconds() // 3600)
+            since = until
+        logger.info(f"Rolled up {hours} hours of analytics events")
+        return hours
+
+    def _rollup_range(self, start_at, end_at):
+        rollup = HourlyEventRollup
+        db.session.execute(delete(rollup).where(rollup.hour >= start_at, rollup.hour < end_at))
+
+        tenant = self._event_tenant()
+        hour = _hour_bucket(analytics_events.c.created_at)
+        source = func.coalesce(analytics_events.c.source, '')
+        grouped = select(tenant, hour, analytics_events.c.event_type, source, func.count())\
+            .select_from(analytics_events)\
+            .outerjoin(Contact, Contact.id == analytics_events.c.contact_id)\
+            .where(analytics_events.c.created_at >= start_at, analytics_events.c.created_at < end_at,
+                   tenant.isnot(None), analytics_events.c.event_type.isnot(None))\
+            .group_by(tenant, hour, analytics_events.c.event_type, source)
+        db.session.execute(insert(rollup).from_select(
+            ['sub_account_id', 'hour', 'event_type', 'source', 'count'], grouped
+        ))
+
+    def breakdown(self, sub_account_id, start, end):
+        """Per lead source: leads, won deals, paid orders and revenue, current and previous period
+
+        Each table is read once over both periods; the period split is a
+        conditional aggregate.
+        """
+        start_at, end_at = _as_utc_naive(start), _as_utc_naive(end)
+        previous_at = start_at - (end_at - start_at)
+        source = func.coalesce(Contact.source, '').label('source')
+
+        leads = MetricsQuery(Contact)\
+            .where(Contact.sub_account_id == sub_account_id,
+                   Contact.created_at >= previous_at, Contact.created_at < end_at)\
+            .group_by(source)\
+            .count('leads', Contact.created_at >= start_at)\
+            .count('previous_leads', Contact.created_at < start_at)\
+            .run()
+
+        closed_at = Opportunity.closed_at
+        deals = MetricsQuery(Opportunity)\
+            .join(Pipeline, Pipeline.id == Opportunity.pipeline_id)\
+            .join(Contact, Contact.id == Opportunity.contact_id)\
+            .where(Pipeline.sub_account_id == sub_account_id, Opportunity.status == 'won',
+                   closed_at >= previous_at, closed_at < end_at)\
+            .group_by(source)\
+            .count('conversions', closed_at >= start_at)\
+            .sum('deal_revenue', Opportunity.value, closed_at >= start_at)\
+            .sum('previous_deal_revenue', Opportunity.value, closed_at < start_at)\
+            .run()
+
+        ordered_at = orders.c.created_at
+        sales = MetricsQuery(orders)\
+            .join(Contact, Contact.id == orders.c.contact_id)\
+            .where(Contact.sub_account_id == sub_account_id, orders.c.status.in_(PAID_ORDER_STATUSES),
+                   ordered_at >= previous_at, ordered_at < end_at)\
+            .group_by(source)\
+            .count('orders', ordered_at >= start_at)\
+            .sum('order_revenue', orders.c.total_amount, ordered_at >= start_at)\
+            .sum('previous_order_revenue', orders.c.total_amount, ordered_at < start_at)\
+            .run()
+
+        names = sorted({row['source'] for row in leads + deals + sales})
+        position = {name: i for i, name in enumerate(names)}
+        fields = ('leads', 'previous_leads', 'conversions', 'deal_revenue', 'previous_deal_revenue',
+                  'orders', 'order_revenue', 'previous_order_revenue')
+        matrix = {field: np.zeros(len(names)) for field in fields}
+        for rows in (leads, deals, sales):
+            for row in rows:
+                for field, value in row.items():
+                    if field != 'source':
+                        matrix[field][position[row['source']]] = float(value or 0)
+
+        matrix['revenue'] = matrix['deal_revenue'] + matrix['order_revenue']
+        matrix['previous_revenue'] = matrix['previous_deal_revenue'] + matrix['previous_order_revenue']
+        matrix['sales'] = matrix['conversions'] + matrix['orders']
+        matrix['conversion_rate'] = rate(matrix['conversions'], matrix['leads'])
+        matrix['avg_deal_size'] = rate(matrix['revenue'], matrix['sales'], scale=1.0)
+        matrix['share'] = rate(matrix['leads'], matrix['leads'].sum())
+        matrix['revenue_growth'] = growth(matrix['revenue'], matrix['previous_revenue'])
+        matrix['lead_growth'] = growth(matrix['leads'], matrix['previous_leads'])
+        return names, matrix
+
+# Global instance
+analytics_engine = AnalyticsEngine()
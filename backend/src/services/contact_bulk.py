@@ -0,0 +1,170 @@
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import select, update, delete, insert, func
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity, ContactTag
+from src.services.contact_filters import apply_contact_filters
+from src.services.contact_import import CONTACT_STATUSES
+from src.services.contact_tags import normalize_tags, parse_tags
+from src.services.custom_fields import validate_custom_field_key
+from src.services.job_runner import job_runner
+from src.services.segment_service import segment_service
+from src.services.resource_versions import resource_versions, tenant_scope
+from src.services.metric_rollups import metric_rollups
+
+logger = logging.getLogger(__name__)
+
+BULK_CHANGE_KEYS = ('status', 'owner_id', 'add_tags', 'remove_tags', 'custom_fields')
+
+
+class ContactBulkService:
+    """Applies one change set to many contacts with chunked set-based statements
+
+    Per chunk: one UPDATE ... WHERE id IN (...) for scalar columns, one
+    executemany UPDATE by primary key for the JSON tag/custom field columns,
+    one INSERT and one DELETE on contact_tags, one multi-row activity INSERT,
+    then a single commit.
+    """
+
+    CHUNK_SIZE = 1000
+    INLINE_LIMIT = 1000  # larger selections run as a background job
+
+    def validate_changes(self, changes):
+        """Normalize a change set; raises ValueError on unknown keys or bad values"""
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError('changes must be a non-empty object')
+        unknown = set(changes) - set(BULK_CHANGE_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported change keys: {', '.join(sorted(unknown))}")
+
+        normalized = {}
+        if 'status' in changes:
+            if changes['status'] not in CONTACT_STATUSES:
+                raise ValueError(f"status must be one of {', '.join(CONTACT_STATUSES)}")
+            normalized['status'] = changes['status']
+        if 'owner_id' in changes:
+            owner_id = changes['owner_id']
+            if owner_id is not None and not isinstance(owner_id, int):
+                raise ValueError('owner_id must be an integer or null')
+            normalized['owner_id'] = owner_id
+        if changes.get('add_tags'):
+            normalized['add_tags'] = normalize_tags(changes['add_tags'])
+        if changes.get('remove_tags'):
+            # A tag both added and removed is kept
+            normalized['remove_tags'] = [
+                tag for tag in normalize_tags(changes['remove_tags'])
+                if tag not in normalized.get('add_tags', [])
+            ]
+        if 'custom_fields' in changes:
+            fields = changes['custom_fields']
+            if not isinstance(fields, dict):
+                raise ValueError('custom_fields must be an object')
+            for key in fields:
+                validate_custom_field_key(key)
+            normalized['custom_fields'] = fields
+        return normalized
+
+    def selection_query(self, sub_account_id, ids=None, filters=None):
+        """Contact ids selected either by an explicit id list or by GET /contacts filters"""
+        query = select(Contact.id).where(Contact.sub_account_id == sub_account_id)
+        if ids is not None:
+            return query.where(Contact.id.in_(ids))
+        return apply_contact_filters(query, filters)
+
+    def count(self, sub_account_id, ids=None, filters=None):
+        selection = self.selection_query(sub_account_id, ids, filters).subquery()
+        return db.session.scalar(select(func.count()).select_from(selection))
+
+    def run(self, job_id, sub_account_id, changes, ids=None, filters=None, user_id=None):
+        """Job target; walks the selection by id so rows leaving the filter mid-run are not skipped"""
+        totals = {'processed': 0, 'updated': 0}
+        last_id = 0
+        while True:
+            chunk = db.session.scalars(
+                self.selection_query(sub_account_id, ids, filters)
+                .where(Contact.id > last_id)
+                .order_by(Contact.id)
+                .limit(self.CHUNK_SIZE)
+            ).all()
+            if not chunk:
+                break
+            last_id = chunk[-1]
+
+            self.apply_chunk(sub_account_id, chunk, changes, user_id=user_id)
+            totals['processed'] += len(chunk)
+            totals['updated'] += len(chunk)
+            if job_id is not None:
+                job_runner.mark(job_id, processed=totals['processed'], increment={'succeeded': len(chunk)})
+
+        logger.info(f"Bulk contact update for sub-account {sub_account_id} finished: {totals}")
+        return totals
+
+    def apply_chunk(self, sub_account_id, contact_ids, changes, user_id=None):
+        now = datetime.utcnow()
+        values = {key: changes[key] for key in ('status', 'owner_id') if key in changes}
+        db.session.execute(
+            update(Contact)
+            .where(Contact.id.in_(contact_ids), Contact.sub_account_id == sub_account_id)
+            .values(updated_at=now, **values),
+            execution_options={'synchronize_session': False}
+        )
+
+        add_tags = changes.get('add_tags', [])
+        remove_tags = changes.get('remove_tags', [])
+        custom_fields = changes.get('custom_fields')
+        if add_tags or remove_tags or custom_fields:
+            self._rewrite_json_columns(sub_account_id, contact_ids, add_tags, remove_tags, custom_fields)
+
+        db.session.execute(insert(ContactActivity), [
+            {'contact_id': contact_id, 'user_id': user_id, 'type': 'bulk_updated',
+             'description': 'Contact updated in bulk', 'meta_data': json.dumps(changes),
+             'created_at': now}
+            for contact_id in contact_ids
+        ])
+        segment_service.refresh_contacts(sub_account_id, contact_ids)
+        resource_versions.touch(tenant_scope(sub_account_id), 'contacts')
+        metric_rollups.mark(sub_account_id, now)
+        db.session.commit()
+
+    def _rewrite_json_columns(self, sub_account_id, contact_ids, add_tags, remove_tags, custom_fields):
+        rows = db.session.execute(
+            select(Contact.id, Contact.tags, Contact.custom_fields).where(Contact.id.in_(contact_ids))
+        ).all()
+
+        existing = set(db.session.execute(
+            select(ContactTag.contact_id, ContactTag.tag).where(
+                ContactTag.contact_id.in_(contact_ids),
+                ContactTag.tag.in_(add_tags)
+            )
+        ).tuples()) if add_tags else set()
+
+        params, tag_inserts = [], []
+        for row in rows:
+            current = parse_tags(row.tags)
+            tags = [tag for tag in current if tag not in remove_tags]
+            added = [tag for tag in add_tags if tag not in tags]
+            tags.extend(added)
+            tag_inserts.extend(
+                {'contact_id': row.id, 'tag': tag, 'sub_account_id': sub_account_id}
+                for tag in added if (row.id, tag) not in existing
+            )
+
+            param = {'id': row.id, 'tags': json.dumps(tags)}
+            if custom_fields:
+                param['custom_fields'] = {**(row.custom_fields or {}), **custom_fields}
+            params.append(param)
+
+        # ORM bulk UPDATE by primary key: one executemany for the chunk
+        if params:
+            db.session.execute(update(Contact), params)
+        if remove_tags:
+            db.session.execute(delete(ContactTag).where(
+                ContactTag.contact_id.in_(contact_ids),
+                ContactTag.tag.in_(remove_tags)
+            ))
+        if tag_inserts:
+            db.session.execute(insert(ContactTag), tag_inserts)
+
+# Global instance
+contact_bulk_service = ContactBulkService()
@@ -0,0 +1,264 @@
+import json
+import logging
+from datetime import datetime
+from difflib import SequenceMatcher
+from sqlalchemy import select, update, delete, insert, func
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity, ContactNote, ContactTask, ContactTag
+from src.models.pipeline import Opportunity
+from src.models.communications import Conversation
+from src.models.dedupe import DuplicateCluster
+from src.services.job_runner import job_runner
+from src.services.contact_tags import contact_tag_service, parse_tags
+from src.services.activity_log import activity_log
+from src.services.segment_service import segment_service
+from src.services.resource_versions import resource_versions, tenant_scope
+from src.services.metric_rollups import metric_rollups
+from src.utils.normalize import normalize_email, normalize_phone, normalize_text, soundex
+
+logger = logging.getLogger(__name__)
+
+# Exact-key blocks are unioned directly with these scores; name blocks are scored pairwise
+EMAIL_MATCH_SCORE = 0.95
+PHONE_MATCH_SCORE = 0.85
+
+# Tables whose rows follow a contact when it is merged into another
+REPARENTED_MODELS = (ContactActivity, ContactNote, ContactTask, Opportunity, Conversation)
+
+MERGE_FILL_FIELDS = ('email', 'phone', 'first_name', 'last_name', 'company', 'source')
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+        self.score = {}
+        self.reasons = {}
+
+    def find(self, item):
+        root = self.parent.setdefault(item, item)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b, score, reason):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+            self.score[root_a] = max(self.score.pop(root_b, 0.0), self.score.get(root_a, 0.0))
+            self.reasons.setdefault(root_a, set()).update(self.reasons.pop(root_b, set()))
+        self.score[root_a] = max(self.score.get(root_a, 0.0), score)
+        self.reasons.setdefault(root_a, set()).add(reason)
+
+    def clusters(self):
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        for root, members in groups.items():
+            if len(members) > 1:
+                yield sorted(members), self.score.get(root, 0.0), sorted(self.reasons.get(root, ()))
+
+
+class ContactDedupeService:
+    """Finds duplicate contacts by blocking on normalized keys and merges them
+
+    Candidates are only compared inside a block (same normalized email, same
+    E.164 phone, or same soundex of first name + last name + company), which
+    keeps a scan close to linear in the number of contacts.
+    """
+
+    SCAN_BATCH_SIZE = 5000
+    MAX_NAME_BLOCK = 200  # very common name keys carry little signal and cost O(k^2)
+    NAME_MATCH_THRESHOLD = 0.8
+
+    def blocking_keys(self, email, phone, first_name, last_name, company):
+        keys = []
+        email = normalize_email(email)
+        if email:
+            keys.append(('email', email))
+        phone = normalize_phone(phone)
+        if phone:
+            keys.append(('phone', phone))
+        if last_name and company:
+            keys.append(('name_company', soundex(first_name) + soundex(last_name) + soundex(company)))
+        return keys
+
+    def scan(self, job_id, sub_account_id):
+        """Job target: rebuild the pending duplicate clusters of one sub-account"""
+        total = db.session.scalar(
+            select(func.count()).select_from(Contact).where(Contact.sub_account_id == sub_account_id)
+        )
+        job_runner.mark(job_id, total=total)
+
+        first_seen = {}
+        blocks = {}
+        processed = 0
+        # Id-keyset chunks on the session: each chunk is its own query, so the
+        # progress commits in between never run under an open cursor (which
+        # SQLite would refuse with "database is locked")
+        last_id = 0
+        while True:
+            batch = db.session.execute(
+                select(Contact.id, Contact.email, Contact.phone, Contact.first_name,
+                       Contact.last_name, Contact.company)
+                .where(Contact.sub_account_id == sub_account_id, Contact.id > last_id)
+                .order_by(Contact.id)
+                .limit(self.SCAN_BATCH_SIZE)
+            ).all()
+            if not batch:
+                break
+            for row in batch:
+                for key in self.blocking_keys(row.email, row.phone, row.first_name, row.last_name, row.company):
+                    if key in blocks:
+                        blocks[key].append(row.id)
+                    elif key in first_seen:
+                        blocks[key] = [first_seen.pop(key), row.id]
+                    else:
+                        first_seen[key] = row.id
+            last_id = batch[-1].id
+            processed += len(batch)
+            job_runner.mark(job_id, processed=processed)
+        first_seen.clear()
+
+        clusters = _DisjointSet()
+        name_blocks = []
+        for (kind, _), ids in blocks.items():
+            if kind == 'name_company':
+                if len(ids) <= self.MAX_NAME_BLOCK:
+                    name_blocks.append(ids)
+                continue
+            score = EMAIL_MATCH_SCORE if kind == 'email' else PHONE_MATCH_SCORE
+            for other in ids[1:]:
+                clusters.union(ids[0], other, score, kind)
+        blocks.clear()
+
+        self._score_name_blocks(name_blocks, clusters)
+        return self._store_clusters(job_id, sub_account_id, clusters, processed)
+
+    def _score_name_blocks(self, name_blocks, clusters):
+        for start in range(0, len(name_blocks), 500):
+            chunk = name_blocks[start:start + 500]
+            ids = {contact_id for block in chunk for contact_id in block}
+            records = {
+                row.id: (normalize_text(f'{row.first_name or ""} {row.last_name or ""}'), normalize_text(row.company))
+                for row in db.session.execute(
+                    select(Contact.id, Contact.first_name, Contact.last_name, Contact.company)
+                    .where(Contact.id.in_(ids))
+                )
+            }
+            for block in chunk:
+                for i, a in enumerate(block):
+                    for b in block[i + 1:]:
+                        score = self.score_names(records.get(a), records.get(b))
+                        if score >= self.NAME_MATCH_THRESHOLD:
+                            clusters.union(a, b, score, 'name_company')
+
+    def score_names(self, a, b):
+        """0.0-1.0 similarity of two (full_name, company) pairs"""
+        if not a or not b:
+            return 0.0
+        name_ratio = SequenceMatcher(None, a[0], b[0]).ratio()
+        company_ratio = SequenceMatcher(None, a[1], b[1]).ratio()
+        return round(0.7 * name_ratio + 0.3 * company_ratio, 3)
+
+    def _store_clusters(self, job_id, sub_account_id, clusters, processed):
+        db.session.execute(
+            delete(DuplicateCluster).where(
+                DuplicateCluster.sub_account_id == sub_account_id,
+                DuplicateCluster.status == 'pending'
+            )
+        )
+
+        created_at = datetime.utcnow()
+        rows, cluster_count, contact_count = [], 0, 0
+        for members, score, reasons in clusters.clusters():
+            rows.append({
+                'sub_account_id': sub_account_id,
+                'job_id': job_id,
+                'contact_ids': json.dumps(members),
+                'score': score,
+                'reasons': json.dumps(reasons),
+                'status': 'pending',
+                'created_at': created_at
+            })
+            cluster_count += 1
+            contact_count += len(members)
+            if len(rows) >= 1000:
+                db.session.execute(insert(DuplicateCluster), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(DuplicateCluster), rows)
+        db.session.commit()
+
+        return {
+            'contacts_scanned': processed,
+            'clusters': cluster_count,
+            'contacts_in_clusters': contact_count
+        }
+
+    def merge(self, primary_id, duplicate_ids, cluster=None):
+        """Fold duplicate contacts into the primary one; the caller commits
+
+        Related rows are re-parented with one UPDATE per table, empty fields
+        on the primary are filled from the duplicates, tags are unioned and
+        custom fields merged with the primary's values winning.
+        """
+        duplicate_ids = sorted({int(contact_id) for contact_id in duplicate_ids} - {primary_id})
+        if not duplicate_ids:
+            raise ValueError('At least one duplicate id other than the primary is required')
+
+        primary = db.session.get(Contact, primary_id)
+        if primary is None:
+            raise LookupError('Primary contact not found')
+        duplicates = Contact.query.filter(
+            Contact.id.in_(duplicate_ids),
+            Contact.sub_account_id == primary.sub_account_id
+        ).order_by(Contact.created_at).all()
+        if len(duplicates) != len(duplicate_ids):
+            raise LookupError('Duplicate contacts not found in the primary contact\'s sub-account')
+
+        tags = parse_tags(primary.tags)
+        custom_fields = dict(primary.custom_fields or {})
+        # Deleting the duplicates changes the new-contact counts of the days they were created
+        metric_rollups.mark(primary.sub_account_id, *[duplicate.created_at for duplicate in duplicates])
+        for duplicate in duplicates:
+            for field in MERGE_FILL_FIELDS:
+                if not getattr(primary, field) and getattr(duplicate, field):
+                    setattr(primary, field, getattr(duplicate, field))
+            tags.extend(tag for tag in parse_tags(duplicate.tags) if tag not in tags)
+            if duplicate.custom_fields:
+                custom_fields = {**duplicate.custom_fields, **custom_fields}
+            db.session.expunge(duplicate)
+
+        primary.tags = json.dumps(tags)
+        primary.custom_fields = custom_fields
+        primary.updated_at = datetime.utcnow()
+        contact_tag_service.sync_contact(primary, tags)
+
+        for model in REPARENTED_MODELS:
+            db.session.execute(
+                update(model).where(model.contact_id.in_(duplicate_ids)).values(contact_id=primary_id),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.execute(delete(ContactTag).where(ContactTag.contact_id.in_(duplicate_ids)))
+        segment_service.remove_contacts(duplicate_ids)
+        db.session.execute(
+            delete(Contact).where(Contact.id.in_(duplicate_ids)),
+            execution_options={'synchronize_session': False}
+        )
+
+        segment_service.refresh_contacts(primary.sub_account_id, [primary_id])
+        # Re-parented rows were moved with Core UPDATEs the flush hook cannot see
+        resource_versions.touch(tenant_scope(primary.sub_account_id), 'contacts', 'opportunities', 'conversations')
+
+        if cluster is not None:
+            cluster.status = 'merged'
+            cluster.resolved_at = datetime.utcnow()
+
+        activity_log.contact(primary_id, 'merged', f'Merged {len(duplicate_ids)} duplicate contact(s)',
+                             metadata={'merged_contact_ids': duplicate_ids})
+        return primary
+
+# Global instance
+contact_dedupe = ContactDedupeService()
@@ -0,0 +1,38 @@
+from src.models.contact import Contact
+from src.services.contact_search import contact_search
+from src.services.contact_tags import contact_tag_service
+from src.services.custom_fields import apply_custom_field_filters
+
+
+def apply_contact_filters(query, args, ranked=False):
+    """Apply the GET /contacts filter parameters to a Contact query or select()
+
+    Shared by the list, export and bulk endpoints so every one of them selects
+    exactly the same contacts for the same query string. Malformed cf.*
+    custom field filters raise ValueError.
+    """
+    sub_account_id = args.get('sub_account_id', type=int)
+    search = args.get('search', '')
+    status = args.get('status', '')
+    tags = args.get('tags', '')
+    tags_mode = args.get('tags_mode', 'all')
+
+    # Explicit column comparisons: filter_by() would target the search join instead
+    if sub_account_id:
+        query = query.filter(Contact.sub_account_id == sub_account_id)
+
+    if search:
+        query = contact_search.apply(query, search, sub_account_id, ranked=ranked)
+
+    if status:
+        query = query.filter(Contact.status == status)
+
+    if tags:
+        query = contact_tag_service.filter(
+            query, tags.split(','), sub_account_id, match_all=tags_mode != 'any'
+        )
+
+    # cf.plan=enterprise, cf.seats>=50, ...
+    query = apply_custom_field_filters(query, Contact, args)
+
+    return query
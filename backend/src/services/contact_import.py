@@ -0,0 +1,197 @@
+import io
+import os
+import re
+import csv
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity, ContactTag
+from src.services.job_runner import job_runner
+from src.services.contact_tags import normalize_tags
+from src.utils.normalize import normalize_email, normalize_phone
+from src.services.segment_service import segment_service
+from src.services.resource_versions import resource_versions, tenant_scope
+from src.services.metric_rollups import metric_rollups
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+CONTACT_STATUSES = ('active', 'inactive', 'archived')
+IMPORT_FORMATS = ('csv', 'ndjson')
+STRING_LIMITS = {
+    'email': 255,
+    'phone': 50,
+    'first_name': 100,
+    'last_name': 100,
+    'company': 255,
+    'source': 100,
+}
+
+
+def detect_format(filename, requested=None):
+    """Pick csv/ndjson from an explicit format or the file extension"""
+    if requested:
+        return requested.lower() if requested.lower() in IMPORT_FORMATS else None
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+class ContactImportService:
+    """Stream-parses CSV/NDJSON contact files and inserts them in batches"""
+
+    CHUNK_SIZE = 1000
+
+    def iter_records(self, binary_stream, file_format):
+        """Yield (line_number, record) pairs without reading the whole file"""
+        text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+        try:
+            if file_format == 'csv':
+                reader = csv.DictReader(text_stream)
+                for record in reader:
+                    yield reader.line_num, record
+            else:
+                for line_number, line in enumerate(text_stream, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        yield line_number, None
+        finally:
+            text_stream.detach()
+
+    def validate(self, record, sub_account_id):
+        """Turn one raw record into a contacts row, or return an error message"""
+        if not isinstance(record, dict):
+            return None, None, 'Row is not a valid object'
+
+        row = {'sub_account_id': sub_account_id}
+        for field, limit in STRING_LIMITS.items():
+            value = record.get(field)
+            value = str(value).strip() if value not in (None, '') else None
+            if value and len(value) > limit:
+                return None, None, f'{field} is longer than {limit} characters'
+            row[field] = value
+
+        if not any(row[field] for field in ('email', 'phone', 'first_name', 'last_name')):
+            return None, None, 'One of email, phone, first_name or last_name is required'
+        if row['email'] and not EMAIL_RE.match(row['email']):
+            return None, None, f"Invalid email: {row['email']}"
+        # Core INSERTs bypass the model validators, so normalize here
+        row['email_norm'] = normalize_email(row['email'])
+        row['phone_e164'] = normalize_phone(row['phone'])
+
+        status = (record.get('status') or 'active').strip().lower()
+        if status not in CONTACT_STATUSES:
+            return None, None, f'Invalid status: {status}'
+        row['status'] = status
+        row['source'] = row['source'] or 'import'
+
+        tags = record.get('tags') or []
+        if isinstance(tags, str):
+            # CSV cells carry either a JSON array or a ;/, separated list
+            try:
+                tags = json.loads(tags) if tags.strip().startswith('[') else re.split(r'[;,]', tags)
+            except ValueError:
+                return None, None, 'tags is not a valid JSON array'
+        if not isinstance(tags, list):
+            return None, None, 'tags must be a list'
+        tags = normalize_tags(tags)
+        row['tags'] = json.dumps(tags)
+
+        custom_fields = record.get('custom_fields') or {}
+        if isinstance(custom_fields, str):
+            try:
+                custom_fields = json.loads(custom_fields)
+            except ValueError:
+                return None, None, 'custom_fields is not valid JSON'
+        if not isinstance(custom_fields, dict):
+            return None, None, 'custom_fields must be an object'
+        row['custom_fields'] = custom_fields
+
+        now = datetime.utcnow()
+        row['created_at'] = now
+        row['updated_at'] = now
+        return row, tags, None
+
+    def import_file(self, job_id, path, file_format, sub_account_id, remove_file=False):
+        """Job target: import a spooled upload, committing and reporting once per chunk"""
+        try:
+            with open(path, 'rb') as binary_stream:
+                return self.import_stream(job_id, binary_stream, file_format, sub_account_id)
+        finally:
+            if remove_file:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def import_stream(self, job_id, binary_stream, file_format, sub_account_id):
+        totals = {'processed': 0, 'inserted': 0, 'failed': 0}
+        chunk = []
+
+        for line_number, record in self.iter_records(binary_stream, file_format):
+            chunk.append((line_number, record))
+            if len(chunk) >= self.CHUNK_SIZE:
+                self._import_chunk(job_id, chunk, sub_account_id, totals)
+                chunk = []
+        if chunk:
+            self._import_chunk(job_id, chunk, sub_account_id, totals)
+
+        logger.info(f"Contact import job {job_id} finished: {totals}")
+        return totals
+
+    def _import_chunk(self, job_id, chunk, sub_account_id, totals):
+        rows, row_tags, errors = [], [], []
+        for line_number, record in chunk:
+            row, tags, error = self.validate(record, sub_account_id)
+            if error:
+                errors.append({'line': line_number, 'error': error})
+            else:
+                rows.append(row)
+                row_tags.append(tags)
+
+        if rows:
+            # One executemany-style INSERT ... RETURNING for the whole chunk
+            contact_ids = db.session.execute(
+                insert(Contact).returning(Contact.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+
+            tag_rows = [
+                {'contact_id': contact_id, 'tag': tag, 'sub_account_id': sub_account_id}
+                for contact_id, tags in zip(contact_ids, row_tags)
+                for tag in tags
+            ]
+            if tag_rows:
+                db.session.execute(insert(ContactTag), tag_rows)
+
+            now = datetime.utcnow()
+            db.session.execute(insert(ContactActivity), [
+                {'contact_id': contact_id, 'type': 'imported',
+                 'description': 'Contact imported', 'created_at': now}
+                for contact_id in contact_ids
+            ])
+            segment_service.refresh_contacts(sub_account_id, contact_ids)
+            resource_versions.touch(tenant_scope(sub_account_id), 'contacts')
+            metric_rollups.mark(sub_account_id, now, rows[0]['created_at'], rows[-1]['created_at'])
+            db.session.commit()
+
+        totals['processed'] += len(chunk)
+        totals['inserted'] += len(rows)
+        totals['failed'] += len(errors)
+        job_runner.mark(
+            job_id,
+            errors=errors,
+            increment={'processed': len(chunk), 'succeeded': len(rows), 'failed_count': len(errors)}
+        )
+
+# Global instance
+contact_import_service = ContactImportService()
@@ -0,0 +1,92 @@
+import logging
+from sqlalchemy import select, update, inspect, text
+from src.models.user import db
+from src.models.contact import Contact
+from src.utils.normalize import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_COLUMNS = {
+    'email_norm': 'VARCHAR(255)',
+    'phone_e164': 'VARCHAR(20)',
+}
+# Every column added to contacts after the table shipped; create_all() never ALTERs existing tables
+ADDED_COLUMNS = {
+    **LOOKUP_COLUMNS,
+    'owner_id': 'INTEGER REFERENCES users(id)',
+}
+
+
+class ContactLookupService:
+    """Exact contact resolution by normalized email or E.164 phone
+
+    Both lookups are single probes of the (sub_account_id, email_norm) and
+    (sub_account_id, phone_e164) indexes, so inbound webhooks resolve a sender
+    without scanning the tenant's contacts.
+    """
+
+    def lookup(self, sub_account_id, email=None, phone=None, limit=10):
+        query = Contact.query.filter(Contact.sub_account_id == sub_account_id)
+        if email:
+            email = normalize_email(email)
+            if not email:
+                return []
+            query = query.filter(Contact.email_norm == email)
+        elif phone:
+            phone = normalize_phone(phone)
+            if not phone:
+                return []
+            query = query.filter(Contact.phone_e164 == phone)
+        else:
+            return []
+        return query.order_by(Contact.id).limit(limit).all()
+
+    def ensure_columns(self):
+        """Add the newer columns (lookup keys, owner_id) and their indexes to an existing contacts table
+
+        Returns the names of the columns added.
+        """
+        inspector = inspect(db.engine)
+        if not inspector.has_table('contacts'):
+            return []  # create_all() will build it with every column
+        existing = {column['name'] for column in inspector.get_columns('contacts')}
+        added = [name for name in ADDED_COLUMNS if name not in existing]
+        with db.engine.begin() as connection:
+            for name in added:
+                connection.execute(text(f'ALTER TABLE contacts ADD COLUMN {name} {ADDED_COLUMNS[name]}'))
+        for index in Contact.__table__.indexes:
+            if index.name in ('ix_contacts_sub_account_email_norm', 'ix_contacts_sub_account_phone_e164'):
+                index.create(db.engine, checkfirst=True)
+        return added
+
+    def backfill(self, batch_size=1000):
+        """Recompute email_norm/phone_e164 for every contact in id-ordered batches"""
+        self.ensure_columns()
+        last_id = 0
+        processed = 0
+
+        while True:
+            batch = db.session.execute(
+                select(Contact.id, Contact.email, Contact.phone)
+                .where(Contact.id > last_id)
+                .order_by(Contact.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            # ORM bulk UPDATE by primary key: one executemany per batch
+            db.session.execute(update(Contact), [
+                {'id': row.id, 'email_norm': normalize_email(row.email), 'phone_e164': normalize_phone(row.phone)}
+                for row in batch
+            ])
+            db.session.commit()
+
+            last_id = batch[-1].id
+            processed += len(batch)
+            logger.info(f"Backfilled contact lookup keys for {processed} contacts")
+
+        return processed
+
+# Global instance
+contact_lookup = ContactLookupService()
@@ -0,0 +1,99 @@
+import re
+import logging
+from sqlalchemy import text, table, column, literal_column, func
+from src.models.user import db
+from src.models.contact import Contact, CONTACT_SEARCH_DDL, CONTACT_SEARCH_DOCUMENT_SQL
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+contacts_fts = table('contacts_fts', column('rowid'), column('rank'))
+
+
+class ContactSearchService:
+    """Index-backed contact search (FTS5 on SQLite, pg_trgm on PostgreSQL)"""
+
+    def _dialect(self):
+        return db.engine.dialect.name
+
+    def apply(self, query, search, sub_account_id=None, ranked=True):
+        """Filter a Contact query by `search`, ordering by relevance when `ranked`
+
+        Relevance ordering is applied first so callers can append their own
+        tie-breaking order (e.g. newest first).
+        """
+        search = (search or '').strip()
+        if not search:
+            return query
+
+        dialect = self._dialect()
+        if dialect == 'sqlite':
+            return self._apply_fts5(query, search, sub_account_id, ranked)
+        if dialect == 'postgresql':
+            return self._apply_trigram(query, search, ranked)
+        return self._apply_ilike(query, search)
+
+    def _apply_fts5(self, query, search, sub_account_id, ranked):
+        tokens = _TOKEN_RE.findall(search)
+        if not tokens:
+            return query.filter(db.false())
+
+        # Every token is a quoted prefix match so typing "jo smi" finds "John Smith"
+        terms = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        match = '{first_name last_name email company} : (%s)' % terms
+        if sub_account_id:
+            match = 'tenant : "s%d" AND %s' % (sub_account_id, match)
+
+        query = query.join(contacts_fts, contacts_fts.c.rowid == Contact.id)\
+            .filter(literal_column('contacts_fts').op('MATCH')(match))
+        if ranked:
+            query = query.order_by(contacts_fts.c.rank)
+        return query
+
+    def _apply_trigram(self, query, search, ranked):
+        document = literal_column(CONTACT_SEARCH_DOCUMENT_SQL)
+        term = search.lower()
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+        query = query.filter(document.like(pattern, escape='\\'))
+        if ranked:
+            query = query.order_by(func.similarity(document, term).desc())
+        return query
+
+    def _apply_ilike(self, query, search):
+        search_term = f"%{search}%"
+        return query.filter(
+            db.or_(
+                Contact.first_name.ilike(search_term),
+                Contact.last_name.ilike(search_term),
+                Contact.email.ilike(search_term),
+                Contact.company.ilike(search_term)
+            )
+        )
+
+    def ensure_index(self, rebuild=False):
+        """Create the search index on an existing database, optionally repopulating it"""
+        dialect = self._dialect()
+        statements = CONTACT_SEARCH_DDL.get(dialect)
+        if not statements:
+            logger.warning(f"No contact search index available for dialect {dialect}")
+            return False
+
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+
+            if dialect == 'sqlite' and rebuild:
+                # Contentless FTS5 tables cannot 'rebuild'; clear and re-insert instead
+                connection.execute(text("INSERT INTO contacts_fts(contacts_fts) VALUES ('delete-all')"))
+                connection.execute(text(
+                    "INSERT INTO contacts_fts(rowid, tenant, first_name, last_name, email, company) "
+                    "SELECT id, 's' || sub_account_id, first_name, last_name, email, company FROM contacts"
+                ))
+
+        logger.info(f"Contact search index ready ({dialect})")
+        return True
+
+# Global instance
+contact_search = ContactSearchService()
@@ -0,0 +1,107 @@
+import json
+import logging
+from sqlalchemy import select, func, insert, delete
+from src.models.user import db
+from src.models.contact import Contact, ContactTag
+
+logger = logging.getLogger(__name__)
+
+MAX_TAG_LENGTH = 100
+
+
+def normalize_tags(tags):
+    """Strip, de-duplicate and drop empty tags, preserving the caller's order"""
+    normalized = []
+    seen = set()
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            tag = str(tag)
+        tag = tag.strip()[:MAX_TAG_LENGTH]
+        if tag and tag not in seen:
+            seen.add(tag)
+            normalized.append(tag)
+    return normalized
+
+
+def parse_tags(raw):
+    """Decode the JSON text stored in Contact.tags"""
+    if not raw:
+        return []
+    try:
+        tags = json.loads(raw)
+    except (ValueError, TypeError):
+        return []
+    return normalize_tags(tags) if isinstance(tags, list) else []
+
+
+class ContactTagService:
+    """Maintains the contact_tags index and builds tag filters on top of it"""
+
+    def sync_contact(self, contact, tags):
+        """Make contact.tag_rows match `tags`; the contact must already have an id
+
+        Only the difference is written, so unchanged tags cost nothing.
+        """
+        wanted = set(normalize_tags(tags))
+        for row in list(contact.tag_rows):
+            if row.tag not in wanted:
+                contact.tag_rows.remove(row)
+            elif row.sub_account_id != contact.sub_account_id:
+                row.sub_account_id = contact.sub_account_id
+        existing = {row.tag for row in contact.tag_rows}
+        for tag in wanted - existing:
+            contact.tag_rows.append(ContactTag(tag=tag, sub_account_id=contact.sub_account_id))
+
+    def filter(self, query, tags, sub_account_id=None, match_all=True):
+        """Restrict a Contact query to contacts carrying `tags` (all of them, or any)
+
+        Compiles to a single semi-join on the (sub_account_id, tag, contact_id) index.
+        """
+        tags = normalize_tags(tags)
+        if not tags:
+            return query
+
+        matching = select(ContactTag.contact_id).where(ContactTag.tag.in_(tags))
+        if sub_account_id:
+            matching = matching.where(ContactTag.sub_account_id == sub_account_id)
+        if match_all and len(tags) > 1:
+            matching = matching.group_by(ContactTag.contact_id)\
+                .having(func.count() == len(tags))
+
+        return query.filter(Contact.id.in_(matching))
+
+    def backfill(self, batch_size=1000):
+        """Rebuild contact_tags from Contact.tags in id-ordered batches"""
+        last_id = 0
+        processed = 0
+
+        while True:
+            batch = db.session.execute(
+                select(Contact.id, Contact.sub_account_id, Contact.tags)
+                .where(Contact.id > last_id)
+                .order_by(Contact.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            contact_ids = [row.id for row in batch]
+            rows = [
+                {'contact_id': row.id, 'sub_account_id': row.sub_account_id, 'tag': tag}
+                for row in batch
+                for tag in parse_tags(row.tags)
+            ]
+
+            db.session.execute(delete(ContactTag).where(ContactTag.contact_id.in_(contact_ids)))
+            if rows:
+                db.session.execute(insert(ContactTag), rows)
+            db.session.commit()
+
+            last_id = contact_ids[-1]
+            processed += len(batch)
+            logger.info(f"Backfilled tags for {processed} contacts (last id {last_id})")
+
+        return processed
+
+# Global instance
+contact_tag_service = ContactTagService()
@@ -0,0 +1,122 @@
+from sqlalchemy import select, literal, cast, String, union_all, and_, or_
+from src.models.user import db
+from src.models.contact import ContactActivity, ContactNote, ContactTask
+from src.models.pipeline import Opportunity, OpportunityActivity
+from src.models.communications import Conversation, Message
+
+
+class ContactTimelineService:
+    """Merges every event stream of a contact into one keyset-paginated timeline
+
+    Each source contributes (kind, id, created_at, type, title, body). A page is
+    a single UNION ALL statement in which every branch is already limited to
+    the page size on its own (contact_id, created_at) index, so deep histories
+    cost the same per page as short ones.
+    """
+
+    def _sources(self, contact_id):
+        return {
+            'activity': (
+                select(
+                    ContactActivity.id.label('id'),
+                    ContactActivity.created_at.label('created_at'),
+                    ContactActivity.type.label('type'),
+                    ContactActivity.description.label('title'),
+                    cast(None, String).label('body')
+                ).where(ContactActivity.contact_id == contact_id),
+                ContactActivity
+            ),
+            'message': (
+                select(
+                    Message.id.label('id'),
+                    Message.created_at.label('created_at'),
+                    cast(Message.type, String).label('type'),
+                    Message.subject.label('title'),
+                    Message.content.label('body')
+                ).join(Conversation, Conversation.id == Message.conversation_id)
+                .where(Conversation.contact_id == contact_id),
+                Message
+            ),
+            'note': (
+                select(
+                    ContactNote.id.label('id'),
+                    ContactNote.created_at.label('created_at'),
+                    literal('note').label('type'),
+                    cast(None, String).label('title'),
+                    ContactNote.content.label('body')
+                ).where(ContactNote.contact_id == contact_id),
+                ContactNote
+            ),
+            'opportunity_activity': (
+                select(
+                    OpportunityActivity.id.label('id'),
+                    OpportunityActivity.created_at.label('created_at'),
+                    OpportunityActivity.type.label('type'),
+                    Opportunity.title.label('title'),
+                    OpportunityActivity.description.label('body')
+                ).join(Opportunity, Opportunity.id == OpportunityActivity.opportunity_id)
+                .where(Opportunity.contact_id == contact_id),
+                OpportunityActivity
+            ),
+            'task': (
+                select(
+                    ContactTask.id.label('id'),
+                    ContactTask.created_at.label('created_at'),
+                    ContactTask.status.label('type'),
+                    ContactTask.title.label('title'),
+                    ContactTask.description.label('body')
+                ).where(ContactTask.contact_id == contact_id),
+                ContactTask
+            ),
+        }
+
+    def page(self, contact_id, position=None, limit=25):
+        """Return (items, next_position) newest first; position is (created_at, kind, id)"""
+        branches = []
+        for kind, (statement, model) in self._sources(contact_id).items():
+            if position:
+                statement = statement.where(self._after(model, kind, position))
+            branch = statement.add_columns(literal(kind).label('kind'))\
+                .order_by(model.created_at.desc(), model.id.desc())\
+                .limit(limit + 1)\
+                .subquery()
+            branches.append(select(*branch.c))
+
+        timeline = union_all(*branches).subquery()
+        rows = db.session.execute(
+            select(timeline)
+            .order_by(timeline.c.created_at.desc(), timeline.c.kind.desc(), timeline.c.id.desc())
+            .limit(limit + 1)
+        ).all()
+
+        items = [self._serialize(row) for row in rows[:limit]]
+        next_position = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_position = (last.created_at, last.kind, last.id)
+        return items, next_position
+
+    def _after(self, model, kind, position):
+        """Keyset predicate for one branch; the kind is constant so it folds into Python"""
+        created_at, after_kind, after_id = position
+        if kind < after_kind:
+            return model.created_at <= created_at
+        if kind > after_kind:
+            return model.created_at < created_at
+        return or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < after_id)
+        )
+
+    def _serialize(self, row):
+        return {
+            'kind': row.kind,
+            'id': row.id,
+            'type': row.type.lower() if row.kind == 'message' and row.type else row.type,
+            'title': row.title,
+            'body': row.body,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }
+
+# Global instance
+contact_timeline = ContactTimelineService()
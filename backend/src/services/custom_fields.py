@@ -0,0 +1,245 @@
+import re
+import logging
+import operator
+from sqlalchemy import inspect, text, literal_column, type_coerce, cast, or_, and_, not_, false, Float, Integer, Numeric, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+CUSTOM_FIELD_KEY_RE = re.compile(r'^[A-Za-z0-9_\-]{1,64}$')
+CUSTOM_FIELD_FILTER_RE = re.compile(r'^cf\.([A-Za-z0-9_\-]{1,64})(>=|<=|!=|>|<|=)(.*)$', re.DOTALL)
+
+FILTER_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Leading column of the index on a promoted custom field, i.e. how each table is scoped
+PROMOTION_SCOPES = {
+    'contacts': 'sub_account_id',
+    'opportunities': 'pipeline_id',
+}
+
+_promoted_columns = {}
+
+
+def validate_custom_field_key(key):
+    if not isinstance(key, str) or not CUSTOM_FIELD_KEY_RE.match(key):
+        raise ValueError(f'Invalid custom field key: {key!r}')
+    return key
+
+
+def promoted_column_name(key):
+    return 'cf_' + validate_custom_field_key(key).lower().replace('-', '_')
+
+
+def promoted_columns(table_name):
+    """{column_name: is_numeric} of the generated cf_* columns on a table, cached per process"""
+    if table_name not in _promoted_columns:
+        _promoted_columns[table_name] = {
+            column['name']: isinstance(column['type'], (Float, Integer, Numeric))
+            for column in inspect(db.engine).get_columns(table_name)
+            if column['name'].startswith('cf_')
+        }
+    return _promoted_columns[table_name]
+
+
+def custom_field_value(model, key, numeric=False):
+    """SQL expression reading custom_fields[key] of `model`
+
+    Uses the promoted generated column when the key has one (so its index
+    applies), otherwise a JSON path: `->>` on PostgreSQL, json_extract() on
+    SQLite. `numeric=True` makes comparisons like >= 50 numeric.
+    """
+    column_name = promoted_column_name(key)
+    promoted = promoted_columns(model.__tablename__)
+    if column_name in promoted:
+        column = literal_column(f'{model.__tablename__}.{column_name}',
+                                type_=Float() if promoted[column_name] else Text())
+        return cast(column, Float) if numeric and not promoted[column_name] else column
+
+    value = model.custom_fields[key]
+    return value.as_float() if numeric else value.as_string()
+
+
+def custom_field_condition(model, key, op, value):
+    """WHERE clause for one cf.<key><op><value> filter"""
+    compare = FILTER_OPERATORS[op]
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    if op in ('=', '!=') and not numeric:
+        equal = _equals_as_written(model, key, str(value))
+        if op == '=':
+            return equal
+        return and_(custom_field_value(model, key).isnot(None), not_(equal))
+    if (op == '=' and promoted_column_name(key) not in promoted_columns(model.__tablename__)
+            and db.engine.dialect.name == 'postgresql'):
+        # Containment is what the jsonb_path_ops GIN index serves
+        return type_coerce(model.custom_fields, JSONB).contains({key: value})
+    return compare(custom_field_value(model, key, numeric=numeric), value if numeric else str(value))
+
+
+def _equals_as_written(model, key, value):
+    """custom_fields[key] equals `value` as typed: the JSON string itself, or the number it spells
+
+    A query string cannot tell a string of digits from a number, so both
+    stored forms are matched; "02139" or "007" only match strings, since no
+    stored number is written that way.
+    """
+    number = _as_number(value)
+    promoted = promoted_columns(model.__tablename__).get(promoted_column_name(key))
+    if promoted is not None:
+        column = custom_field_value(model, key)
+        if promoted:
+            return column == number if number is not None else false()
+        return column == value
+
+    if number is not None and str(number) != value:
+        number = None
+
+    if db.engine.dialect.name == 'postgresql':
+        # Containment is what the jsonb_path_ops GIN index serves
+        document = type_coerce(model.custom_fields, JSONB)
+        clauses = [document.contains({key: value})]
+        if number is not None:
+            clauses.append(document.contains({key: number}))
+        return or_(*clauses)
+
+    clauses = [custom_field_value(model, key) == value]
+    if number is not None:
+        clauses.append(custom_field_value(model, key, numeric=True) == number)
+    return or_(*clauses)
+
+
+def _as_number(value):
+    """`value` as an int or float when it spells one, else None"""
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _coerce_filter_value(op, value):
+    # Only the ordering operators compare numbers; = and != keep the value as written
+    if op in ('=', '!='):
+        return value
+    number = _as_number(value)
+    return value if number is None else number
+
+
+def parse_custom_field_filters(args):
+    """Collect (key, op, value) triples from cf.* query-string parameters
+
+    The query-string parser splits each pair at its first '=', so
+    `cf.seats>=50` arrives as ('cf.seats>', '50') and `cf.seats>50` as
+    ('cf.seats>50', ''); both are stitched back together before parsing.
+    Numeric-looking values compare numerically with <, <=, > and >=; = and
+    != match the stored value whether it is that string or that number.
+    """
+    filters = []
+    for name, value in args.items(multi=True):
+        if not name.startswith('cf.'):
+            continue
+        if value == '' and name[-1:] not in '<>!' and ('<' in name or '>' in name):
+            expression = name
+        else:
+            expression = f'{name}={value}'
+
+        match = CUSTOM_FIELD_FILTER_RE.match(expression)
+        if not match:
+            raise ValueError(f'Invalid custom field filter: {expression}')
+        key, op, raw_value = match.groups()
+        filters.append((key, op, _coerce_filter_value(op, raw_value)))
+    return filters
+
+
+def apply_custom_field_filters(query, model, args):
+    """Apply every cf.* filter in `args` to a query over `model`; raises ValueError"""
+    for key, op, value in parse_custom_field_filters(args):
+        query = query.filter(custom_field_condition(model, key, op, value))
+    return query
+
+
+def migrate_custom_fields(model):
+    """Convert a table's custom_fields to native JSON storage and index it
+
+    PostgreSQL: ALTER the text column to JSONB and build the GIN index.
+    SQLite keeps the JSON1 text representation; rows that are not valid JSON
+    are cleared so the JSON type can read every row.
+    """
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as connection:
+        if dialect == 'postgresql':
+            column_type = next(
+                column['type'] for column in inspect(connection).get_columns(table)
+                if column['name'] == 'custom_fields'
+            )
+            if not isinstance(column_type, JSONB):
+                connection.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN custom_fields TYPE JSONB "
+                    f"USING NULLIF(custom_fields::text, '')::jsonb"
+                ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_custom_fields_gin "
+                f"ON {table} USING GIN (custom_fields jsonb_path_ops)"
+            ))
+        elif dialect == 'sqlite':
+            connection.execute(text(
+                f"UPDATE {table} SET custom_fields = NULL "
+                f"WHERE custom_fields = '' OR json_valid(custom_fields) = 0"
+            ))
+    logger.info(f"custom_fields of {table} migrated ({dialect})")
+    return True
+
+
+def promote_custom_field(model, key, numeric=False):
+    """Add a generated, indexed column mirroring custom_fields[key]
+
+    Filters and segments on that key then read the column and its
+    (scope, cf_<key>) index instead of extracting JSON per row. Only promote
+    numeric keys whose values are always numbers: PostgreSQL rejects writes
+    whose value cannot be cast.
+    """
+    table = model.__tablename__
+    if table not in PROMOTION_SCOPES:
+        raise ValueError(f'Custom fields of {table} cannot be promoted')
+    column = promoted_column_name(key)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        expression = f"(custom_fields ->> '{key}')"
+        column_type = 'DOUBLE PRECISION' if numeric else 'TEXT'
+        if numeric:
+            expression = f"{expression}::double precision"
+        add_column = (f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type} "
+                      f"GENERATED ALWAYS AS ({expression}) STORED")
+    elif dialect == 'sqlite':
+        expression = f"json_extract(custom_fields, '$.\"{key}\"')"
+        column_type = 'REAL' if numeric else 'TEXT'
+        if numeric:
+            expression = f"CAST({expression} AS REAL)"
+        # SQLite can only ALTER in VIRTUAL generated columns; the index stores the values
+        add_column = (f"ALTER TABLE {table} ADD COLUMN {column} {column_type} "
+                      f"GENERATED ALWAYS AS ({expression}) VIRTUAL")
+    else:
+        raise ValueError(f'Custom field promotion is not supported on {dialect}')
+
+    _promoted_columns.pop(table, None)
+    exists = column in promoted_columns(table)
+    with db.engine.begin() as connection:
+        if not exists:
+            connection.execute(text(add_column))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({PROMOTION_SCOPES[table]}, {column})"
+        ))
+    _promoted_columns.pop(table, None)
+    logger.info(f"Promoted custom field {key!r} of {table} to {column}")
+    return column
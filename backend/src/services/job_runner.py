@@ -0,0 +1,80 @@
+import json
+import logging
+import threading
+from datetime import datetime
+from flask import current_app
+from src.models.user import db
+from src.models.job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs long jobs off the request path and records their progress in background_jobs"""
+
+    def create(self, kind, sub_account_id, params=None, total=None):
+        job = BackgroundJob(
+            kind=kind,
+            sub_account_id=sub_account_id,
+            params=json.dumps(params or {}),
+            total=total
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def submit(self, job, target, *args, **kwargs):
+        """Run target(job_id, *args, **kwargs) on a daemon thread inside an app context"""
+        app = current_app._get_current_object()
+        thread = threading.Thread(
+            target=self._run,
+            args=(app, job.id, target, args, kwargs),
+            name=f'job-{job.kind}-{job.id}',
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def run_inline(self, job, target, *args, **kwargs):
+        """Run a job in the caller's thread (CLI and scheduled tasks)"""
+        return self._execute(job.id, target, args, kwargs)
+
+    def _run(self, app, job_id, target, args, kwargs):
+        with app.app_context():
+            try:
+                self._execute(job_id, target, args, kwargs)
+            finally:
+                db.session.remove()
+
+    def _execute(self, job_id, target, args, kwargs):
+        self.mark(job_id, status='running', started_at=datetime.utcnow())
+        try:
+            result = target(job_id, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            db.session.rollback()
+            self.mark(job_id, status='failed', finished_at=datetime.utcnow(),
+                      errors=[{'error': str(e), 'type': type(e).__name__}])
+            return None
+
+        self.mark(job_id, status='completed', finished_at=datetime.utcnow(), result=result)
+        return result
+
+    def mark(self, job_id, errors=None, result=None, increment=None, **fields):
+        """Update a job row and commit; `increment` adds to counters instead of setting them"""
+        job = db.session.get(BackgroundJob, job_id)
+        if job is None:
+            return None
+        for key, value in fields.items():
+            setattr(job, key, value)
+        for key, delta in (increment or {}).items():
+            setattr(job, key, (getattr(job, key) or 0) + delta)
+        if errors:
+            job.add_errors(errors)
+        if result is not None:
+            job.result = json.dumps(result)
+        db.session.commit()
+        return job
+
+# Global instance
+job_runner = JobRunner()
@@ -0,0 +1,318 @@
+import os
+import logging
+from datetime import datetime, date, timedelta
+from sqlalchemy import event, select, delete, insert, update, func, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity
+from src.models.pipeline import Pipeline, Opportunity
+from src.models.rollup import DailyRollup, DailyActivityRollup, RollupDirtyDay
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'pending_rollup_days'
+ROLLUP_COUNTERS = ('new_contacts', 'opportunities_opened', 'opportunities_won', 'opportunities_lost', 'won_revenue')
+CLOSED_STATUSES = ('won', 'lost')
+
+
+def _as_date(value):
+    """func.date() yields date objects on PostgreSQL and 'YYYY-MM-DD' strings on SQLite"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def _day_runs(days):
+    """Split sorted days into contiguous [start, end) runs"""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and runs[-1][1] == day:
+            runs[-1][1] = day + timedelta(days=1)
+        else:
+            runs.append([day, day + timedelta(days=1)])
+    return [(start, end) for start, end in runs]
+
+
+def _bounds(start, end):
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+
+class MetricRollupService:
+    """Per sub-account daily rollups of contacts, opportunities and activities
+
+    Writes mark the (sub_account_id, UTC day) pairs they affect: ORM changes
+    through a flush hook, Core statements through mark(). In 'deferred' mode
+    (ROLLUP_MODE, the default) the pairs are queued in rollup_dirty_days for
+    the rollup_catch_up task, so a write only pays for one small insert and
+    dashboards lag by up to the task's interval. In 'sync' mode those days are
+    recomputed from the base tables inside the same transaction, just before
+    it commits, so rollups never disagree with committed data; that re-reads
+    the whole (tenant, day) on every write and suits low write volumes only.
+    Recomputing a day, rather than applying deltas, keeps deletes and status
+    reversals exact.
+
+    Rollups only exist for days written since they were introduced: after
+    deploying, run rollup_rebuild once, or dashboard totals read 0 for
+    everything older.
+    """
+
+    # Serve the date-range scans of rebuild() / catch_up(); not created by create_all() on existing tables
+    RANGE_INDEXES = ('ix_contact_activities_created',)
+
+    def __init__(self):
+        self.mode = os.environ.get('ROLLUP_MODE', 'deferred')
+
+    def init_app(self, app):
+        if 'metric_rollups' in app.extensions:
+            return
+        app.extensions['metric_rollups'] = self
+        self.mode = app.config.get('ROLLUP_MODE', self.mode)
+
+        event.listen(db.session, 'before_flush', self._before_flush)
+        event.listen(db.session, 'before_commit', self._before_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def mark(self, sub_account_id, *days, session=None):
+        """Record days of a sub-account changed by Core statements in the current transaction"""
+        if not sub_account_id:
+            return
+        session = session or db.session
+        pending = session.info.setdefault(PENDING_KEY, set())
+        pending.update((sub_account_id, _as_date(day)) for day in days if day)
+
+    def _before_flush(self, session, flush_context, instances):
+        today = datetime.utcnow().date()
+        with session.no_autoflush:
+            for obj in list(session.new) + list(session.deleted):
+                self._mark_object(session, obj, today, created=True)
+            for obj in session.dirty:
+                if isinstance(obj, Opportunity) and session.is_modified(obj, include_collections=False):
+                    self._mark_object(session, obj, today, created=False)
+
+    def _mark_object(self, session, obj, today, created):
+        if isinstance(obj, Contact):
+            self.mark(obj.sub_account_id, obj.created_at or today, session=session)
+        elif isinstance(obj, ContactActivity):
+            contact = session.get(Contact, obj.contact_id) if obj.contact_id else None
+            if contact is not None:
+                self.mark(contact.sub_account_id, obj.created_at or today, session=session)
+        elif isinstance(obj, Opportunity):
+            pipeline = session.get(Pipeline, obj.pipeline_id) if obj.pipeline_id else None
+            if pipeline is None:
+                return
+            days = [obj.closed_at or (today if obj.status in CLOSED_STATUSES else None)]
+            if created:
+                days.append(obj.created_at or today)
+            else:
+                # A reopened or re-dated deal also changes the day it used to be closed on
+                days.extend(sa_inspect(obj).attrs.closed_at.history.deleted or ())
+            self.mark(pipeline.sub_account_id, *days, session=session)
+
+    def _before_commit(self, session):
+        session.flush()
+        pending = session.info.pop(PENDING_KEY, None)
+        if not pending:
+            return
+        if self.mode == 'deferred':
+            self._queue(session, pending)
+        else:
+            self.refresh(pending, session=session)
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+    def _queue(self, session, pairs):
+        """Queue pairs for catch_up(); an already queued pair gets the new marked_at
+
+        catch_up() only dequeues rows marked no later than when it read them,
+        so a write committed while its day is being recomputed stays queued.
+        """
+        now = datetime.utcnow()
+        rows = [{'sub_account_id': sub_account_id, 'day': day, 'marked_at': now}
+                for sub_account_id, day in sorted(pairs)]
+        dialect = session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = dialect_insert(RollupDirtyDay).values(rows)
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['sub_account_id', 'day'],
+                set_={'marked_at': statement.excluded.marked_at}
+            ))
+            return
+        for row in rows:
+            result = session.execute(
+                update(RollupDirtyDay)
+                .where(RollupDirtyDay.sub_account_id == row['sub_account_id'], RollupDirtyDay.day == row['day'])
+                .values(marked_at=now)
+            )
+            if result.rowcount == 0:
+                session.execute(insert(RollupDirtyDay).values(row))
+
+    def refresh(self, pairs, session=None):
+        """Recompute the rollup rows of the given (sub_account_id, day) pairs; the caller commits"""
+        session = session or db.session
+        by_account = {}
+        for sub_account_id, day in pairs:
+            by_account.setdefault(sub_account_id, []).append(day)
+        for sub_account_id, days in by_account.items():
+            for start, end in _day_runs(days):
+                self._recompute(session, start, end, sub_account_id)
+
+    def rebuild(self, start=None, end=None):
+        """Recompute every sub-account's rollups for [start, end) days, all history by default"""
+        if start is None:
+            first = db.session.scalar(select(func.min(Contact.created_at)))
+            start = first.date() if first else datetime.utcnow().date()
+        end = end or datetime.utcnow().date() + timedelta(days=1)
+        self.ensure_indexes()
+
+        day = start
+        while day < end:
+            # Month-sized slices keep each transaction and its grouped scans bounded
+            slice_end = min(day + timedelta(days=31), end)
+            self._recompute(db.session, day, slice_end)
+            db.session.commit()
+            day = slice_end
+        db.session.execute(delete(RollupDirtyDay).where(RollupDirtyDay.day >= start, RollupDirtyDay.day < end))
+        db.session.commit()
+        logger.info(f"Rebuilt daily rollups for {start} - {end}")
+        return {'start': start.isoformat(), 'end': end.isoformat()}
+
+    def ensure_indexes(self):
+        """Create RANGE_INDEXES on tables that predate them"""
+        for index in ContactActivity.__table__.indexes:
+            if index.name in self.RANGE_INDEXES:
+                index.create(db.engine, checkfirst=True)
+
+    def catch_up(self, batch_size=500):
+        """Process the days queued in deferred mode"""
+        processed = 0
+        while True:
+            queued = db.session.execute(
+                select(RollupDirtyDay.sub_account_id, RollupDirtyDay.day, RollupDirtyDay.marked_at)
+                .order_by(RollupDirtyDay.marked_at)
+                .limit(batch_size)
+            ).tuples().all()
+            if not queued:
+                break
+            self.refresh([(sub_account_id, day) for sub_account_id, day, _ in queued])
+            for sub_account_id, day, marked_at in queued:
+                # A row marked again since it was read waits for the next batch
+                db.session.execute(delete(RollupDirtyDay).where(
+                    RollupDirtyDay.sub_account_id == sub_account_id, RollupDirtyDay.day == day,
+                    RollupDirtyDay.marked_at <= marked_at
+                ))
+            db.session.commit()
+            processed += len(queued)
+        return processed
+
+    def _recompute(self, session, start, end, sub_account_id=None):
+        """Replace the rollup rows of [start, end) with fresh grouped aggregates
+
+        With `sub_account_id` only that tenant is recomputed; otherwise all of them.
+        """
+        start_at, end_at = _bounds(start, end)
+        rows = {}
+
+        def row(account, day):
+            key = (account, _as_date(day))
+            if key not in rows:
+                rows[key] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+            return rows[key]
+
+        contact_day = func.date(Contact.created_at)
+        query = select(Contact.sub_account_id, contact_day, func.count())\
+            .where(Contact.created_at >= start_at, Contact.created_at < end_at)\
+            .group_by(Contact.sub_account_id, contact_day)
+        if sub_account_id:
+            query = query.where(Contact.sub_account_id == sub_account_id)
+        for account, day, count in session.execute(query):
+            row(account, day)['new_contacts'] = count
+
+        opened_day = func.date(Opportunity.created_at)
+        query = select(Pipeline.sub_account_id, opened_day, func.count())\
+            .join(Pipeline, Pipeline.id == Opportunity.pipeline_id)\
+            .where(Opportunity.created_at >= start_at, Opportunity.created_at < end_at)\
+            .group_by(Pipeline.sub_account_id, opened_day)
+        if sub_account_id:
+            query = query.where(Pipeline.sub_account_id == sub_account_id)
+        for account, day, count in session.execute(query):
+            row(account, day)['opportunities_opened'] = count
+
+        closed_day = func.date(Opportunity.closed_at)
+        query = select(Pipeline.sub_account_id, closed_day, Opportunity.status, func.count(), func.sum(Opportunity.value))\
+            .join(Pipeline, Pipeline.id == Opportunity.pipeline_id)\
+            .where(Opportunity.closed_at >= start_at, Opportunity.closed_at < end_at,
+                   Opportunity.status.in_(CLOSED_STATUSES))\
+            .group_by(Pipeline.sub_account_id, closed_day, Opportunity.status)
+        if sub_account_id:
+            query = query.where(Pipeline.sub_account_id == sub_account_id)
+        for account, day, status, count, revenue in session.execute(query):
+            counters = row(account, day)
+            counters[f'opportunities_{status}'] = count
+            if status == 'won':
+                counters['won_revenue'] = revenue or 0
+
+        activity_day = func.date(ContactActivity.created_at)
+        query = select(Contact.sub_account_id, activity_day, ContactActivity.type, func.count())\
+            .join(Contact, Contact.id == ContactActivity.contact_id)\
+            .where(ContactActivity.created_at >= start_at, ContactActivity.created_at < end_at)\
+            .group_by(Contact.sub_account_id, activity_day, ContactActivity.type)
+        if sub_account_id:
+            query = query.where(Contact.sub_account_id == sub_account_id)
+        activity_rows = [
+            {'sub_account_id': account, 'day': _as_date(day), 'type': activity_type, 'count': count}
+            for account, day, activity_type, count in session.execute(query)
+        ]
+
+        for model in (DailyRollup, DailyActivityRollup):
+            statement = delete(model).where(model.day >= start, model.day < end)
+            if sub_account_id:
+                statement = statement.where(model.sub_account_id == sub_account_id)
+            session.execute(statement)
+
+        now = datetime.utcnow()
+        if rows:
+            session.execute(insert(DailyRollup), [
+                {'sub_account_id': account, 'day': day, 'updated_at': now, **counters}
+                for (account, day), counters in rows.items()
+            ])
+        if activity_rows:
+            session.execute(insert(DailyActivityRollup), activity_rows)
+
+    def totals(self, sub_account_id=None, start=None, end=None):
+        """Summed counters over [start, end) days (unbounded when omitted); O(days) rows
+
+        Days before the rollups were first built read 0 until rollup_rebuild has run.
+        """
+        query = select(*[func.coalesce(func.sum(getattr(DailyRollup, name)), 0) for name in ROLLUP_COUNTERS])
+        query = self._scope(query, DailyRollup, sub_account_id, start, end)
+        values = db.session.execute(query).one()
+        return dict(zip(ROLLUP_COUNTERS, values))
+
+    def series(self, counter, sub_account_id=None, start=None, end=None):
+        """[(day, value)] of one counter, ordered by day"""
+        column = getattr(DailyRollup, counter)
+        query = select(DailyRollup.day, func.sum(column)).group_by(DailyRollup.day).order_by(DailyRollup.day)
+        query = self._scope(query, DailyRollup, sub_account_id, start, end)
+        return [(_as_date(day), value) for day, value in db.session.execute(query)]
+
+    def activity_totals(self, sub_account_id=None, start=None, end=None):
+        query = select(DailyActivityRollup.type, func.sum(DailyActivityRollup.count))\
+            .group_by(DailyActivityRollup.type)
+        query = self._scope(query, DailyActivityRollup, sub_account_id, start, end)
+        return dict(db.session.execute(query).tuples().all())
+
+    def _scope(self, query, model, sub_account_id, start, end):
+        if sub_account_id:
+            query = query.where(model.sub_account_id == sub_account_id)
+        if start:
+            query = query.where(model.day >= start)
+        if end:
+            query = query.where(model.day < end)
+        return query
+
+# Global instance
+metric_rollups = MetricRollupService()
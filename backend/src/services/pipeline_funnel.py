@@ -0,0 +1,380 @@
+import json
+import math
+import hashlib
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select, update, insert, delete, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+from src.models.pipeline import Pipeline, Opportunity, OpportunityActivity
+from src.models.funnel import PipelineFunnelState, OpportunityFunnel, FunnelCount, StageDuration
+
+logger = logging.getLogger(__name__)
+
+# Quarter-octave buckets of log2(seconds + 1): medians are read to within ~10%
+BUCKETS_PER_OCTAVE = 4
+
+
+def pipeline_stages(pipeline):
+    """Stage names of a pipeline in their configured order"""
+    stages = json.loads(pipeline.stages) if pipeline.stages else []
+    names = []
+    for position, stage in enumerate(stages):
+        if isinstance(stage, dict):
+            names.append((stage.get('order', position), stage.get('name')))
+        else:
+            names.append((position, stage))
+    return [name for _, name in sorted(names, key=lambda item: item[0]) if name]
+
+
+def _stages_hash(stages):
+    return hashlib.sha1(json.dumps(stages).encode('utf-8')).hexdigest()
+
+
+def _week_of(value):
+    day = value.date()
+    return day - timedelta(days=day.weekday())
+
+
+def _bucket(seconds):
+    return int(math.log2(max(seconds, 0) + 1) * BUCKETS_PER_OCTAVE)
+
+
+def _bucket_seconds(bucket):
+    """Geometric middle of a histogram bucket, in seconds"""
+    return 2 ** ((bucket + 0.5) / BUCKETS_PER_OCTAVE) - 1
+
+
+class PipelineFunnelService:
+    """Stage funnel, time in stage and weekly cohorts from stage_change activities
+
+    refresh() consumes only the stage_change rows added since the previous
+    refresh of a pipeline (tracked by activity id). Each batch is read with
+    LAG() over the opportunity's changes to get the time spent in the stage
+    it left; the result is folded into three small tables:
+
+    - opportunity_funnel: each opportunity's furthest stage, current stage and
+      when it entered it (which carries LAG across batches);
+    - funnel_counts: opportunities per (cohort week, furthest stage), adjusted
+      by +1/-1 as opportunities advance;
+    - stage_durations: a log-scale histogram of completed stays per stage.
+
+    Reading a funnel therefore aggregates a few hundred rows, however many
+    stage changes the pipeline has. Reordering a pipeline's stages changes
+    what "furthest" means, so the pipeline is rebuilt from scratch.
+
+    Refreshes of the same pipeline may overlap (the refresh_funnels task
+    and a manual run). Each transaction first claims its batch by moving the
+    pipeline_funnel_state position with a conditional UPDATE; when another
+    refresh already moved it, nothing is applied and the refresh stops, so
+    no stage change is counted twice.
+    """
+
+    BATCH_SIZE = 10000
+
+    def refresh(self, pipeline):
+        """Fold the pipeline's new stage changes into its funnel; returns the changes processed"""
+        stages = pipeline_stages(pipeline)
+        stages_hash = _stages_hash(stages)
+        state = db.session.get(PipelineFunnelState, pipeline.id)
+        if state is None or state.stages_hash != stages_hash:
+            if not self._reset(pipeline.id, stages_hash):
+                db.session.rollback()
+                return 0
+            db.session.commit()
+            state = db.session.get(PipelineFunnelState, pipeline.id)
+        last_activity_id, last_opportunity_id = state.last_activity_id or 0, state.last_opportunity_id or 0
+
+        index = {name: position for position, name in enumerate(stages)}
+        processed = 0
+        while True:
+            batch = self._next_batch(pipeline.id, last_activity_id)
+            if not batch:
+                break
+            until_id = max(row.id for row in batch)
+            if not self._claim(pipeline.id, 'last_activity_id', last_activity_id, until_id):
+                db.session.rollback()
+                logger.info(f"Funnel of pipeline {pipeline.id} is being refreshed elsewhere")
+                return processed
+            self._apply_batch(pipeline.id, batch, index)
+            db.session.commit()
+            last_activity_id = until_id
+            processed += len(batch)
+
+        self._add_quiet_opportunities(pipeline.id, last_opportunity_id, index)
+        db.session.commit()
+        return processed
+
+    def _reset(self, pipeline_id, stages_hash):
+        """Start the pipeline's funnel over for a new stage order; False when another refresh already did"""
+        state = PipelineFunnelState
+        now = datetime.utcnow()
+        if db.session.get(state, pipeline_id) is None:
+            # A concurrent first refresh of the pipeline fails here on the primary key
+            db.session.add(state(pipeline_id=pipeline_id, stages_hash=stages_hash,
+                                 last_activity_id=0, last_opportunity_id=0, refreshed_at=now))
+            db.session.flush()
+        else:
+            # The UPDATE comes first: it takes the state row's lock before any counter row is touched
+            result = db.session.execute(
+                update(state)
+                .where(state.pipeline_id == pipeline_id,
+                       or_(state.stages_hash.is_(None), state.stages_hash != stages_hash))
+                .values(stages_hash=stages_hash, last_activity_id=0, last_opportunity_id=0, refreshed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                return False
+        for model in (OpportunityFunnel, FunnelCount, StageDuration):
+            db.session.execute(delete(model).where(model.pipeline_id == pipeline_id))
+        return True
+
+    def _claim(self, pipeline_id, position, expected, value):
+        """Move a state position from `expected` to `value`; False when another refresh already moved it"""
+        state = PipelineFunnelState
+        result = db.session.execute(
+            update(state)
+            .where(state.pipeline_id == pipeline_id, getattr(state, position) == expected)
+            .values({position: value, 'refreshed_at': datetime.utcnow()})
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def _next_batch(self, pipeline_id, after_id):
+        activity = OpportunityActivity
+        scope = (Opportunity.pipeline_id == pipeline_id, activity.type == 'stage_change', activity.id > after_id)
+        until_id = db.session.scalar(
+            select(activity.id).join(Opportunity, Opportunity.id == activity.opportunity_id)
+            .where(*scope).order_by(activity.id).offset(self.BATCH_SIZE - 1).limit(1)
+        )
+        if until_id is not None:
+            scope += (activity.id <= until_id,)
+
+        window = {'partition_by': activity.opportunity_id, 'order_by': (activity.created_at, activity.id)}
+        return db.session.execute(
+            select(
+                activity.id, activity.opportunity_id, activity.old_value, activity.new_value, activity.created_at,
+                func.lag(activity.created_at, type_=activity.created_at.type).over(**window).label('previous_at'),
+                Opportunity.created_at.label('opportunity_created_at')
+            )
+            .join(Opportunity, Opportunity.id == activity.opportunity_id)
+            .where(*scope)
+            .order_by(activity.opportunity_id, activity.created_at, activity.id)
+        ).all()
+
+    def _apply_batch(self, pipeline_id, batch, index):
+        opportunity_ids = {row.opportunity_id for row in batch}
+        known = {
+            row.opportunity_id: row
+            for row in db.session.execute(
+                select(OpportunityFunnel).where(OpportunityFunnel.opportunity_id.in_(opportunity_ids))
+            ).scalars()
+        }
+
+        states, counts, durations = {}, {}, {}
+        for row in batch:
+            state = states.get(row.opportunity_id)
+            if state is None:
+                existing = known.get(row.opportunity_id)
+                if existing is not None:
+                    state = {
+                        'opportunity_id': row.opportunity_id,
+                        'cohort_week': existing.cohort_week,
+                        'reached_index': existing.reached_index,
+                        'current_stage': existing.current_stage,
+                        'entered_current_at': existing.entered_current_at,
+                        'was': existing.reached_index
+                    }
+                else:
+                    # First change ever seen: the opportunity started in the stage it just left
+                    state = {
+                        'opportunity_id': row.opportunity_id,
+                        'cohort_week': _week_of(row.opportunity_created_at or row.created_at),
+                        'reached_index': index.get(row.old_value, -1),
+                        'current_stage': row.old_value,
+                        'entered_current_at': row.opportunity_created_at,
+                        'was': None
+                    }
+                states[row.opportunity_id] = state
+
+            entered_at = row.previous_at or state['entered_current_at']
+            if row.old_value and entered_at and row.created_at >= entered_at:
+                key = (row.old_value, _bucket((row.created_at - entered_at).total_seconds()))
+                durations[key] = durations.get(key, 0) + 1
+
+            state['current_stage'] = row.new_value
+            state['entered_current_at'] = row.created_at
+            state['reached_index'] = max(state['reached_index'], index.get(row.new_value, -1))
+
+        inserts, updates = [], []
+        for state in states.values():
+            was = state.pop('was')
+            if was != state['reached_index']:
+                if was is not None:
+                    key = (state['cohort_week'], was)
+                    counts[key] = counts.get(key, 0) - 1
+                key = (state['cohort_week'], state['reached_index'])
+                counts[key] = counts.get(key, 0) + 1
+            (updates if was is not None else inserts).append(
+                dict(state, pipeline_id=pipeline_id)
+            )
+
+        if updates:
+            db.session.execute(update(OpportunityFunnel), updates)
+        if inserts:
+            db.session.execute(insert(OpportunityFunnel), inserts)
+        self._add(FunnelCount, ('pipeline_id', 'cohort_week', 'reached_index'), [
+            {'pipeline_id': pipeline_id, 'cohort_week': week, 'reached_index': reached, 'count': delta}
+            for (week, reached), delta in counts.items() if delta
+        ])
+        self._add(StageDuration, ('pipeline_id', 'stage', 'bucket'), [
+            {'pipeline_id': pipeline_id, 'stage': stage, 'bucket': bucket, 'count': count}
+            for (stage, bucket), count in durations.items()
+        ])
+
+    def _add_quiet_opportunities(self, pipeline_id, after_id, index):
+        """Count opportunities that have had no stage change yet, at their current stage"""
+        latest = db.session.scalar(select(func.max(Opportunity.id)).where(Opportunity.pipeline_id == pipeline_id))
+        if not latest or latest <= after_id or not self._claim(pipeline_id, 'last_opportunity_id', after_id, latest):
+            return
+        rows = db.session.execute(
+            select(Opportunity.id, Opportunity.stage, Opportunity.created_at)
+            .outerjoin(OpportunityFunnel, OpportunityFunnel.opportunity_id == Opportunity.id)
+            .where(Opportunity.pipeline_id == pipeline_id, Opportunity.id > after_id, Opportunity.id <= latest,
+                   OpportunityFunnel.opportunity_id.is_(None))
+            .order_by(Opportunity.id)
+        ).all()
+        if not rows:
+            return
+        funnel_rows, counts = [], {}
+        for row in rows:
+            week = _week_of(row.created_at or datetime.utcnow())
+            reached = index.get(row.stage, -1)
+            funnel_rows.append({
+                'opportunity_id': row.id, 'pipeline_id': pipeline_id, 'cohort_week': week,
+                'reached_index': reached, 'current_stage': row.stage, 'entered_current_at': row.created_at
+            })
+            counts[(week, reached)] = counts.get((week, reached), 0) + 1
+        db.session.execute(insert(OpportunityFunnel), funnel_rows)
+        self._add(FunnelCount, ('pipeline_id', 'cohort_week', 'reached_index'), [
+            {'pipeline_id': pipeline_id, 'cohort_week': week, 'reached_index': reached, 'count': count}
+            for (week, reached), count in counts.items()
+        ])
+
+    def _add(self, model, keys, rows):
+        """Add rows' counts onto existing counter rows (upsert)"""
+        if not rows:
+            return
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = dialect_insert(model).values(rows)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={'count': model.count + statement.excluded.count}
+            ))
+            return
+
+        for row in rows:
+            key = [getattr(model, name) == row[name] for name in keys]
+            result = db.session.execute(update(model).where(*key).values(count=model.count + row['count']))
+            if result.rowcount == 0:
+                db.session.execute(insert(model).values(row))
+
+    def funnel(self, pipeline, cohort_weeks=12, refresh=False):
+        """Stage conversion, median time in stage and weekly cohorts of one pipeline
+
+        Reads what the refresh_funnels task has folded in so far (as of
+        `refreshed_at`); a pipeline it has not built for the current stage
+        order reads empty.
+        """
+        if refresh:
+            self.refresh(pipeline)
+        stages = pipeline_stages(pipeline)
+        size = len(stages)
+        state = db.session.get(PipelineFunnelState, pipeline.id)
+        built = state is not None and state.stages_hash == _stages_hash(stages)
+
+        counts = db.session.execute(
+            select(FunnelCount.cohort_week, FunnelCount.reached_index, FunnelCount.count)
+            .where(FunnelCount.pipeline_id == pipeline.id, FunnelCount.reached_index >= 0, FunnelCount.count > 0)
+        ).all() if built else []
+        weeks = sorted({row.cohort_week for row in counts})
+        week_position = {week: position for position, week in enumerate(weeks)}
+        # furthest[w, k]: opportunities of cohort w whose furthest stage is k
+        furthest = np.zeros((len(weeks), size))
+        for row in counts:
+            if row.reached_index < size:
+                furthest[week_position[row.cohort_week], row.reached_index] += row.count
+        # reached[w, k]: ... that got at least as far as stage k
+        reached = np.flip(np.cumsum(np.flip(furthest, axis=1), axis=1), axis=1)
+        totals = reached.sum(axis=0) if len(weeks) else np.zeros(size)
+
+        following = np.append(totals[1:], totals[-1:]) if size else totals
+        conversion = np.zeros(size)
+        np.divide(following, totals, out=conversion, where=totals != 0)
+
+        medians = self._median_seconds(pipeline.id, stages) if built else {}
+        pipeline_stages_data = []
+        for position, stage in enumerate(stages):
+            pipeline_stages_data.append({
+                'stage': stage,
+                'count': int(totals[position]),
+                'converted': int(following[position]),
+                'conversion_rate': round(float(conversion[position]) * 100, 1),
+                'median_hours_in_stage': round(medians[stage] / 3600, 1) if stage in medians else None
+            })
+
+        cohorts = []
+        for position in range(max(len(weeks) - cohort_weeks, 0), len(weeks)):
+            entered = reached[position, 0] if size else 0
+            cohorts.append({
+                'week': weeks[position].isoformat(),
+                'entered': int(entered),
+                'reached': [int(value) for value in reached[position]],
+                'conversion_rate': round(float(reached[position, -1] / entered * 100), 1) if entered else 0
+            })
+
+        return {
+            'pipeline_id': pipeline.id,
+            'pipeline_stages': pipeline_stages_data,
+            'overall_conversion': round(float(totals[-1] / totals[0] * 100), 1) if size and totals[0] else 0,
+            'cohorts': cohorts,
+            'refreshed_at': state.refreshed_at.isoformat() if built and state.refreshed_at else None
+        }
+
+    def _median_seconds(self, pipeline_id, stages):
+        rows = db.session.execute(
+            select(StageDuration.stage, StageDuration.bucket, StageDuration.count)
+            .where(StageDuration.pipeline_id == pipeline_id, StageDuration.stage.in_(stages))
+            .order_by(StageDuration.stage, StageDuration.bucket)
+        ).all()
+        histograms = {}
+        for row in rows:
+            histograms.setdefault(row.stage, ([], []))
+            histograms[row.stage][0].append(row.bucket)
+            histograms[row.stage][1].append(row.count)
+
+        medians = {}
+        for stage, (buckets, stage_counts) in histograms.items():
+            cumulative = np.cumsum(stage_counts)
+            if cumulative[-1] <= 0:
+                continue
+            middle = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+            medians[stage] = _bucket_seconds(buckets[middle])
+        return medians
+
+    def refresh_all(self):
+        """Bring every pipeline's funnel up to date; returns the stage changes processed"""
+        processed = 0
+        for pipeline in Pipeline.query.order_by(Pipeline.id).all():
+            try:
+                processed += self.refresh(pipeline)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Refreshing funnel of pipeline {pipeline.id} failed: {str(e)}")
+        return processed
+
+# Global instance
+pipeline_funnel = PipelineFunnelService()
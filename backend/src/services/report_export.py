@@ -0,0 +1,346 @@
+import os
+import csv
+import json
+import logging
+import secrets
+import tempfile
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy import select, func
+from src.models.user import db
+from src.models.contact import Contact
+from src.models.pipeline import Pipeline, Opportunity
+from src.services.job_runner import job_runner
+from src.services.analytics_engine import (
+    analytics_engine, BucketGrid, resolve_timezone, timeframe_window, GRANULARITIES, TIMEFRAME_DAYS, plain
+)
+
+try:
+    import xlsxwriter
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+REPORT_TYPES = ('overview', 'channels', 'contacts', 'opportunities')
+OVERVIEW_METRICS = ('visitors', 'leads', 'conversions', 'orders', 'revenue', 'conversion_rate', 'avg_deal_size')
+
+
+def _cell(value):
+    """Normalize a value for any of the writers"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class _CsvWriter:
+    def __init__(self, path, columns, title):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _XlsxWriter:
+    """constant_memory mode flushes each row as the next one starts, so memory stays flat"""
+
+    MAX_ROWS = 1048576
+
+    def __init__(self, path, columns, title):
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+        self.columns = columns
+        self.title = title[:25]
+        self.sheets = 0
+        self._add_sheet()
+
+    def _add_sheet(self):
+        self.sheets += 1
+        name = self.title if self.sheets == 1 else f'{self.title} {self.sheets}'
+        self.sheet = self.workbook.add_worksheet(name)
+        self.sheet.write_row(0, 0, self.columns)
+        self.row = 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self.row >= self.MAX_ROWS:
+                self._add_sheet()
+            self.sheet.write_row(self.row, 0, row)
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class _PdfWriter:
+    """Minimal PDF of monospaced table text, one page written out as soon as it fills
+
+    Only the byte offsets of the objects are kept for the cross-reference
+    table, so a large report costs no more memory than a single page.
+    """
+
+    PAGE_WIDTH = 842  # A4 landscape, in points
+    PAGE_HEIGHT = 595
+    MARGIN = 36
+    FONT_SIZE = 7
+    LEADING = 9
+    MAX_COLUMN_WIDTH = 28
+
+    def __init__(self, path, columns, title):
+        self.file = open(path, 'wb')
+        self.position = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4  # 1: catalog, 2: page tree, 3: font
+        self.lines_per_page = int((self.PAGE_HEIGHT - 2 * self.MARGIN) / self.LEADING)
+        self.max_chars = int((self.PAGE_WIDTH - 2 * self.MARGIN) / (self.FONT_SIZE * 0.6))
+        self.widths = [min(max(len(str(column)), 10), self.MAX_COLUMN_WIDTH) for column in columns]
+        self.header = [title, '', self._format(columns), self._format(['-' * width for width in self.widths])]
+        self.lines = list(self.header)
+
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+
+    def _format(self, values):
+        cells = []
+        for value, width in zip(values, self.widths):
+            text = str(value).replace('\n', ' ')
+            cells.append(text[:width].ljust(width))
+        return ' '.join(cells)[:self.max_chars]
+
+    def _write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.position
+        self._write(f'{object_id} 0 obj\n'.encode('ascii') + body + b'\nendobj\n')
+
+    def _escape(self, line):
+        line = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        return line.encode('cp1252', errors='replace')
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.lines.append(self._format(row))
+            if len(self.lines) >= self.lines_per_page:
+                self._flush_page()
+
+    def _flush_page(self):
+        top = self.PAGE_HEIGHT - self.MARGIN - self.FONT_SIZE
+        content = [f'BT /F1 {self.FONT_SIZE} Tf {self.LEADING} TL {self.MARGIN} {top} Td'.encode('ascii')]
+        for line in self.lines:
+            content.append(b'(' + self._escape(line) + b') Tj T*')
+        content.append(b'ET')
+        stream = b'\n'.join(content)
+
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f'<< /Length {len(stream)} >>\nstream\n'.encode('ascii') + stream + b'\nendstream')
+        self._object(page_id, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('ascii'))
+        self.page_ids.append(page_id)
+        self.lines = list(self.header[2:])  # repeat the column header on every page
+
+    def close(self):
+        if len(self.lines) > 2 or not self.page_ids:
+            self._flush_page()
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>'.encode('ascii'))
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self.position
+        count = self.next_id
+        entries = [b'0000000000 65535 f \n'] + [
+            f'{self.offsets[object_id]:010d} 00000 n \n'.encode('ascii') for object_id in range(1, count)
+        ]
+        self._write(f'xref\n0 {count}\n'.encode('ascii') + b''.join(entries))
+        self._write(f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii'))
+        self.file.close()
+
+
+WRITERS = {'csv': _CsvWriter, 'xlsx': _XlsxWriter, 'pdf': _PdfWriter}
+
+
+class ReportExportService:
+    """Background report exports written to EXPORT_STORAGE_DIR
+
+    A report is a column list plus a generator of row chunks; each chunk is
+    written straight to the output file and counted on the job row, so the
+    exporter's memory does not grow with the report. Files are written under
+    a .part name and renamed once complete: a path recorded on a completed job
+    always points at a whole file.
+    """
+
+    CHUNK_SIZE = 2000
+
+    def __init__(self):
+        self.storage_dir = os.environ.get(
+            'EXPORT_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'brainstorm_exports')
+        )
+        self.retention = timedelta(hours=int(os.environ.get('EXPORT_RETENTION_HOURS', 24)))
+
+    def validate(self, data):
+        """Normalize POST /analytics/export input; raises ValueError"""
+        export_format = (data.get('format') or 'csv').lower()
+        if export_format == 'excel':
+            export_format = 'xlsx'
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if export_format == 'xlsx' and not XLSX_AVAILABLE:
+            raise ValueError('xlsx export requires the xlsxwriter package')
+
+        report_type = data.get('report_type') or 'overview'
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"report_type must be one of {', '.join(REPORT_TYPES)}")
+
+        date_range = data.get('date_range') or '30d'
+        if date_range not in TIMEFRAME_DAYS:
+            raise ValueError(f"date_range must be one of {', '.join(TIMEFRAME_DAYS)}")
+
+        granularity = data.get('granularity') or 'day'
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+        tz_name = data.get('tz') or 'UTC'
+        resolve_timezone(tz_name)
+        return {
+            'format': export_format,
+            'report_type': report_type,
+            'date_range': date_range,
+            'tz': tz_name,
+            'granularity': granularity
+        }
+
+    def path_for(self, job):
+        """Absolute path of a completed export's file, or None"""
+        result = json.loads(job.result) if job.result else {}
+        name = result.get('file')
+        if not name or os.path.basename(name) != name:
+            return None
+        return os.path.join(self.storage_dir, name)
+
+    def run(self, job_id, sub_account_id, params):
+        """Job target: write the report to a file and return its metadata"""
+        columns, total, chunks = self._report(sub_account_id, params)
+        job_runner.mark(job_id, total=total)
+
+        os.makedirs(self.storage_dir, exist_ok=True)
+        name = f"{job_id}_{secrets.token_hex(8)}.{params['format']}"
+        path = os.path.join(self.storage_dir, name)
+        partial = path + '.part'
+
+        rows = 0
+        try:
+            writer = WRITERS[params['format']](partial, columns, params['report_type'].title())
+            try:
+                for chunk in chunks:
+                    writer.write_rows([[_cell(value) for value in row] for row in chunk])
+                    rows += len(chunk)
+                    job_runner.mark(job_id, increment={'processed': len(chunk), 'succeeded': len(chunk)})
+            finally:
+                writer.close()
+            os.replace(partial, path)
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        result = {
+            'file': name,
+            'filename': f"{params['report_type']}_{params['date_range']}_{stamp}.{params['format']}",
+            'content_type': EXPORT_FORMATS[params['format']],
+            'size': os.path.getsize(path),
+            'rows': rows
+        }
+        logger.info(f"Export job {job_id} wrote {rows} rows to {path}")
+        return result
+
+    def _report(self, sub_account_id, params):
+        """(columns, total rows or None, iterator of row chunks) of a report"""
+        tz = resolve_timezone(params['tz'])
+        start, end = timeframe_window(params['date_range'], tz)
+        report_type = params['report_type']
+
+        if report_type == 'overview':
+            grid = BucketGrid.covering(start, end, params['granularity'], tz)
+            records = analytics_engine.series(sub_account_id, grid, OVERVIEW_METRICS).records(OVERVIEW_METRICS)
+            rows = [[record['date']] + [record[name] for name in OVERVIEW_METRICS] for record in records]
+            return ['date', *OVERVIEW_METRICS], len(rows), iter([rows])
+
+        if report_type == 'channels':
+            names, totals = analytics_engine.breakdown(sub_account_id, start, end)
+            fields = ('leads', 'conversions', 'orders', 'revenue', 'conversion_rate', 'avg_deal_size', 'revenue_growth')
+            rows = [
+                [names[index] or 'Unknown'] + [plain(totals[field][index]) for field in fields]
+                for index in range(len(names))
+            ]
+            return ['channel', *fields], len(rows), iter([rows])
+
+        # List reports cover the records created in the date range
+        start_at = start.astimezone(timezone.utc).replace(tzinfo=None)
+        end_at = end.astimezone(timezone.utc).replace(tzinfo=None)
+        if report_type == 'contacts':
+            columns = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone,
+                       Contact.company, Contact.status, Contact.source, Contact.owner_id, Contact.created_at)
+            statement = select(*columns).where(Contact.sub_account_id == sub_account_id,
+                                               Contact.created_at >= start_at, Contact.created_at < end_at)
+            return [column.key for column in columns], self._count(statement), self._keyset(statement, Contact.id)
+
+        columns = (Opportunity.id, Pipeline.name.label('pipeline'), Opportunity.title, Opportunity.stage,
+                   Opportunity.status, Opportunity.value, Opportunity.contact_id,
+                   Opportunity.created_at, Opportunity.closed_at)
+        statement = select(*columns)\
+            .join(Pipeline, Pipeline.id == Opportunity.pipeline_id)\
+            .where(Pipeline.sub_account_id == sub_account_id,
+                   Opportunity.created_at >= start_at, Opportunity.created_at < end_at)
+        return [column.key for column in columns], self._count(statement), self._keyset(statement, Opportunity.id)
+
+    def _count(self, statement):
+        return db.session.scalar(select(func.count()).select_from(statement.subquery()))
+
+    def _keyset(self, statement, id_column):
+        """Row chunks in id order; each chunk is its own query, so progress commits in between are safe"""
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                statement.where(id_column > last_id).order_by(id_column).limit(self.CHUNK_SIZE)
+            ).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def purge(self):
+        """Delete export files older than EXPORT_RETENTION_HOURS; returns how many"""
+        if not os.path.isdir(self.storage_dir):
+            return 0
+        cutoff = (datetime.utcnow() - self.retention).timestamp()
+        removed = 0
+        for entry in os.scandir(self.storage_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+# Global instance
+report_exports = ReportExportService()
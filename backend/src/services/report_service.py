@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func
+from src.models.user import db
+from src.models.report import SavedReport, ReportResult
+from src.models.contact import Contact
+from src.models.analytics import analytics_events, orders, HourlyEventRollup
+from src.services.analytics_engine import (
+    analytics_engine, BucketGrid, FILTERS, GRANULARITIES, PAID_ORDER_STATUSES, TIMEFRAME_DAYS,
+    event_tenant, metric_families, resolve_timezone, timeframe_window, _as_utc_naive
+)
+from src.services.resource_versions import resource_versions, tenant_scope
+
+logger = logging.getLogger(__name__)
+
+SCHEDULES = ('hourly', 'daily', 'weekly')
+PLAN_VERSION = 1  # bump when the plan layout or its evaluation changes
+RESULTS_PER_REPORT = 5
+
+# What a change to each loader's tables is visible through
+FAMILY_VERSIONS = {
+    'contacts': ('contacts',),
+    'deals': ('opportunities', 'contacts'),
+    'orders': ('contacts',),
+    'events': (),
+}
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ReportService:
+    """Saved custom reports: validated config, compiled plan and cached results
+
+    A report's config is compiled once, when it is saved, into a plan: the
+    metric list, the loaders (one grouped query each) and the normalized
+    filter values that become bound parameters of those queries. Only the
+    tenant, the time window and the filter values vary between runs, so the
+    statements keep their shape and SQLAlchemy reuses their compiled SQL.
+
+    Results are stored in report_results under a key made of the plan, the
+    window's first and last bucket and a data version: the ETag versions of
+    the tables the plan reads plus fingerprints of the tenant's analytics
+    events and paid orders in the window. Opening a report whose data
+    has not changed is one small lookup; scheduled reports are recomputed by
+    the precompute_reports task off-peak, so the first open of the day is a
+    cache hit as well.
+    """
+
+    def __init__(self):
+        self.off_peak_hour = int(os.environ.get('REPORT_PRECOMPUTE_HOUR', 3))
+
+    def validate(self, data, current=None):
+        """Normalized config from request data, defaulting to `current` (a to_dict()['config'])"""
+        current = current or {}
+        config = {
+            'name': data.get('name', current.get('name', 'Custom Report')),
+            'metrics': data.get('metrics', current.get('metrics')),
+            'filters': data.get('filters', current.get('filters')) or {},
+            'date_range': data.get('date_range', current.get('date_range', '30d')),
+            'granularity': data.get('granularity', current.get('granularity', 'day')),
+            'timezone': data.get('timezone', current.get('timezone', 'UTC')),
+            'visualization_type': data.get('visualization_type', current.get('visualization_type', 'chart')),
+            'schedule': data.get('schedule', current.get('schedule'))
+        }
+
+        if not isinstance(config['name'], str) or not config['name'].strip():
+            raise ValueError('name is required')
+        config['name'] = config['name'].strip()[:255]
+        if not isinstance(config['metrics'], list) or not config['metrics']:
+            raise ValueError('metrics must be a non-empty list')
+        families = metric_families(config['metrics'])
+        if config['date_range'] not in TIMEFRAME_DAYS:
+            raise ValueError(f"date_range must be one of {', '.join(TIMEFRAME_DAYS)}")
+        if config['granularity'] not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        resolve_timezone(config['timezone'])
+        if config['schedule'] is not None and config['schedule'] not in SCHEDULES:
+            raise ValueError(f"schedule must be one of {', '.join(SCHEDULES)} or null")
+
+        filters = config['filters']
+        if not isinstance(filters, dict):
+            raise ValueError('filters must be an object')
+        unknown = [key for key in filters if key not in FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown filter(s): {', '.join(unknown)}")
+        if 'pipeline_id' in filters:
+            try:
+                filters['pipeline_id'] = int(filters['pipeline_id'])
+            except (TypeError, ValueError):
+                raise ValueError('pipeline_id must be an integer')
+        for key in ('source', 'contact_status'):
+            if key in filters:
+                filters[key] = str(filters[key])
+        if 'events' in families and 'contact_status' in filters:
+            raise ValueError('contact_status cannot filter event metrics')
+        return config
+
+    def compile(self, config):
+        plan = {
+            'version': PLAN_VERSION,
+            'metrics': list(dict.fromkeys(config['metrics'])),
+            'families': sorted(metric_families(config['metrics'])),
+            'filters': config['filters'],
+            'date_range': config['date_range'],
+            'granularity': config['granularity'],
+            'timezone': config['timezone']
+        }
+        return plan, _digest(plan)
+
+    def apply(self, report, config):
+        """Store a validated config on a report, recompile it and drop its cached results"""
+        report.name = config['name']
+        report.metrics = json.dumps(config['metrics'])
+        report.filters = json.dumps(config['filters'])
+        report.date_range = config['date_range']
+        report.granularity = config['granularity']
+        report.timezone = config['timezone']
+        report.visualization_type = config['visualization_type']
+        report.schedule = config['schedule']
+
+        plan, plan_hash = self.compile(config)
+        report.plan = json.dumps(plan)
+        if report.id is not None and plan_hash != report.plan_hash:
+            db.session.execute(delete(ReportResult).where(ReportResult.report_id == report.id))
+        report.plan_hash = plan_hash
+        report.next_run_at = self.next_run(report.schedule, resolve_timezone(report.timezone)) \
+            if report.schedule else None
+        return report
+
+    def data_version(self, report, plan, start_at):
+        """Digest of everything the report's numbers depend on, from `start_at` (naive UTC) on"""
+        parts = []
+        resources = sorted({resource for family in plan['families'] for resource in FAMILY_VERSIONS[family]})
+        if resources:
+            parts.extend(resource_versions.versions(tenant_scope(report.sub_account_id), resources))
+        # analytics_events and orders are written by the main app, outside the version tracker
+        if 'events' in plan['families']:
+            parts.append(('events', *self._events_version(report.sub_account_id, start_at)))
+        if 'orders' in plan['families']:
+            parts.append(('orders', *self._orders_version(report.sub_account_id, start_at)))
+        return _digest(parts)
+
+    def _events_version(self, sub_account_id, start_at):
+        # Rolled-up hours (re-rolled late events change their sum), then the newest raw event after them
+        rolled_hour, rolled_count = db.session.execute(
+            select(func.max(HourlyEventRollup.hour), func.sum(HourlyEventRollup.count))
+            .where(HourlyEventRollup.sub_account_id == sub_account_id, HourlyEventRollup.hour >= start_at)
+        ).one()
+        rolled_until = analytics_engine.rolled_until()
+        raw = select(func.max(analytics_events.c.id))\
+            .select_from(analytics_events)\
+            .outerjoin(Contact, Contact.id == analytics_events.c.contact_id)\
+            .where(event_tenant() == sub_account_id,
+                   analytics_events.c.created_at >= max(start_at, rolled_until or start_at))
+        return rolled_hour, rolled_count, db.session.scalar(raw)
+
+    def _orders_version(self, sub_account_id, start_at):
+        # orders has no updated_at: a status change shows up in the count and total of paid orders
+        return tuple(db.session.execute(
+            select(func.max(orders.c.id), func.count(), func.sum(orders.c.total_amount))
+            .join(Contact, Contact.id == orders.c.contact_id)
+            .where(Contact.sub_account_id == sub_account_id, orders.c.status.in_(PAID_ORDER_STATUSES),
+                   orders.c.created_at >= start_at)
+        ).one())
+
+    def run(self, report, refresh=False):
+        """(result, cached, computed_at) for a report's current window"""
+        plan = json.loads(report.plan) if report.plan else self.compile(self.validate(report.to_dict()['config']))[0]
+        tz = resolve_timezone(plan['timezone'])
+        start, end = timeframe_window(plan['date_range'], tz)
+        window = {'start': start.isoformat(), 'end': end.isoformat()}
+        grid = BucketGrid.covering(start, end, plan['granularity'], tz)
+        data_version = self.data_version(report, plan, _as_utc_naive(start))
+        # The last bucket moves with `end` at the plan's granularity; a cached result stays valid within it
+        cache_key = _digest([report.plan_hash, start.isoformat(), grid.starts[-1].isoformat(), data_version])
+
+        if not refresh:
+            cached = db.session.get(ReportResult, (report.id, cache_key))
+            if cached is not None:
+                result = json.loads(cached.result)
+                result['window'] = window
+                return result, True, cached.computed_at
+
+        started = time.monotonic()
+        series = analytics_engine.series(report.sub_account_id, grid, plan['metrics'], plan['filters'])
+        result = {
+            'window': window,
+            'granularity': plan['granularity'],
+            'totals': series.totals(plan['metrics']),
+            'series': series.records(plan['metrics'])
+        }
+        now = datetime.utcnow()
+        self._store(report, cache_key, data_version, result, int((time.monotonic() - started) * 1000), now)
+        report.last_run_at = now
+        db.session.commit()
+        return result, False, now
+
+    def _store(self, report, cache_key, data_version, result, duration_ms, now):
+        # Keep the few newest results; older windows and data versions will not be asked for again
+        stale = db.session.execute(
+            select(ReportResult.cache_key)
+            .where(ReportResult.report_id == report.id)
+            .order_by(ReportResult.computed_at.desc())
+            .offset(RESULTS_PER_REPORT - 1)
+        ).scalars().all()
+        if stale:
+            db.session.execute(delete(ReportResult).where(
+                ReportResult.report_id == report.id, ReportResult.cache_key.in_(stale)
+            ))
+        db.session.merge(ReportResult(
+            report_id=report.id,
+            cache_key=cache_key,
+            data_version=data_version,
+            result=json.dumps(result),
+            duration_ms=duration_ms,
+            computed_at=now
+        ))
+
+    def next_run(self, schedule, tz, after=None):
+        """Next precompute time (naive UTC): hourly, or daily / weekly (Mondays) at the off-peak hour in tz"""
+        after = (after or datetime.utcnow()).replace(tzinfo=timezone.utc)
+        if schedule == 'hourly':
+            return (after.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)).replace(tzinfo=None)
+
+        local = after.astimezone(tz)
+        candidate = local.replace(hour=self.off_peak_hour, minute=0, second=0, microsecond=0)
+        while candidate <= local or (schedule == 'weekly' and candidate.weekday() != 0):
+            candidate += timedelta(days=1)
+        return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def precompute_due(self, now=None):
+        """Run every scheduled report whose next_run_at has passed; returns how many ran"""
+        now = now or datetime.utcnow()
+        due = SavedReport.query.filter(
+            SavedReport.schedule.isnot(None), SavedReport.next_run_at <= now
+        ).order_by(SavedReport.next_run_at).all()
+
+        ran = 0
+        for report in due:
+            try:
+                self.run(report)
+                ran += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Precomputing report {report.id} failed: {str(e)}")
+            report.next_run_at = self.next_run(report.schedule, resolve_timezone(report.timezone), now)
+            db.session.commit()
+        return ran
+
+# Global instance
+report_service = ReportService()
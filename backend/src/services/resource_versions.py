@@ -0,0 +1,208 @@
+import time
+import hashlib
+import logging
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+from src.models.contact import Contact, ContactActivity, ContactNote, ContactTask
+from src.models.pipeline import Pipeline, Opportunity, OpportunityActivity
+from src.models.communications import Conversation, Message
+from src.models.campaign import Campaign
+from src.models.resource_version import ResourceVersion
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'pending_resource_bumps'
+COMMITTED_KEY = 'committed_resource_bumps'
+
+
+def tenant_scope(sub_account_id):
+    return f'sub_account:{sub_account_id}' if sub_account_id else None
+
+
+def pipeline_scope(pipeline_id):
+    return f'pipeline:{pipeline_id}' if pipeline_id else None
+
+
+class ResourceVersionTracker:
+    """Per-scope change counters behind the ETags of polled read endpoints
+
+    ORM writes are picked up automatically: before each flush the changed
+    objects are mapped to (scope, resource) pairs, and every pair touched by a
+    transaction is bumped once, inside that transaction, right before it
+    commits. Core statements (imports, bulk updates, merges) call touch().
+
+    A read endpoint wrapped in conditional() looks up the versions of the
+    resources it depends on (one indexed query), and answers 304 when the
+    client's If-None-Match still matches, without running the view.
+    """
+
+    def __init__(self):
+        self.listeners = []
+
+    def init_app(self, app):
+        if 'resource_versions' in app.extensions:
+            return
+        app.extensions['resource_versions'] = self
+
+        event.listen(db.session, 'before_flush', self._before_flush)
+        event.listen(db.session, 'before_commit', self._before_commit)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def on_commit(self, callback):
+        """Call callback(*scopes) after each commit that bumped versions in those scopes"""
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def touch(self, scope, *resources, session=None):
+        """Mark resources of a scope as changed by the current transaction"""
+        if scope is None:
+            return
+        session = session or db.session
+        session.info.setdefault(PENDING_KEY, set()).update((scope, resource) for resource in resources)
+
+    def _before_flush(self, session, flush_context, instances):
+        changed = list(session.new) + list(session.deleted) + [
+            obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+        ]
+        with session.no_autoflush:
+            for obj in changed:
+                for scope, resource in self._changes_for(session, obj):
+                    self.touch(scope, resource, session=session)
+
+    def _changes_for(self, session, obj):
+        if isinstance(obj, Contact):
+            yield tenant_scope(obj.sub_account_id), 'contacts'
+        elif isinstance(obj, (ContactActivity, ContactNote, ContactTask)):
+            # Related counts are part of the contact list payload
+            contact = session.get(Contact, obj.contact_id) if obj.contact_id else None
+            if contact is not None:
+                yield tenant_scope(contact.sub_account_id), 'contacts'
+        elif isinstance(obj, Opportunity):
+            yield pipeline_scope(obj.pipeline_id), 'opportunities'
+            pipeline = session.get(Pipeline, obj.pipeline_id) if obj.pipeline_id else None
+            if pipeline is not None:
+                yield tenant_scope(pipeline.sub_account_id), 'opportunities'
+        elif isinstance(obj, OpportunityActivity):
+            opportunity = session.get(Opportunity, obj.opportunity_id) if obj.opportunity_id else None
+            if opportunity is not None:
+                yield pipeline_scope(opportunity.pipeline_id), 'opportunities'
+        elif isinstance(obj, Pipeline):
+            yield pipeline_scope(obj.id), 'opportunities'
+        elif isinstance(obj, Conversation):
+            yield tenant_scope(obj.sub_account_id), 'conversations'
+        elif isinstance(obj, Message):
+            conversation = session.get(Conversation, obj.conversation_id) if obj.conversation_id else None
+            if conversation is not None:
+                yield tenant_scope(conversation.sub_account_id), 'conversations'
+        elif isinstance(obj, Campaign):
+            yield tenant_scope(obj.sub_account_id), 'campaigns'
+
+    def _before_commit(self, session):
+        # Flush first so objects added since the last flush are collected too
+        session.flush()
+        pending = session.info.pop(PENDING_KEY, None)
+        pending = {(scope, resource) for scope, resource in pending or () if scope}
+        if pending:
+            self._bump(session, sorted(pending))
+            session.info[COMMITTED_KEY] = pending
+
+    def _after_commit(self, session):
+        pending = session.info.pop(COMMITTED_KEY, None)
+        if not pending:
+            return
+        scopes = sorted({scope for scope, _ in pending})
+        for callback in self.listeners:
+            try:
+                callback(*scopes)
+            except Exception as e:
+                logger.warning(f"Resource version listener failed: {str(e)}")
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+        session.info.pop(COMMITTED_KEY, None)
+
+    def _bump(self, session, pairs):
+        now = datetime.utcnow()
+        rows = [{'scope': scope, 'resource': resource, 'version': 1, 'updated_at': now} for scope, resource in pairs]
+        dialect = session.get_bind().dialect.name
+
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = dialect_insert(ResourceVersion).values(rows)
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['scope', 'resource'],
+                set_={'version': ResourceVersion.version + 1, 'updated_at': now}
+            ))
+            return
+
+        for row in rows:
+            result = session.execute(
+                update(ResourceVersion)
+                .where(ResourceVersion.scope == row['scope'], ResourceVersion.resource == row['resource'])
+                .values(version=ResourceVersion.version + 1, updated_at=now)
+            )
+            if result.rowcount == 0:
+                session.execute(insert(ResourceVersion).values(row))
+
+    def versions(self, scope, resources):
+        """[(resource, version, updated_at)] for one scope; unseen resources report version 0"""
+        found = {
+            row.resource: (row.version, row.updated_at)
+            for row in db.session.execute(
+                select(ResourceVersion.resource, ResourceVersion.version, ResourceVersion.updated_at)
+                .where(ResourceVersion.scope == scope, ResourceVersion.resource.in_(resources))
+            )
+        }
+        return [(resource, *found.get(resource, (0, None))) for resource in resources]
+
+    def etag(self, scope, resources, bucket_seconds=None):
+        parts = [request.full_path, scope]
+        for resource, version, updated_at in self.versions(scope, resources):
+            parts.append(f"{resource}:{version}:{updated_at.isoformat() if updated_at else ''}")
+        if bucket_seconds:
+            # Sliding time windows (e.g. "last 30 days") change without any write
+            parts.append(str(int(time.time() // bucket_seconds)))
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def conditional(self, *resources, scope=None, bucket_seconds=None):
+        """Decorator adding ETag / If-None-Match handling to a GET view
+
+        `scope(view_kwargs)` returns the version scope of the request; by
+        default the sub_account_id query argument. Requests without a scope
+        (e.g. cross-tenant queries) are served normally, without an ETag.
+        The versions are read before the view runs, so a write racing the
+        view at worst costs the client one extra full response, never a
+        stale 304.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                scope_key = scope(kwargs) if scope else tenant_scope(request.args.get('sub_account_id', type=int))
+                if scope_key is None:
+                    return view(*args, **kwargs)
+
+                try:
+                    etag = self.etag(scope_key, resources, bucket_seconds)
+                except Exception as e:
+                    logger.warning(f"Skipping conditional GET, version lookup failed: {str(e)}")
+                    return view(*args, **kwargs)
+
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+
+# Global instance
+resource_versions = ResourceVersionTracker()
@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from flask import request, current_app
+from sqlalchemy import event
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: FileStore falls back to a process-local lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def tenant_key(sub_account_id):
+    """Cache tenant of a sub-account; the same string as resource_versions.tenant_scope()"""
+    return f'sub_account:{sub_account_id}' if sub_account_id else None
+
+
+class MemoryStore:
+    """Thread-safe LRU with per-entry expiry
+
+    The in-process tier of ResponseCache, and a stand-in for a shared store
+    in tests: it implements the same get / set / add / incr interface.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self._put(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Set only if absent (or expired); True when this call set it"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def incr(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            value = int(entry[1]) + 1 if entry is not None else 1
+            self._put(key, value, None)
+            return value
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def _put(self, key, value, ttl):
+        self.entries[key] = (time.time() + ttl if ttl else None, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class FileStore:
+    """Shared store in a directory, for several processes on one host
+
+    One file per key, replaced atomically; add / incr take an flock on the
+    directory's lock file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock_path = os.path.join(directory, '.lock')
+        self.thread_lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at = float(f.readline() or 0)
+                value = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if expires_at and expires_at <= time.time():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        path = self._path(key)
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(partial, 'wb') as f:
+            f.write(f'{time.time() + ttl if ttl else 0}\n'.encode('utf-8'))
+            f.write(value if isinstance(value, bytes) else str(value).encode('utf-8'))
+        os.replace(partial, path)
+
+    def add(self, key, value, ttl=None):
+        with self._locked():
+            if self.get(key) is not None:
+                return False
+            self.set(key, value, ttl)
+            return True
+
+    def incr(self, key):
+        with self._locked():
+            value = int(self.get(key) or 0) + 1
+            self.set(key, str(value))
+            return value
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _locked(self):
+        with self.thread_lock, open(self.lock_path, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class RedisStore:
+    """Shared store on Redis (or any server speaking its protocol)"""
+
+    def __init__(self, url, prefix='response_cache:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    """Per-tenant cache of GET responses with write-driven invalidation
+
+    Entries are keyed by (endpoint, tenant, tenant generation, normalized
+    query args). A write to a tenant bumps its generation, which moves every
+    later lookup onto new keys; the old entries are never read again and age
+    out of the LRU / TTL. Sliding "last N days" windows change without writes,
+    so entries also expire after `ttl` seconds.
+
+    Lookups go to an in-process LRU first, then to the optional shared store
+    (RESPONSE_CACHE_URL: file:///path or redis://...), which also holds the
+    generations so that all processes see a bump. On a miss only one caller
+    per key computes the response: concurrent callers in the process wait for
+    it, and with a shared store other processes wait on an add()-based lock.
+    """
+
+    LOCK_SECONDS = 30  # longest a computation may hold off other processes
+    # Response headers not replayed from a cached entry: the hop-by-hop ones (RFC 7230),
+    # the length, which is recomputed, and cookies, which belong to the request that set them
+    UNCACHED_HEADERS = frozenset((
+        'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+        'te', 'trailer', 'transfer-encoding', 'upgrade', 'content-length', 'set-cookie'
+    ))
+
+    def __init__(self, store=None):
+        self.enabled = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() != 'false'
+        self.ttl = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+        self.local = MemoryStore(int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)))
+        self.store = store
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def init_app(self, app):
+        if 'response_cache' in app.extensions:
+            return
+        app.extensions['response_cache'] = self
+        if self.store is None:
+            self.store = self._store_for(app.config.get('RESPONSE_CACHE_URL') or os.environ.get('RESPONSE_CACHE_URL', ''))
+
+    def _store_for(self, url):
+        if not url or url.startswith('memory://'):
+            return None
+        if url.startswith('file://'):
+            return FileStore(url[len('file://'):])
+        if url.startswith(('redis://', 'rediss://', 'unix://')):
+            if not REDIS_AVAILABLE:
+                logger.warning("RESPONSE_CACHE_URL is a Redis URL but the redis package is not installed; caching in-process only")
+                return None
+            return RedisStore(url)
+        raise ValueError(f"Unsupported RESPONSE_CACHE_URL: {url}")
+
+    def _shared(self, method, *args):
+        """Call the shared store; failures degrade to in-process caching"""
+        if self.store is None:
+            return None
+        try:
+            return getattr(self.store, method)(*args)
+        except Exception as e:
+            logger.warning(f"Response cache store {method} failed: {str(e)}")
+            return None
+
+    def generation(self, tenant):
+        shared = self._shared('get', f'generation:{tenant}')
+        if shared is not None:
+            return int(shared)
+        return self.generations.get(tenant, 0)
+
+    def bump(self, *tenants):
+        """Invalidate everything cached for these tenants"""
+        for tenant in tenants:
+            if not tenant:
+                continue
+            with self.lock:
+                self.generations[tenant] = self.generations.get(tenant, 0) + 1
+            self._shared('incr', f'generation:{tenant}')
+
+    def key(self, endpoint, tenant, args, view_args=None):
+        # Sorted keys, repeated values in order; "_" cache busters are not part of the request
+        normalized = sorted((name, values) for name, values in args.lists() if not name.startswith('_'))
+        parts = [endpoint, tenant, self.generation(tenant), normalized, sorted((view_args or {}).items())]
+        # v2: entries store the view's headers rather than only its mimetype
+        return 'response:v2:' + hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+    def fetch(self, key, compute, ttl=None):
+        """(value, hit) for key; compute() -> (value, cacheable) runs once per key across callers"""
+        ttl = ttl or self.ttl
+        value = self.local.get(key)
+        if value is not None:
+            return value, True
+        shared = self._shared('get', key)
+        if shared is not None:
+            value = json.loads(shared)
+            self.local.set(key, value, ttl)
+            return value, True
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            flight.done.wait(self.LOCK_SECONDS)
+            if flight.value is not None:
+                return flight.value, True
+            return compute()[0], False
+
+        holding = False
+        try:
+            if self.store is not None:
+                holding, value = self._process_lock(key)
+                if value is not None:
+                    self.local.set(key, value, ttl)
+                    flight.value = value
+                    return value, True
+
+            value, cacheable = compute()
+            if cacheable:
+                self.local.set(key, value, ttl)
+                self._shared('set', key, json.dumps(value).encode('utf-8'), ttl)
+            flight.value = value
+            return value, False
+        finally:
+            if holding:
+                self._shared('delete', f'lock:{key}')
+            flight.done.set()
+            with self.lock:
+                self.flights.pop(key, None)
+
+    def _process_lock(self, key):
+        """(holding, value): take the cross-process lock of a key, or wait for its holder's result"""
+        if self._shared('add', f'lock:{key}', b'1', self.LOCK_SECONDS) is not False:
+            return True, None
+        deadline = time.time() + self.LOCK_SECONDS
+        while time.time() < deadline:
+            time.sleep(0.05)
+            shared = self._shared('get', key)
+            if shared is not None:
+                return False, json.loads(shared)
+            if self._shared('add', f'lock:{key}', b'1', self.LOCK_SECONDS) is not False:
+                return True, None  # the holder failed or gave up
+        return False, None
+
+    def cached(self, ttl=None, tenant=None):
+        """Decorator caching the 200 responses of a GET view per tenant
+
+        `tenant()` names the tenant of the request; by default the
+        sub_account_id query argument. Requests without one (cross-tenant
+        queries) are not cached. The view's headers are replayed on hits,
+        except UNCACHED_HEADERS.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                tenant_id = tenant() if tenant else tenant_key(request.args.get('sub_account_id', type=int))
+                if not self.enabled or tenant_id is None or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                try:
+                    key = self.key(request.endpoint, tenant_id, request.args, kwargs)
+                except Exception as e:
+                    logger.warning(f"Skipping response cache, key lookup failed: {str(e)}")
+                    return view(*args, **kwargs)
+
+                def render():
+                    response = current_app.make_response(view(*args, **kwargs))
+                    entry = {
+                        'status': response.status_code,
+                        'headers': [
+                            [name, value] for name, value in response.headers.items()
+                            if name.lower() not in self.UNCACHED_HEADERS
+                        ],
+                        'body': response.get_data(as_text=True)
+                    }
+                    return entry, response.status_code == 200
+
+                entry, hit = self.fetch(key, render, ttl)
+                response = current_app.response_class(entry['body'], status=entry['status'], headers=entry['headers'])
+                response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def watch(self, session, tenants_for):
+        """Bump generations when a session commits changes
+
+        `tenants_for(session, obj)` yields the tenants a new, changed or
+        deleted object belongs to. For sessions whose writes already go
+        through resource_versions, register bump() with its on_commit().
+        """
+        def collect(session, flush_context, instances):
+            changed = list(session.new) + list(session.deleted) + [
+                obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+            ]
+            with session.no_autoflush:
+                for obj in changed:
+                    session.info.setdefault('response_cache_tenants', set()).update(
+                        tenant for tenant in tenants_for(session, obj) if tenant
+                    )
+
+        def before_commit(session):
+            session.flush()
+
+        def after_commit(session):
+            self.bump(*session.info.pop('response_cache_tenants', ()))
+
+        def after_rollback(session):
+            session.info.pop('response_cache_tenants', None)
+
+        event.listen(session, 'before_flush', collect)
+        event.listen(session, 'before_commit', before_commit)
+        event.listen(session, 'after_commit', after_commit)
+        event.listen(session, 'after_rollback', after_rollback)
+
+# Global instance
+response_cache = ResponseCache()
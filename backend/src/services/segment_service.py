@@ -0,0 +1,228 @@
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import select, insert, delete, update, func, literal, and_, not_, exists, true
+from src.models.user import db
+from src.models.contact import Contact, ContactTag
+from src.models.ai_features import AILeadScore
+from src.models.segment import Segment, SegmentMember
+from src.services.contact_tags import normalize_tags
+from src.services.custom_fields import custom_field_value, custom_field_condition
+
+logger = logging.getLogger(__name__)
+
+RANGE_OPERATORS = {
+    'eq': lambda expr, value: expr == value,
+    'ne': lambda expr, value: expr != value,
+    'gt': lambda expr, value: expr > value,
+    'gte': lambda expr, value: expr >= value,
+    'lt': lambda expr, value: expr < value,
+    'lte': lambda expr, value: expr <= value,
+}
+
+
+class SegmentService:
+    """Compiles audience criteria to SQL and keeps segment_members up to date
+
+    Criteria format (every key optional, all clauses must hold):
+
+        {
+            "status": "active" | ["active", "inactive"],
+            "source": "website" | [...],
+            "tags": ["vip"] | {"all": [...], "any": [...], "none": [...]},
+            "custom_fields": {"plan": "enterprise", "seats": {"gte": 50}},
+            "created_after": "2024-01-01T00:00:00",
+            "created_before": "2024-12-31T23:59:59",
+            "lead_score": {"gte": 70}
+        }
+
+    A full rebuild is one INSERT ... SELECT. After that, contact writes call
+    refresh_contacts() with the ids they touched, which re-evaluates only
+    those contacts against each of the tenant's segments.
+    """
+
+    def compile(self, criteria):
+        """Build the WHERE clause (over Contact) for a criteria dict; raises ValueError"""
+        if not isinstance(criteria, dict):
+            raise ValueError('criteria must be an object')
+
+        clauses = []
+        for key, value in criteria.items():
+            if key in ('status', 'source'):
+                column = getattr(Contact, key)
+                values = value if isinstance(value, list) else [value]
+                clauses.append(column.in_(values))
+            elif key == 'tags':
+                clauses.append(self._compile_tags(value))
+            elif key == 'custom_fields':
+                clauses.extend(self._compile_custom_fields(value))
+            elif key == 'created_after':
+                clauses.append(Contact.created_at >= datetime.fromisoformat(value))
+            elif key == 'created_before':
+                clauses.append(Contact.created_at <= datetime.fromisoformat(value))
+            elif key == 'lead_score':
+                latest_score = select(AILeadScore.score)\
+                    .where(AILeadScore.contact_id == Contact.id)\
+                    .order_by(AILeadScore.created_at.desc())\
+                    .limit(1)\
+                    .scalar_subquery()
+                clauses.append(self._compile_range(latest_score, value))
+            else:
+                raise ValueError(f'Unsupported criteria key: {key}')
+
+        return and_(true(), *clauses)
+
+    def _compile_tags(self, value):
+        if isinstance(value, list):
+            value = {'all': value}
+        if not isinstance(value, dict):
+            raise ValueError('tags must be a list or an object with all/any/none')
+
+        def has_tag(tags):
+            return exists().where(
+                ContactTag.contact_id == Contact.id,
+                ContactTag.sub_account_id == Contact.sub_account_id,
+                ContactTag.tag.in_(tags)
+            )
+
+        clauses = []
+        for tag in normalize_tags(value.get('all')):
+            clauses.append(has_tag([tag]))
+        if normalize_tags(value.get('any')):
+            clauses.append(has_tag(normalize_tags(value['any'])))
+        if normalize_tags(value.get('none')):
+            clauses.append(not_(has_tag(normalize_tags(value['none']))))
+        return and_(true(), *clauses)
+
+    def _compile_custom_fields(self, fields):
+        if not isinstance(fields, dict):
+            raise ValueError('custom_fields must be an object')
+        clauses = []
+        for key, condition in fields.items():
+            if isinstance(condition, dict):
+                numeric = all(isinstance(v, (int, float)) for v in condition.values())
+                clauses.append(self._compile_range(
+                    custom_field_value(Contact, key, numeric=numeric), condition
+                ))
+            else:
+                clauses.append(custom_field_condition(Contact, key, '=', condition))
+        return clauses
+
+    def _compile_range(self, expression, condition):
+        if not isinstance(condition, dict):
+            return expression == condition
+        clauses = []
+        for operator, value in condition.items():
+            if operator not in RANGE_OPERATORS:
+                raise ValueError(f'Unsupported operator: {operator}')
+            clauses.append(RANGE_OPERATORS[operator](expression, value))
+        return and_(*clauses)
+
+    def rebuild(self, segment):
+        """Recompute a segment's membership from scratch; the caller commits"""
+        clause = self.compile(segment.criteria_dict)
+        now = datetime.utcnow()
+
+        db.session.execute(delete(SegmentMember).where(SegmentMember.segment_id == segment.id))
+        db.session.execute(
+            insert(SegmentMember).from_select(
+                ['segment_id', 'contact_id', 'added_at'],
+                select(literal(segment.id), Contact.id, literal(now))
+                .where(Contact.sub_account_id == segment.sub_account_id, clause)
+            )
+        )
+        segment.member_count = db.session.scalar(
+            select(func.count()).select_from(SegmentMember).where(SegmentMember.segment_id == segment.id)
+        )
+        segment.refreshed_at = now
+        return segment
+
+    def refresh_contacts(self, sub_account_id, contact_ids):
+        """Re-evaluate only `contact_ids` against every segment of the sub-account
+
+        Cost is proportional to the number of changed contacts, not the tenant size.
+        The caller commits, so membership changes land with the contact change.
+        """
+        contact_ids = list({contact_id for contact_id in contact_ids if contact_id is not None})
+        if not contact_ids:
+            return
+
+        db.session.flush()
+        now = datetime.utcnow()
+        for segment in Segment.query.filter_by(sub_account_id=sub_account_id).all():
+            try:
+                clause = self.compile(segment.criteria_dict)
+            except ValueError as e:
+                logger.warning(f"Skipping segment {segment.id} with invalid criteria: {str(e)}")
+                continue
+
+            matching = set(db.session.scalars(
+                select(Contact.id).where(Contact.id.in_(contact_ids), Contact.sub_account_id == sub_account_id, clause)
+            ))
+            current = set(db.session.scalars(
+                select(SegmentMember.contact_id).where(
+                    SegmentMember.segment_id == segment.id,
+                    SegmentMember.contact_id.in_(contact_ids)
+                )
+            ))
+
+            added, removed = matching - current, current - matching
+            if added:
+                db.session.execute(insert(SegmentMember), [
+                    {'segment_id': segment.id, 'contact_id': contact_id, 'added_at': now}
+                    for contact_id in added
+                ])
+            if removed:
+                db.session.execute(delete(SegmentMember).where(
+                    SegmentMember.segment_id == segment.id,
+                    SegmentMember.contact_id.in_(removed)
+                ))
+            if added or removed:
+                # In SQL: concurrent contact writes each apply their own delta
+                db.session.execute(
+                    update(Segment).where(Segment.id == segment.id)
+                    .values(member_count=func.coalesce(Segment.member_count, 0) + len(added) - len(removed))
+                )
+
+    def remove_contacts(self, contact_ids):
+        """Drop deleted contacts from every segment, keeping member counts exact"""
+        contact_ids = list(contact_ids)
+        if not contact_ids:
+            return
+        removed_per_segment = db.session.execute(
+            select(SegmentMember.segment_id, func.count())
+            .where(SegmentMember.contact_id.in_(contact_ids))
+            .group_by(SegmentMember.segment_id)
+        ).all()
+        db.session.execute(delete(SegmentMember).where(SegmentMember.contact_id.in_(contact_ids)))
+        for segment_id, removed in removed_per_segment:
+            db.session.execute(
+                update(Segment).where(Segment.id == segment_id)
+                .values(member_count=Segment.member_count - removed)
+            )
+
+    def members(self, segment, after_contact_id=None, limit=50):
+        """Keyset page of member contacts, ordered by contact id"""
+        query = Contact.query.join(SegmentMember, SegmentMember.contact_id == Contact.id)\
+            .filter(SegmentMember.segment_id == segment.id)
+        if after_contact_id:
+            query = query.filter(SegmentMember.contact_id > after_contact_id)
+        return query.order_by(SegmentMember.contact_id).limit(limit).all()
+
+    def for_campaign(self, campaign):
+        """Materialize (or re-materialize) the audience segment of a campaign"""
+        criteria = json.loads(campaign.target_audience) if campaign.target_audience else {}
+        segment = Segment.query.filter_by(campaign_id=campaign.id).first()
+        if segment is None:
+            segment = Segment(
+                sub_account_id=campaign.sub_account_id,
+                campaign_id=campaign.id,
+                name=f'{campaign.name} audience'
+            )
+            db.session.add(segment)
+        segment.criteria = json.dumps(criteria)
+        db.session.flush()
+        return self.rebuild(segment)
+
+# Global instance
+segment_service = SegmentService()
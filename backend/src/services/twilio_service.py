@@ -2,6 +2,7 @@ import os
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioException
 import logging
+from utils.normalize import normalize_phone
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,9 +32,8 @@ class TwilioService:
             return False
 
         try:
-            # Ensure phone number is in E.164 format
-            if not to_number.startswith('+'):
-                to_number = '+1' + to_number.replace('-', '').replace('(', '').replace(')', '').replace(' ', '')
+            # Ensure phone number is in E.164 format, the same form stored in Contact.phone_e164
+            to_number = normalize_phone(to_number) or to_number
 
             message = self.client.messages.create(
                 body=message,
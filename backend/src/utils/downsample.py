@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def lttb(values, max_points):
+    """Largest-Triangle-Three-Buckets: (kept indices, span starts) of a series
+
+    The first and last points are always kept; the rest are split into
+    max_points - 2 equal buckets and from each the point forming the largest
+    triangle with the previously kept point and the next bucket's average is
+    kept, which follows the visual shape (peaks included) far better than
+    taking every k-th point. Span starts are where each kept point's bucket
+    begins, for span_extremes().
+    """
+    size = len(values)
+    if max_points >= size or max_points < 3:
+        indices = np.arange(size)
+        return indices, indices
+
+    y = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    x = np.arange(size, dtype=np.float64)
+    # edges[b]..edges[b + 1] is bucket b; edges[-1] is the last point, a bucket of its own
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.intp)
+
+    kept = np.empty(max_points, dtype=np.intp)
+    kept[0], kept[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        following_end = edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[high:following_end].mean()
+        next_y = y[high:following_end].mean()
+        # Twice the triangle areas; the constant factor does not change the argmax
+        areas = np.abs(
+            (x[previous] - next_x) * (y[low:high] - y[previous])
+            - (x[previous] - x[low:high]) * (next_y - y[previous])
+        )
+        previous = low + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept, np.concatenate(([0], edges))
+
+
+def span_extremes(values, starts):
+    """(min, max) of values over each span [starts[i], starts[i + 1]), NaN-aware"""
+    values = np.asarray(values, dtype=np.float64)
+    return np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
@@ -0,0 +1,72 @@
+import os
+import re
+
+DEFAULT_COUNTRY_CODE = os.environ.get('DEFAULT_PHONE_COUNTRY_CODE', '1')
+
+_NON_DIGITS = re.compile(r'\D')
+_SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def normalize_email(email):
+    """Lower-cased, trimmed email, or None when it cannot be an address"""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if '@' in email else None
+
+
+def normalize_phone(phone, default_country_code=DEFAULT_COUNTRY_CODE):
+    """Best-effort E.164 form of a free-form phone number, or None
+
+    "+1-555-010-1234", "(555) 010-1234" and "001 555 010 1234" all become
+    "+15550101234". National numbers without a country code get the default one.
+    """
+    if not phone:
+        return None
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub('', phone)
+    if not digits:
+        return None
+
+    if phone.startswith('+'):
+        e164 = digits
+    elif digits.startswith('00'):
+        e164 = digits[2:]
+    elif len(digits) == len(default_country_code) + 10 and digits.startswith(default_country_code):
+        e164 = digits
+    else:
+        e164 = default_country_code + digits.lstrip('0')
+
+    return '+' + e164 if 8 <= len(e164) <= 15 else None
+
+
+def normalize_text(value):
+    """Collapse case and whitespace for loose comparisons of names and companies"""
+    return ' '.join((value or '').lower().split())
+
+
+def soundex(value):
+    """American Soundex code ("Robert" -> "R163"), or '' for blank input"""
+    letters = [char for char in (value or '').lower() if 'a' <= char <= 'z']
+    if not letters:
+        return ''
+
+    first = letters[0]
+    code = first.upper()
+    previous = _SOUNDEX_CODES.get(first, '')
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
@@ -0,0 +1,45 @@
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def encode_cursor(*values):
+    """Encode a keyset position into an opaque, URL-safe cursor string"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor produced by encode_cursor back into typed values
+
+    `types` lists the expected type of each position (datetime, int, str).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise InvalidCursor('Invalid cursor')
+
+        values = []
+        for value, expected in zip(payload, types):
+            if expected is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(expected(value))
+        return tuple(values)
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def parse_bool_arg(value, default=True):
+    """Interpret query-string flags such as ?with_total=false"""
+    if value is None or value == '':
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off')
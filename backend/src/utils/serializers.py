@@ -0,0 +1,214 @@
+import json
+from functools import lru_cache
+from sqlalchemy import select, func
+from sqlalchemy.orm import load_only
+from src.models.user import db, User
+from src.models.contact import Contact
+from src.models.pipeline import Opportunity, OpportunityActivity
+from src.models.communications import Conversation
+
+
+class InvalidFields(ValueError):
+    """Raised when ?fields= names a field the resource does not have"""
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _json_text(default):
+    return lambda value: json.loads(value) if value else default()
+
+
+def _enum_value(value):
+    return value.value if value else None
+
+
+class Field:
+    """One output field: the columns it needs, how to read it and an optional batch prefetch
+
+    `getter(obj, context)` receives the results of every prefetch in `context`,
+    keyed by the prefetch function, so per-page lookups run once per page.
+    """
+
+    __slots__ = ('getter', 'columns', 'prefetch')
+
+    def __init__(self, getter, columns=(), prefetch=None):
+        self.getter = getter
+        self.columns = tuple(columns)
+        self.prefetch = prefetch
+
+    @classmethod
+    def column(cls, column, convert=None):
+        key = column.key
+        if convert is None:
+            return cls(lambda obj, context: getattr(obj, key), (column,))
+        return cls(lambda obj, context: convert(getattr(obj, key)), (column,))
+
+
+class CompiledSerializer:
+    """Serializer for one fixed field list; built once per distinct ?fields= value"""
+
+    def __init__(self, model, fields):
+        # Mapped attributes: load_only() does not accept the Table columns of the mapper
+        columns = [getattr(model, column.key) for column in model.__mapper__.primary_key]
+        prefetches = []
+        for _, field in fields:
+            columns.extend(column for column in field.columns if column not in columns)
+            if field.prefetch and field.prefetch not in prefetches:
+                prefetches.append(field.prefetch)
+        self.columns = tuple(columns)
+        self.prefetches = tuple(prefetches)
+        self.getters = tuple((name, field.getter) for name, field in fields)
+
+    def apply(self, query, *extra_columns):
+        """Restrict the SELECT list to the columns the requested fields read"""
+        return query.options(load_only(*self.columns, *extra_columns))
+
+    def many(self, objects):
+        context = {prefetch: prefetch(objects) for prefetch in self.prefetches} if objects else {}
+        getters = self.getters
+        return [{name: getter(obj, context) for name, getter in getters} for obj in objects]
+
+    def one(self, obj):
+        return self.many([obj])[0]
+
+
+class ModelSerializer:
+    """Field registry for a model; the default field list matches the model's to_dict()"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.names = tuple(fields)
+
+    def parse(self, value):
+        """Turn a ?fields=a,b,c value into a field tuple; empty means every field"""
+        if not value:
+            return self.names
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(f"Unknown field(s): {', '.join(unknown)}")
+        return names or self.names
+
+    def compile(self, names=None):
+        return self._compile(tuple(names) if names else self.names)
+
+    def for_request(self, value):
+        return self.compile(self.parse(value))
+
+    @lru_cache(maxsize=64)
+    def _compile(self, names):
+        return CompiledSerializer(self.model, [(name, self.fields[name]) for name in names])
+
+
+def _contact_counts(contacts):
+    return Contact.related_counts([contact.id for contact in contacts])
+
+
+def _count_field(key):
+    return Field(lambda obj, context: context[_contact_counts].get(obj.id, {}).get(key, 0),
+                 prefetch=_contact_counts)
+
+
+contact_serializer = ModelSerializer(Contact, {
+    'id': Field.column(Contact.id),
+    'sub_account_id': Field.column(Contact.sub_account_id),
+    'email': Field.column(Contact.email),
+    'phone': Field.column(Contact.phone),
+    'first_name': Field.column(Contact.first_name),
+    'last_name': Field.column(Contact.last_name),
+    'full_name': Field(lambda obj, context: obj.full_name, (Contact.first_name, Contact.last_name)),
+    'company': Field.column(Contact.company),
+    'tags': Field.column(Contact.tags, _json_text(list)),
+    'custom_fields': Field.column(Contact.custom_fields, lambda value: value or {}),
+    'status': Field.column(Contact.status),
+    'source': Field.column(Contact.source),
+    'owner_id': Field.column(Contact.owner_id),
+    'created_at': Field.column(Contact.created_at, _iso),
+    'updated_at': Field.column(Contact.updated_at, _iso),
+    'activities_count': _count_field('activities_count'),
+    'notes_count': _count_field('notes_count'),
+    'tasks_count': _count_field('tasks_count'),
+})
+
+
+def _opportunity_activity_counts(opportunities):
+    ids = [opportunity.id for opportunity in opportunities]
+    return dict(db.session.execute(
+        select(OpportunityActivity.opportunity_id, func.count())
+        .where(OpportunityActivity.opportunity_id.in_(ids))
+        .group_by(OpportunityActivity.opportunity_id)
+    ).tuples().all())
+
+
+opportunity_serializer = ModelSerializer(Opportunity, {
+    'id': Field.column(Opportunity.id),
+    'pipeline_id': Field.column(Opportunity.pipeline_id),
+    'contact_id': Field.column(Opportunity.contact_id),
+    'user_id': Field.column(Opportunity.user_id),
+    'title': Field.column(Opportunity.title),
+    'description': Field.column(Opportunity.description),
+    'stage': Field.column(Opportunity.stage),
+    'value': Field.column(Opportunity.value, lambda value: float(value) if value else 0),
+    'probability': Field.column(Opportunity.probability),
+    'expected_close_date': Field.column(Opportunity.expected_close_date, _iso),
+    'status': Field.column(Opportunity.status),
+    'source': Field.column(Opportunity.source),
+    'custom_fields': Field.column(Opportunity.custom_fields, lambda value: value or {}),
+    'created_at': Field.column(Opportunity.created_at, _iso),
+    'updated_at': Field.column(Opportunity.updated_at, _iso),
+    'closed_at': Field.column(Opportunity.closed_at, _iso),
+    'activities_count': Field(
+        lambda obj, context: context[_opportunity_activity_counts].get(obj.id, 0),
+        prefetch=_opportunity_activity_counts
+    ),
+})
+
+
+def _conversation_contacts(conversations):
+    ids = {conversation.contact_id for conversation in conversations}
+    contacts = Contact.query.filter(Contact.id.in_(ids)).all()
+    serialized = contact_serializer.compile().many(contacts)
+    return {data['id']: data for data in serialized}
+
+
+def _conversation_users(conversations):
+    ids = {conversation.assigned_to_id for conversation in conversations} - {None}
+    if not ids:
+        return {}
+    users = db.session.execute(
+        select(User.id, User.first_name, User.last_name, User.email).where(User.id.in_(ids))
+    ).all()
+    return {user.id: dict(user._mapping) for user in users}
+
+
+conversation_serializer = ModelSerializer(Conversation, {
+    'id': Field.column(Conversation.id),
+    'sub_account_id': Field.column(Conversation.sub_account_id),
+    'contact_id': Field.column(Conversation.contact_id),
+    'type': Field.column(Conversation.type, _enum_value),
+    'status': Field.column(Conversation.status, _enum_value),
+    'subject': Field.column(Conversation.subject),
+    'assigned_to_id': Field.column(Conversation.assigned_to_id),
+    'created_at': Field.column(Conversation.created_at, _iso),
+    'updated_at': Field.column(Conversation.updated_at, _iso),
+    'last_message_at': Field.column(Conversation.last_message_at, _iso),
+    'unread_count': Field.column(Conversation.unread_count),
+    'message_count': Field.column(Conversation.message_count),
+    'ai_sentiment': Field.column(Conversation.ai_sentiment),
+    'ai_priority': Field.column(Conversation.ai_priority),
+    'ai_intent': Field.column(Conversation.ai_intent),
+    'ai_summary': Field.column(Conversation.ai_summary),
+    'tags': Field.column(Conversation.tags, lambda value: value or []),
+    'custom_fields': Field.column(Conversation.custom_fields, lambda value: value or {}),
+    'contact': Field(
+        lambda obj, context: context[_conversation_contacts].get(obj.contact_id),
+        (Conversation.contact_id,), prefetch=_conversation_contacts
+    ),
+    'assigned_to': Field(
+        lambda obj, context: context[_conversation_users].get(obj.assigned_to_id),
+        (Conversation.assigned_to_id,), prefetch=_conversation_users
+    ),
+})
@@ -0,0 +1,15 @@
+import os
+import sys
+import types
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import src  # noqa: E402
+
+# src/models.py (the main app's models) shadows the src/models/ package the
+# CRM side imports from as src.models.*; register the package explicitly.
+models = types.ModuleType('src.models')
+models.__path__ = [os.path.join(BACKEND, 'src', 'models')]
+sys.modules['src.models'] = models
+src.models = models
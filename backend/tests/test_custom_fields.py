@@ -0,0 +1,62 @@
+import pytest
+from flask import Flask
+from sqlalchemy import JSON, Integer
+from sqlalchemy.orm import DeclarativeBase, mapped_column
+from werkzeug.datastructures import MultiDict
+from src.models.user import db
+from src.services import custom_fields
+from src.services.custom_fields import apply_custom_field_filters, parse_custom_field_filters
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Record(Base):
+    __tablename__ = 'custom_field_records'
+
+    id = mapped_column(Integer, primary_key=True)
+    custom_fields = mapped_column(JSON)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        Record.__table__.create(db.engine)
+        db.session.add_all([
+            Record(id=1, custom_fields={'zip': '02139', 'code': '007', 'seats': 10}),
+            Record(id=2, custom_fields={'zip': 2139, 'code': 'abc', 'seats': 60}),
+            Record(id=3, custom_fields={'zip': '10001', 'seats': '75'}),
+        ])
+        db.session.commit()
+        custom_fields._promoted_columns.clear()
+        yield app
+        custom_fields._promoted_columns.clear()
+
+
+def matching(query_string):
+    args = MultiDict(pair.split('=', 1) if '=' in pair else (pair, '') for pair in query_string.split('&'))
+    query = apply_custom_field_filters(db.session.query(Record), Record, args)
+    return sorted(record.id for record in query)
+
+
+def test_equality_keeps_digit_strings_as_written():
+    assert parse_custom_field_filters(MultiDict([('cf.zip', '02139')])) == [('zip', '=', '02139')]
+    assert parse_custom_field_filters(MultiDict([('cf.seats>', '50')])) == [('seats', '>=', 50)]
+
+
+@pytest.mark.parametrize('query_string, expected', [
+    ('cf.zip=02139', [1]),
+    ('cf.code=007', [1]),
+    ('cf.zip=2139', [2]),
+    ('cf.zip=10001', [3]),
+    ('cf.code!=007', [2]),
+    ('cf.seats>=50', [2, 3]),
+    ('cf.seats<50', [1]),
+])
+def test_filters(app, query_string, expected):
+    with app.app_context():
+        assert matching(query_string) == expected
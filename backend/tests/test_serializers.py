@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine, select, Integer, String
+from sqlalchemy.orm import DeclarativeBase, Session, mapped_column
+from src.utils.serializers import (
+    ModelSerializer, Field, InvalidFields, contact_serializer, opportunity_serializer, conversation_serializer
+)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Widget(Base):
+    __tablename__ = 'widgets'
+
+    id = mapped_column(Integer, primary_key=True)
+    name = mapped_column(String(50))
+    color = mapped_column(String(20))
+
+
+widget_serializer = ModelSerializer(Widget, {
+    'id': Field.column(Widget.id),
+    'name': Field.column(Widget.name),
+    'color': Field.column(Widget.color, str.upper),
+})
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Widget(id=1, name='bolt', color='red'), Widget(id=2, name='nut', color='blue')])
+        session.commit()
+        yield session
+
+
+@pytest.mark.parametrize('fields, expected', [
+    (None, [{'id': 1, 'name': 'bolt', 'color': 'RED'}, {'id': 2, 'name': 'nut', 'color': 'BLUE'}]),
+    ('name', [{'name': 'bolt'}, {'name': 'nut'}]),
+    ('color,name', [{'color': 'RED', 'name': 'bolt'}, {'color': 'BLUE', 'name': 'nut'}]),
+])
+def test_apply_loads_requested_fields(session, fields, expected):
+    serializer = widget_serializer.for_request(fields)
+    widgets = session.scalars(serializer.apply(select(Widget)).order_by(Widget.id)).all()
+    assert serializer.many(widgets) == expected
+
+
+def test_apply_always_loads_primary_key(session):
+    serializer = widget_serializer.for_request('color')
+    sql = str(serializer.apply(select(Widget)))
+    assert 'widgets.id' in sql and 'widgets.color' in sql and 'widgets.name' not in sql
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(InvalidFields):
+        widget_serializer.for_request('id,weight')
+
+
+@pytest.mark.parametrize('serializer', [contact_serializer, opportunity_serializer, conversation_serializer])
+@pytest.mark.parametrize('fields', [None, 'id'])
+def test_list_endpoint_serializers_compile(serializer, fields):
+    # What GET /contacts, /pipelines/<id>/opportunities and /communications/conversations build
+    compiled = serializer.for_request(fields)
+    assert compiled.columns[0] is getattr(serializer.model, 'id')